@@ -0,0 +1,37 @@
+"""Paper perceptual hash and question image kind
+
+Revision ID: c4e2a7d19b35
+Revises: 6a8f9c40d713
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e2a7d19b35"
+down_revision: Union[str, None] = "6a8f9c40d713"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("papers") as batch_op:
+        batch_op.add_column(sa.Column("image_phash", sa.String(length=16), nullable=True))
+        batch_op.create_index(batch_op.f("ix_papers_image_phash"), ["image_phash"], unique=False)
+
+    with op.batch_alter_table("question_images") as batch_op:
+        batch_op.add_column(sa.Column("kind", sa.String(length=20), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("question_images") as batch_op:
+        batch_op.drop_column("kind")
+
+    with op.batch_alter_table("papers") as batch_op:
+        batch_op.drop_index(batch_op.f("ix_papers_image_phash"))
+        batch_op.drop_column("image_phash")
@@ -2,6 +2,8 @@ from datetime import datetime, timezone
 
 from fastapi import APIRouter
 
+from app.services.llm_client_service import llm_health_snapshot
+
 router = APIRouter()
 
 
@@ -11,3 +13,15 @@ def health_check():
         "status": "ok",
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
+
+
+@router.get("/api/health/llm")
+def llm_health():
+    """Per provider/model circuit state, windowed error rate/latency and adaptive concurrency."""
+    providers = llm_health_snapshot()
+    degraded = any(entry["state"] != "closed" for entry in providers)
+    return {
+        "status": "degraded" if degraded else "ok",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "providers": providers,
+    }
@@ -1,11 +1,15 @@
+import asyncio
 import base64
 import binascii
 import logging
 import mimetypes
 import time
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
+from typing import Any, Awaitable, Optional, TypeVar
 from urllib.parse import unquote_to_bytes, urlparse
-from fastapi import APIRouter, File, HTTPException, UploadFile, Depends
+from fastapi import APIRouter, File, HTTPException, Request, UploadFile, Depends
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
@@ -17,24 +21,31 @@ from app.schemas.ocr import (
     DiagramSvgGenerateResponse,
     OcrExtractResponse,
     OcrExtractResponseV2,
+    OcrItem,
     OcrItemWithUrls,
     OcrPipelineMetrics,
 )
 from app.services import annotation_clean_service
 from app.services import confidence_service
 from app.services import diagram_llm_service
+from app.services import image_worker_service
+from app.services import ocr_cache_service
 from app.services import ocr_service
+from app.services import paper_dedup_service
 from app.services import question_rebuild_service
+from app.services import upload_service
 from app.services.image_service import (
-    crop_diagram_image_with_metadata,
+    ImageContext,
     crop_image,
     get_image_size,
     has_meaningful_content,
     normalize_image_box_for_source,
     prepare_image_for_ocr_pipeline,
+    score_diagram_box,
     should_use_annotation_saas_fallback,
 )
-from app.services.storage_service import get_storage_service
+from app.services.storage_service import LocalStorageService, get_storage_service
+from app.services.worker_pool_service import gather_bounded, run_cpu, run_io
 from app.db.session import get_db
 from app.db.models.paper import Paper
 from app.db.models.question import Question
@@ -43,6 +54,49 @@ from app.db.models.question_image import QuestionImage
 router = APIRouter()
 logger = logging.getLogger("uvicorn.error")
 
+T = TypeVar("T")
+
+# 客户端断开后服务端放弃处理时返回的状态码（沿用 nginx 的 499 约定）。
+CLIENT_CLOSED_REQUEST = 499
+_DISCONNECT_POLL_SECONDS = 0.5
+
+
+async def _cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    执行 work，期间轮询客户端连接；客户端断开时取消 work
+    （连带取消进行中的 LLM 请求），并以 499 结束本次请求。
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=_DISCONNECT_POLL_SECONDS)
+            if task in done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Client disconnected, cancelling OCR work")
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client disconnected.")
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def _ingest_upload(file: UploadFile) -> upload_service.IngestedUpload:
+    """分块读取上传并在完整解码前校验格式与字节/像素预算，不合规时直接 413/415（只提前拒绝，不省内存）。"""
+    try:
+        return await upload_service.read_image_upload(file, declared_size=file.size)
+    except upload_service.UploadRejectedError as exc:
+        logger.info(
+            "OCR upload rejected filename=%s status=%d reason=%s",
+            file.filename,
+            exc.status_code,
+            str(exc),
+        )
+        raise HTTPException(status_code=exc.status_code, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
 
 def _load_asset_bytes(asset_url: str) -> tuple[bytes, str]:
     value = str(asset_url or "").strip()
@@ -131,8 +185,595 @@ def _expand_box_within(
     return ImageBox(ymin=top, xmin=left, ymax=bottom, xmax=right)
 
 
+@dataclass
+class _QuestionOutcome:
+    """单题计算结果（不含 DB / 存储写入），由最终阶段按题号顺序落库。"""
+
+    item: OcrItem
+    has_image: bool
+    question_box: Optional[ImageBox]
+    image_box: Optional[ImageBox]
+    question_snapshot: Optional[tuple[bytes, int, int]] = None
+    diagram_box: Optional[ImageBox] = None
+    diagram_image: Optional[tuple[bytes, int, int]] = None
+    clean_source: Optional[str] = None
+    clean_fallback: bool = False
+    clean_fallback_reason: Optional[str] = None
+    rebuild_json: Optional[dict[str, Any]] = None
+    clean_ms: int = 0
+    rebuild_ms: int = 0
+    refine_precheck_score: Optional[float] = None
+    # skipped（本地预检已足够可信）/ accepted / rejected / failed；None 表示未进入精修阶段
+    refine_status: Optional[str] = None
+
+
+async def _process_question(
+    item: OcrItem,
+    *,
+    page: ImageContext,
+    image_width: int,
+    image_height: int,
+    ocr_filename: str,
+    shared_page: Optional[image_worker_service.SharedPage] = None,
+    deadline: Optional[float] = None,
+    refine_batcher: Optional[ocr_service.RefineBatcher] = None,
+) -> _QuestionOutcome:
+    """
+    单题处理：裁剪题图、精修插图框、本地清理（必要时走 SaaS）、重建 JSON。
+
+    只读共享的整页 ImageContext，不碰数据库会话，多题可在同一事件循环上并发；
+    裁剪放到 I/O 线程池，LLM 精修/重建走异步客户端，
+    插图清理链通过 shared_page 交给图像工作进程，deadline 为 time.monotonic() 截止点；
+    传入 refine_batcher 时精修请求与其他题合批发出。
+    """
+    normalized_question_box = normalize_image_box_for_source(
+        item.question_box,
+        image_width,
+        image_height,
+    )
+    normalized_box = normalize_image_box_for_source(
+        item.image_box,
+        image_width,
+        image_height,
+    )
+    has_image = bool(item.has_image or normalized_box)
+    outcome = _QuestionOutcome(
+        item=item,
+        has_image=has_image,
+        question_box=normalized_question_box,
+        image_box=normalized_box,
+    )
+
+    if normalized_question_box:
+        try:
+            outcome.question_snapshot = await run_io(
+                crop_image,
+                page,
+                normalized_question_box.ymin,
+                normalized_question_box.xmin,
+                normalized_question_box.ymax,
+                normalized_question_box.xmax,
+            )
+        except Exception as e:
+            logger.exception(
+                "Failed to crop question snapshot for question %d: %s",
+                item.id,
+                str(e)
+            )
+
+    if has_image and normalized_box:
+        initial_box = normalized_box
+        refined_box = normalized_box
+        refined_applied = False
+        clean_started_at = None
+        try:
+            refine_skipped = False
+            if normalized_question_box and settings.enable_refine_precheck:
+                precheck = await run_io(score_diagram_box, page, normalized_question_box, normalized_box)
+                outcome.refine_precheck_score = precheck["score"]
+                refine_skipped = precheck["score"] >= settings.refine_precheck_min_score
+                logger.info(
+                    "Refine precheck q%s score=%.3f skip=%s stats=%s",
+                    item.id,
+                    precheck["score"],
+                    refine_skipped,
+                    precheck,
+                )
+                if refine_skipped:
+                    outcome.refine_status = "skipped"
+
+            if normalized_question_box and not refine_skipped:
+                question_source_bytes, q_src_w, q_src_h = await run_io(
+                    crop_image,
+                    page,
+                    normalized_question_box.ymin,
+                    normalized_question_box.xmin,
+                    normalized_question_box.ymax,
+                    normalized_question_box.xmax,
+                    max_size=None,
+                )
+                refined_local_box = None
+                try:
+                    if refine_batcher is not None:
+                        refined_local_box = await refine_batcher.refine(question_source_bytes)
+                    else:
+                        refined_local_box = await ocr_service.refine_diagram_box_async(
+                            question_source_bytes,
+                            "image/png",
+                            f"{ocr_filename}-q{item.id}-refine.png",
+                        )
+                except Exception as refine_exc:
+                    outcome.refine_status = "failed"
+                    logger.warning(
+                        "Refine diagram box failed for q%s, fallback to initial box: %s",
+                        item.id,
+                        str(refine_exc),
+                    )
+                else:
+                    outcome.refine_status = "rejected"
+                if refined_local_box:
+                    refined_local_box = normalize_image_box_for_source(
+                        refined_local_box,
+                        q_src_w,
+                        q_src_h,
+                    )
+                if refined_local_box:
+                    refined_candidate = ImageBox(
+                        ymin=normalized_question_box.ymin + refined_local_box.ymin,
+                        xmin=normalized_question_box.xmin + refined_local_box.xmin,
+                        ymax=normalized_question_box.ymin + refined_local_box.ymax,
+                        xmax=normalized_question_box.xmin + refined_local_box.xmax,
+                    )
+                    refined_abs_box = normalize_image_box_for_source(
+                        refined_candidate,
+                        image_width,
+                        image_height,
+                    )
+                    if refined_abs_box:
+                        refined_area = max(
+                            1,
+                            (refined_abs_box.ymax - refined_abs_box.ymin)
+                            * (refined_abs_box.xmax - refined_abs_box.xmin),
+                        )
+                        initial_area = max(
+                            1,
+                            (initial_box.ymax - initial_box.ymin)
+                            * (initial_box.xmax - initial_box.xmin),
+                        )
+                        question_area = max(
+                            1,
+                            (normalized_question_box.ymax - normalized_question_box.ymin)
+                            * (normalized_question_box.xmax - normalized_question_box.xmin),
+                        )
+                        refined_w = max(1, refined_abs_box.xmax - refined_abs_box.xmin)
+                        refined_h = max(1, refined_abs_box.ymax - refined_abs_box.ymin)
+                        refined_aspect = refined_w / refined_h
+                        area_ratio_vs_initial = refined_area / initial_area
+                        iou_vs_initial = _box_iou(initial_box, refined_abs_box)
+                        initial_center_y = (initial_box.ymin + initial_box.ymax) / 2
+                        refined_center_y = (refined_abs_box.ymin + refined_abs_box.ymax) / 2
+                        center_shift = abs(refined_center_y - initial_center_y)
+                        question_h = max(1, normalized_question_box.ymax - normalized_question_box.ymin)
+
+                        # 精修框必须与初始框保持足够重叠，避免跑偏到手写区域。
+                        if (
+                            refined_area >= int(question_area * 0.08)
+                            and refined_area <= int(question_area * 0.92)
+                            and 0.2 <= refined_aspect <= 6.0
+                            and 0.58 <= area_ratio_vs_initial <= 1.45
+                            and iou_vs_initial >= 0.42
+                            and center_shift <= question_h * 0.14
+                        ):
+                            refined_box = refined_abs_box
+                            refined_applied = True
+                            outcome.refine_status = "accepted"
+                            logger.info(
+                                "Refined diagram box applied for q%s: (%d,%d,%d,%d) within question=%dx%d iou=%.3f ratio=%.3f",
+                                item.id,
+                                refined_box.ymin,
+                                refined_box.xmin,
+                                refined_box.ymax,
+                                refined_box.xmax,
+                                q_src_w,
+                                q_src_h,
+                                iou_vs_initial,
+                                area_ratio_vs_initial,
+                            )
+                        else:
+                            logger.info(
+                                "Refined diagram box rejected for q%s area=%d question_area=%d aspect=%.2f iou=%.3f ratio=%.3f shift=%.1f",
+                                item.id,
+                                refined_area,
+                                question_area,
+                                refined_aspect,
+                                iou_vs_initial,
+                                area_ratio_vs_initial,
+                                center_shift,
+                            )
+
+            if not refined_applied:
+                if normalized_question_box:
+                    q_h = max(1, normalized_question_box.ymax - normalized_question_box.ymin)
+                    refined_box = _expand_box_within(
+                        refined_box,
+                        limit_top=normalized_question_box.ymin,
+                        limit_left=normalized_question_box.xmin,
+                        limit_bottom=normalized_question_box.ymax,
+                        limit_right=normalized_question_box.xmax,
+                        # 预检通过的框已包住插图，只加边距，不再按题高撑大
+                        min_height=0 if refine_skipped else int(q_h * 0.38),
+                    )
+                else:
+                    refined_box = _expand_box_within(
+                        refined_box,
+                        limit_top=0,
+                        limit_left=0,
+                        limit_bottom=image_height,
+                        limit_right=image_width,
+                    )
+
+            clean_started_at = time.perf_counter()
+            cropped_bytes, width, height, clean_stats = await run_io(
+                image_worker_service.crop_diagram,
+                page,
+                shared_page,
+                refined_box.ymin,
+                refined_box.xmin,
+                refined_box.ymax,
+                refined_box.xmax,
+                deadline=deadline,
+            )
+            outcome.clean_source = "local_rule"
+            needs_saas_fallback, clean_fallback_reason = should_use_annotation_saas_fallback(clean_stats)
+            outcome.clean_fallback_reason = clean_fallback_reason
+            if refined_applied and not clean_stats["meaningful_content"]:
+                logger.info(
+                    "Refined diagram crop seems blank for q%s, fallback to initial image_box",
+                    item.id,
+                )
+                refined_box = normalized_box
+                cropped_bytes, width, height, clean_stats = await run_io(
+                    image_worker_service.crop_diagram,
+                    page,
+                    shared_page,
+                    refined_box.ymin,
+                    refined_box.xmin,
+                    refined_box.ymax,
+                    refined_box.xmax,
+                    deadline=deadline,
+                )
+                retry_needs_fallback, retry_reason = should_use_annotation_saas_fallback(clean_stats)
+                needs_saas_fallback = needs_saas_fallback or retry_needs_fallback
+                clean_fallback_reason = clean_fallback_reason or retry_reason or "refined_crop_blank"
+                outcome.clean_fallback_reason = clean_fallback_reason
+
+            if not clean_stats["meaningful_content"]:
+                needs_saas_fallback = True
+                clean_fallback_reason = clean_fallback_reason or "local_output_blank"
+                outcome.clean_fallback_reason = clean_fallback_reason
+
+            if needs_saas_fallback:
+                if annotation_clean_service.is_annotation_clean_fallback_enabled():
+                    raw_crop_bytes, _, _ = await run_io(
+                        crop_image,
+                        page,
+                        refined_box.ymin,
+                        refined_box.xmin,
+                        refined_box.ymax,
+                        refined_box.xmax,
+                        max_size=None,
+                    )
+                    saas_bytes = await run_io(
+                        annotation_clean_service.clean_diagram_with_saas,
+                        raw_crop_bytes,
+                        content_type="image/png",
+                        file_name=f"{ocr_filename}-q{item.id}-diagram.png",
+                    )
+                    if saas_bytes and await run_io(has_meaningful_content, saas_bytes):
+                        cropped_bytes = saas_bytes
+                        width, height = get_image_size(saas_bytes)
+                        outcome.clean_source = "saas_fallback"
+                        outcome.clean_fallback = True
+                        clean_fallback_reason = clean_fallback_reason or "local_clean_quality_low"
+                    else:
+                        clean_fallback_reason = (
+                            f"{clean_fallback_reason or 'local_clean_quality_low'};saas_failed"
+                        )
+                else:
+                    clean_fallback_reason = (
+                        f"{clean_fallback_reason or 'local_clean_quality_low'};saas_disabled"
+                    )
+                outcome.clean_fallback_reason = clean_fallback_reason
+
+            outcome.clean_ms = int((time.perf_counter() - clean_started_at) * 1000)
+            outcome.diagram_image = (cropped_bytes, width, height)
+            outcome.diagram_box = refined_box
+
+        except Exception as e:
+            logger.exception(
+                "Failed to crop image for question %d: %s",
+                item.id,
+                str(e)
+            )
+            # 不阻断流程，继续处理其他题目
+
+    rebuild_started_at = time.perf_counter()
+    if settings.enable_rebuild_json:
+        outcome.rebuild_json = await question_rebuild_service.rebuild_question_json_async(
+            item.text,
+            diagram_image_bytes=outcome.diagram_image[0] if outcome.diagram_image else None,
+        )
+    outcome.rebuild_ms = int((time.perf_counter() - rebuild_started_at) * 1000)
+    return outcome
+
+
+QUESTION_IMAGE_KIND_SNAPSHOT = "question_snapshot"
+QUESTION_IMAGE_KIND_DIAGRAM = "diagram"
+
+
+def _assess_item(
+    text: str,
+    *,
+    rebuild_json: Optional[dict[str, Any]],
+    has_image: bool,
+    has_diagram_output: bool,
+    clean_fallback_used: bool,
+) -> tuple[float, dict[str, Any], str]:
+    """置信度评估，返回 (score, assessment, status)。"""
+    confidence_assessment = confidence_service.compute_rebuild_assessment(
+        source_text=text,
+        rebuild_json=rebuild_json,
+        has_image=has_image,
+        has_diagram_output=has_diagram_output,
+        clean_fallback_used=clean_fallback_used,
+    )
+    confidence = float(confidence_assessment.get("score", 0.0))
+    status = "ok"
+    if settings.force_manual_refine_on_low_conf and confidence < settings.rebuild_confidence_threshold:
+        status = "need_manual_refine"
+    return confidence, confidence_assessment, status
+
+
+def _box_of(image: Optional[QuestionImage]) -> Optional[ImageBox]:
+    if image is None:
+        return None
+    return ImageBox(ymin=image.ymin, xmin=image.xmin, ymax=image.ymax, xmax=image.xmax)
+
+
+def _copy_paper_questions(db: Session, source: Paper, paper_id: int) -> list[OcrItemWithUrls]:
+    """
+    近似重复上传：把已处理试卷的题目与插图记录复制到新试卷下。
+    插图文件直接复用原 URL，不重新裁剪或上传。
+    """
+    result_items = []
+    for source_question in sorted(source.questions, key=lambda question: question.question_no):
+        question = Question(
+            paper_id=paper_id,
+            question_no=source_question.question_no,
+            text=source_question.text,
+            has_image=source_question.has_image,
+        )
+        db.add(question)
+        db.flush()
+
+        snapshot = None
+        diagram = None
+        for source_image in sorted(source_question.images, key=lambda image: image.id):
+            db.add(
+                QuestionImage(
+                    question_id=question.id,
+                    image_url=source_image.image_url,
+                    ymin=source_image.ymin,
+                    xmin=source_image.xmin,
+                    ymax=source_image.ymax,
+                    xmax=source_image.xmax,
+                    width=source_image.width,
+                    height=source_image.height,
+                    kind=source_image.kind,
+                )
+            )
+            if source_image.kind == QUESTION_IMAGE_KIND_SNAPSHOT:
+                snapshot = source_image
+            elif source_image.kind == QUESTION_IMAGE_KIND_DIAGRAM:
+                diagram = source_image
+
+        has_image = bool(source_question.has_image)
+        confidence, confidence_assessment, status = _assess_item(
+            source_question.text,
+            rebuild_json=None,
+            has_image=has_image,
+            has_diagram_output=diagram is not None,
+            clean_fallback_used=False,
+        )
+        diagram_url = diagram.image_url if diagram is not None else None
+        result_items.append(
+            OcrItemWithUrls(
+                id=source_question.question_no,
+                text=source_question.text,
+                has_image=has_image,
+                question_box=_box_of(snapshot),
+                image_box=_box_of(diagram),
+                question_image_url=snapshot.image_url if snapshot is not None else None,
+                diagram_image_url=diagram_url,
+                diagram_local_image_url=diagram_url,
+                image_urls=[diagram_url] if diagram_url else [],
+                clean_source="reused" if diagram_url else None,
+                confidence=confidence,
+                confidence_reasons=list(confidence_assessment.get("reasons", [])),
+                confidence_breakdown=confidence_assessment.get("breakdown"),
+                status=status,
+            )
+        )
+    return result_items
+
+
+def _persist_question_outcomes(
+    db: Session,
+    storage: LocalStorageService,
+    paper_id: int,
+    outcomes: list[_QuestionOutcome],
+) -> list[OcrItemWithUrls]:
+    """
+    按题号顺序写入 Question / QuestionImage 并上传图片（需要 question.id）。
+
+    同步的会话与文件写入集中在这里，由路由整体放到 I/O 线程中执行。
+    """
+    result_items = []
+    for outcome in outcomes:
+        item = outcome.item
+        normalized_question_box = outcome.question_box
+        normalized_box = outcome.image_box
+
+        # 创建 Question 记录
+        question = Question(
+            paper_id=paper_id,
+            question_no=item.id,
+            text=item.text,
+            has_image=outcome.has_image
+        )
+        db.add(question)
+        db.flush()  # 获取 question.id
+
+        question_image_url = None
+        diagram_image_url = None
+        diagram_local_image_url = None
+        diagram_llm_image_url = None
+        diagram_svg_url = None
+        image_urls = []
+        next_index = 0
+
+        if outcome.question_snapshot:
+            question_bytes, q_width, q_height = outcome.question_snapshot
+            try:
+                question_image_url = storage.upload_question_image(
+                    question_bytes,
+                    question.id,
+                    next_index,
+                )
+                next_index += 1
+
+                db.add(
+                    QuestionImage(
+                        question_id=question.id,
+                        image_url=question_image_url,
+                        ymin=normalized_question_box.ymin,
+                        xmin=normalized_question_box.xmin,
+                        ymax=normalized_question_box.ymax,
+                        xmax=normalized_question_box.xmax,
+                        width=q_width,
+                        height=q_height,
+                        kind=QUESTION_IMAGE_KIND_SNAPSHOT,
+                    )
+                )
+            except Exception as e:
+                logger.exception(
+                    "Failed to save question snapshot for question %d: %s",
+                    item.id,
+                    str(e)
+                )
+
+        if outcome.diagram_image:
+            cropped_bytes, width, height = outcome.diagram_image
+            refined_box = outcome.diagram_box
+            try:
+                # 上传裁剪后的图片
+                img_url = storage.upload_question_image(
+                    cropped_bytes,
+                    question.id,
+                    next_index
+                )
+                next_index += 1
+                diagram_image_url = img_url
+                diagram_local_image_url = img_url
+
+                # 创建 QuestionImage 记录
+                q_img = QuestionImage(
+                    question_id=question.id,
+                    image_url=img_url,
+                    ymin=refined_box.ymin,
+                    xmin=refined_box.xmin,
+                    ymax=refined_box.ymax,
+                    xmax=refined_box.xmax,
+                    width=width,
+                    height=height,
+                    kind=QUESTION_IMAGE_KIND_DIAGRAM,
+                )
+                db.add(q_img)
+                image_urls.append(img_url)  # backward compatibility: diagram-only list
+                normalized_box = refined_box
+
+                logger.info(
+                    "Cropped and saved image for question %d: %s",
+                    question.id,
+                    img_url
+                )
+            except Exception as e:
+                logger.exception(
+                    "Failed to save image for question %d: %s",
+                    item.id,
+                    str(e)
+                )
+
+        rebuild_json = outcome.rebuild_json
+
+        confidence, confidence_assessment, status = _assess_item(
+            item.text,
+            rebuild_json=rebuild_json,
+            has_image=outcome.has_image,
+            has_diagram_output=bool(diagram_image_url),
+            clean_fallback_used=outcome.clean_fallback,
+        )
+
+        # 构建响应项
+        result_items.append(
+            OcrItemWithUrls(
+                id=item.id,
+                text=item.text,
+                has_image=outcome.has_image,
+                question_box=normalized_question_box,
+                image_box=normalized_box,
+                question_image_url=question_image_url,
+                diagram_image_url=diagram_image_url,
+                diagram_local_image_url=diagram_local_image_url,
+                diagram_llm_image_url=diagram_llm_image_url,
+                diagram_svg_url=diagram_svg_url,
+                image_urls=image_urls,
+                clean_source=outcome.clean_source,
+                clean_fallback=outcome.clean_fallback,
+                clean_fallback_reason=outcome.clean_fallback_reason,
+                rebuild_json=rebuild_json,
+                confidence=confidence,
+                confidence_reasons=list(confidence_assessment.get("reasons", [])),
+                confidence_breakdown=confidence_assessment.get("breakdown"),
+                status=status,
+            )
+        )
+    return result_items
+
+
+def _preprocess_metrics(preprocess_meta: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "preprocessing_enabled": bool(preprocess_meta.get("preprocessing_enabled")),
+        "preprocess_decode_ms": preprocess_meta.get("preprocess_decode_ms") or 0,
+        "preprocess_enhance_ms": preprocess_meta.get("preprocess_enhance_ms") or 0,
+        "preprocess_encode_ms": preprocess_meta.get("preprocess_encode_ms") or 0,
+        "preprocessing_applied": bool(preprocess_meta.get("preprocessing_applied")),
+        "preprocessing_engine": preprocess_meta.get("preprocessing_engine"),
+        "preprocess_profile": preprocess_meta.get("preprocess_profile"),
+        "preprocess_noise_sigma": preprocess_meta.get("noise_sigma"),
+        "deskew_angle": preprocess_meta.get("deskew_angle"),
+        "preprocessing_fallback_reason": preprocess_meta.get("preprocessing_fallback_reason"),
+        "image_phash": preprocess_meta.get("image_phash"),
+        "source_width": preprocess_meta.get("source_width"),
+        "source_height": preprocess_meta.get("source_height"),
+        "working_scale": preprocess_meta.get("working_scale") or 1.0,
+        "draft_scale": preprocess_meta.get("draft_scale") or 1,
+    }
+
+
 @router.post("/api/ocr/extract", response_model=OcrExtractResponseV2)
 async def extract_questions(
+    request: Request,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
@@ -142,423 +783,167 @@ async def extract_questions(
     流程：
     1. 保存原始图片到存储
     2. 创建 Paper 记录
-    3. OCR 识别题目和插图坐标
-    4. 对每个题目：
+    3. OCR 识别题目和插图坐标（开启 ENABLE_PAPER_DEDUP_REUSE 且命中近似重复试卷时，
+       直接复制其题目与插图记录并返回）
+    4. 对每个题目（协程并发，受 OCR_QUESTION_MAX_WORKERS 限制）：
+       - 裁剪题图、精修并清理插图
+       - 可选重建题目 JSON
+    5. 按题号顺序统一写库：
        - 创建 Question 记录
-       - 裁剪插图并保存
-       - 创建 QuestionImage 记录
-    5. 提交数据库事务
-    6. 返回题目列表（包含插图 URL）
+       - 保存插图并创建 QuestionImage 记录
+    6. 提交数据库事务
+    7. 返回题目列表（包含插图 URL）
     """
-    content_type = file.content_type or "image/png"
     filename = file.filename or "upload.png"
+    cache_stats = ocr_cache_service.begin_request()
+    hedge_stats = ocr_service.begin_hedge_request()
 
     try:
-        # 读取上传的图片
-        image_bytes = await file.read()
-        if not image_bytes:
-            raise HTTPException(status_code=400, detail="Empty upload.")
+        # 读取上传的图片（按文件头识别格式，超出预算的在解码前拒绝）
+        upload = await _ingest_upload(file)
+        image_bytes = upload.data
+        content_type = upload.content_type
 
         logger.info(
-            "OCR upload received filename=%s bytes=%d content_type=%s",
+            "OCR upload received filename=%s bytes=%d content_type=%s size=%sx%s",
             filename,
             len(image_bytes),
             content_type,
+            upload.width,
+            upload.height,
         )
 
         preprocess_start_at = time.perf_counter()
-        ocr_image_bytes, ocr_content_type, ocr_filename, preprocess_meta = prepare_image_for_ocr_pipeline(
+        ocr_image_bytes, ocr_content_type, ocr_filename, preprocess_meta = await run_cpu(
+            prepare_image_for_ocr_pipeline,
             image_bytes,
             content_type,
             filename,
             enable_local_preprocess=settings.enable_local_preprocess,
+            working_max_side=settings.ocr_working_max_side,
+            preprocess_profile=settings.ocr_preprocess_profile,
         )
         preprocess_ms = int((time.perf_counter() - preprocess_start_at) * 1000)
-
-        image_width, image_height = get_image_size(ocr_image_bytes)
+        image_phash = preprocess_meta.get("image_phash")
 
         storage = get_storage_service()
 
         # 1. 保存原始图片到存储
-        paper_url = storage.upload_paper_image(ocr_image_bytes, ocr_filename)
+        paper_url = await run_io(storage.upload_paper_image, ocr_image_bytes, ocr_filename)
         logger.info("Saved original paper image: %s", paper_url)
 
         # 2. 创建 Paper 记录
         paper = Paper(
             title=ocr_filename or "Untitled",
             original_image_url=paper_url,
-            status="processing"
+            status="processing",
+            image_phash=image_phash,
         )
         db.add(paper)
-        db.flush()  # 获取 paper.id
+        await run_io(db.flush)  # 获取 paper.id
         logger.info("Created Paper record: id=%d", paper.id)
 
+        # 近似重复（重拍/重传同一张卷子）：复用已处理试卷的题目与插图，跳过 OCR
+        if settings.enable_paper_dedup_reuse and image_phash:
+            duplicate = await run_io(
+                paper_dedup_service.find_near_duplicate,
+                db,
+                image_phash,
+                settings.paper_dedup_max_distance,
+            )
+            if duplicate:
+                source_paper, distance = duplicate
+                result_items = await run_io(_copy_paper_questions, db, source_paper, paper.id)
+                paper.status = "processed"
+                await run_io(db.commit)
+                paper_dedup_service.get_paper_hash_index().add(paper.id, image_phash)
+                logger.info(
+                    "OCR reused near-duplicate paper: paper_id=%d source_paper_id=%d distance=%d questions=%d",
+                    paper.id,
+                    source_paper.id,
+                    distance,
+                    len(result_items),
+                )
+                return OcrExtractResponseV2(
+                    items=result_items,
+                    paper_id=paper.id,
+                    pipeline_metrics=OcrPipelineMetrics(
+                        preprocess_ms=preprocess_ms,
+                        manual_refine_count=sum(
+                            1 for result in result_items if result.status == "need_manual_refine"
+                        ),
+                        dedup_source_paper_id=source_paper.id,
+                        dedup_distance=distance,
+                        **_preprocess_metrics(preprocess_meta),
+                    ),
+                )
+
+        # 整页只解码一次，后续每道题的裁剪/抠图都复用这份像素。
+        page = await run_io(ImageContext.from_bytes, ocr_image_bytes)
+        image_width, image_height = page.size
+
         # 3. OCR 识别
         ocr_start_at = time.perf_counter()
-        ocr_items = ocr_service.extract_questions(
-            ocr_image_bytes,
-            ocr_content_type,
-            ocr_filename
+        ocr_items = await _cancel_on_disconnect(
+            request,
+            ocr_service.extract_questions_async(
+                ocr_image_bytes,
+                ocr_content_type,
+                ocr_filename
+            ),
         )
         ocr_ms = int((time.perf_counter() - ocr_start_at) * 1000)
         logger.info("OCR extracted %d questions", len(ocr_items))
 
-        # 4. 处理每个题目
-        result_items = []
+        # 4. 并发处理每个题目（裁剪/精修/清理/重建），不访问数据库
         crop_start_at = time.perf_counter()
-        clean_ms_total = 0
-        clean_fallback_count = 0
-        rebuild_ms_total = 0
-        manual_refine_count = 0
-        for item in ocr_items:
-            normalized_question_box = normalize_image_box_for_source(
-                item.question_box,
-                image_width,
-                image_height,
-            )
-            normalized_box = normalize_image_box_for_source(
-                item.image_box,
-                image_width,
-                image_height,
+        deadline = None
+        if settings.image_worker_deadline_seconds > 0:
+            deadline = time.monotonic() + settings.image_worker_deadline_seconds
+        shared_page = await run_io(image_worker_service.share_page, page)
+        refine_batcher = None
+        if settings.ocr_refine_batch_size > 1:
+            refine_batcher = ocr_service.RefineBatcher(
+                ocr_filename,
+                max_batch=settings.ocr_refine_batch_size,
+                linger_seconds=settings.ocr_refine_batch_linger_ms / 1000,
             )
-            has_image = bool(item.has_image or normalized_box)
-
-            # 创建 Question 记录
-            question = Question(
-                paper_id=paper.id,
-                question_no=item.id,
-                text=item.text,
-                has_image=has_image
-            )
-            db.add(question)
-            db.flush()  # 获取 question.id
-
-            # 裁剪并保存插图
-            question_image_url = None
-            diagram_image_url = None
-            diagram_local_image_url = None
-            diagram_llm_image_url = None
-            diagram_svg_url = None
-            image_urls = []
-            next_index = 0
-            clean_source = None
-            clean_fallback = False
-            clean_fallback_reason = None
-            diagram_image_bytes = None
-            question_snapshot_bytes = None
-
-            if normalized_question_box:
-                try:
-                    question_bytes, q_width, q_height = crop_image(
-                        ocr_image_bytes,
-                        normalized_question_box.ymin,
-                        normalized_question_box.xmin,
-                        normalized_question_box.ymax,
-                        normalized_question_box.xmax,
-                    )
-                    question_image_url = storage.upload_question_image(
-                        question_bytes,
-                        question.id,
-                        next_index,
-                    )
-                    next_index += 1
-
-                    db.add(
-                        QuestionImage(
-                            question_id=question.id,
-                            image_url=question_image_url,
-                            ymin=normalized_question_box.ymin,
-                            xmin=normalized_question_box.xmin,
-                            ymax=normalized_question_box.ymax,
-                            xmax=normalized_question_box.xmax,
-                            width=q_width,
-                            height=q_height,
-                        )
-                    )
-                    question_snapshot_bytes = question_bytes
-                except Exception as e:
-                    logger.exception(
-                        "Failed to crop question snapshot for question %d: %s",
-                        item.id,
-                        str(e)
-                    )
-
-            if has_image and normalized_box:
-                initial_box = normalized_box
-                refined_box = normalized_box
-                refined_applied = False
-                try:
-                    if normalized_question_box:
-                        question_source_bytes, q_src_w, q_src_h = crop_image(
-                            ocr_image_bytes,
-                            normalized_question_box.ymin,
-                            normalized_question_box.xmin,
-                            normalized_question_box.ymax,
-                            normalized_question_box.xmax,
-                            max_size=None,
-                        )
-                        refined_local_box = None
-                        try:
-                            refined_local_box = ocr_service.refine_diagram_box(
-                                question_source_bytes,
-                                "image/png",
-                                f"{ocr_filename}-q{item.id}-refine.png",
-                            )
-                        except Exception as refine_exc:
-                            logger.warning(
-                                "Refine diagram box failed for q%s, fallback to initial box: %s",
-                                item.id,
-                                str(refine_exc),
-                            )
-                        if refined_local_box:
-                            refined_local_box = normalize_image_box_for_source(
-                                refined_local_box,
-                                q_src_w,
-                                q_src_h,
-                            )
-                        if refined_local_box:
-                            refined_candidate = ImageBox(
-                                ymin=normalized_question_box.ymin + refined_local_box.ymin,
-                                xmin=normalized_question_box.xmin + refined_local_box.xmin,
-                                ymax=normalized_question_box.ymin + refined_local_box.ymax,
-                                xmax=normalized_question_box.xmin + refined_local_box.xmax,
-                            )
-                            refined_abs_box = normalize_image_box_for_source(
-                                refined_candidate,
-                                image_width,
-                                image_height,
-                            )
-                            if refined_abs_box:
-                                refined_area = max(
-                                    1,
-                                    (refined_abs_box.ymax - refined_abs_box.ymin)
-                                    * (refined_abs_box.xmax - refined_abs_box.xmin),
-                                )
-                                initial_area = max(
-                                    1,
-                                    (initial_box.ymax - initial_box.ymin)
-                                    * (initial_box.xmax - initial_box.xmin),
-                                )
-                                question_area = max(
-                                    1,
-                                    (normalized_question_box.ymax - normalized_question_box.ymin)
-                                    * (normalized_question_box.xmax - normalized_question_box.xmin),
-                                )
-                                refined_w = max(1, refined_abs_box.xmax - refined_abs_box.xmin)
-                                refined_h = max(1, refined_abs_box.ymax - refined_abs_box.ymin)
-                                refined_aspect = refined_w / refined_h
-                                area_ratio_vs_initial = refined_area / initial_area
-                                iou_vs_initial = _box_iou(initial_box, refined_abs_box)
-                                initial_center_y = (initial_box.ymin + initial_box.ymax) / 2
-                                refined_center_y = (refined_abs_box.ymin + refined_abs_box.ymax) / 2
-                                center_shift = abs(refined_center_y - initial_center_y)
-                                question_h = max(1, normalized_question_box.ymax - normalized_question_box.ymin)
-
-                                # 精修框必须与初始框保持足够重叠，避免跑偏到手写区域。
-                                if (
-                                    refined_area >= int(question_area * 0.08)
-                                    and refined_area <= int(question_area * 0.92)
-                                    and 0.2 <= refined_aspect <= 6.0
-                                    and 0.58 <= area_ratio_vs_initial <= 1.45
-                                    and iou_vs_initial >= 0.42
-                                    and center_shift <= question_h * 0.14
-                                ):
-                                    refined_box = refined_abs_box
-                                    refined_applied = True
-                                    logger.info(
-                                        "Refined diagram box applied for q%s: (%d,%d,%d,%d) within question=%dx%d iou=%.3f ratio=%.3f",
-                                        item.id,
-                                        refined_box.ymin,
-                                        refined_box.xmin,
-                                        refined_box.ymax,
-                                        refined_box.xmax,
-                                        q_src_w,
-                                        q_src_h,
-                                        iou_vs_initial,
-                                        area_ratio_vs_initial,
-                                    )
-                                else:
-                                    logger.info(
-                                        "Refined diagram box rejected for q%s area=%d question_area=%d aspect=%.2f iou=%.3f ratio=%.3f shift=%.1f",
-                                        item.id,
-                                        refined_area,
-                                        question_area,
-                                        refined_aspect,
-                                        iou_vs_initial,
-                                        area_ratio_vs_initial,
-                                        center_shift,
-                                    )
-
-                    if not refined_applied:
-                        if normalized_question_box:
-                            q_h = max(1, normalized_question_box.ymax - normalized_question_box.ymin)
-                            refined_box = _expand_box_within(
-                                refined_box,
-                                limit_top=normalized_question_box.ymin,
-                                limit_left=normalized_question_box.xmin,
-                                limit_bottom=normalized_question_box.ymax,
-                                limit_right=normalized_question_box.xmax,
-                                min_height=int(q_h * 0.38),
-                            )
-                        else:
-                            refined_box = _expand_box_within(
-                                refined_box,
-                                limit_top=0,
-                                limit_left=0,
-                                limit_bottom=image_height,
-                                limit_right=image_width,
-                            )
-
-                    clean_started_at = time.perf_counter()
-                    cropped_bytes, width, height, clean_stats = crop_diagram_image_with_metadata(
-                        ocr_image_bytes,
-                        refined_box.ymin,
-                        refined_box.xmin,
-                        refined_box.ymax,
-                        refined_box.xmax,
-                    )
-                    clean_source = "local_rule"
-                    needs_saas_fallback, clean_fallback_reason = should_use_annotation_saas_fallback(clean_stats)
-                    if refined_applied and not has_meaningful_content(cropped_bytes):
-                        logger.info(
-                            "Refined diagram crop seems blank for q%s, fallback to initial image_box",
-                            item.id,
-                        )
-                        refined_box = normalized_box
-                        cropped_bytes, width, height, clean_stats = crop_diagram_image_with_metadata(
-                            ocr_image_bytes,
-                            refined_box.ymin,
-                            refined_box.xmin,
-                            refined_box.ymax,
-                            refined_box.xmax,
-                        )
-                        retry_needs_fallback, retry_reason = should_use_annotation_saas_fallback(clean_stats)
-                        needs_saas_fallback = needs_saas_fallback or retry_needs_fallback
-                        clean_fallback_reason = clean_fallback_reason or retry_reason or "refined_crop_blank"
-
-                    if not has_meaningful_content(cropped_bytes):
-                        needs_saas_fallback = True
-                        clean_fallback_reason = clean_fallback_reason or "local_output_blank"
-
-                    if needs_saas_fallback:
-                        if annotation_clean_service.is_annotation_clean_fallback_enabled():
-                            raw_crop_bytes, _, _ = crop_image(
-                                ocr_image_bytes,
-                                refined_box.ymin,
-                                refined_box.xmin,
-                                refined_box.ymax,
-                                refined_box.xmax,
-                                max_size=None,
-                            )
-                            saas_bytes = annotation_clean_service.clean_diagram_with_saas(
-                                raw_crop_bytes,
-                                content_type="image/png",
-                                file_name=f"{ocr_filename}-q{item.id}-diagram.png",
-                            )
-                            if saas_bytes and has_meaningful_content(saas_bytes):
-                                cropped_bytes = saas_bytes
-                                width, height = get_image_size(saas_bytes)
-                                clean_source = "saas_fallback"
-                                clean_fallback = True
-                                clean_fallback_count += 1
-                                clean_fallback_reason = clean_fallback_reason or "local_clean_quality_low"
-                            else:
-                                clean_fallback_reason = (
-                                    f"{clean_fallback_reason or 'local_clean_quality_low'};saas_failed"
-                                )
-                        else:
-                            clean_fallback_reason = (
-                                f"{clean_fallback_reason or 'local_clean_quality_low'};saas_disabled"
-                            )
-
-                    clean_ms_total += int((time.perf_counter() - clean_started_at) * 1000)
-
-                    diagram_image_bytes = cropped_bytes
-                    # 上传裁剪后的图片
-                    img_url = storage.upload_question_image(
-                        cropped_bytes,
-                        question.id,
-                        next_index
-                    )
-                    next_index += 1
-                    diagram_image_url = img_url
-                    diagram_local_image_url = img_url
-
-                    # 创建 QuestionImage 记录
-                    q_img = QuestionImage(
-                        question_id=question.id,
-                        image_url=img_url,
-                        ymin=refined_box.ymin,
-                        xmin=refined_box.xmin,
-                        ymax=refined_box.ymax,
-                        xmax=refined_box.xmax,
-                        width=width,
-                        height=height,
-                    )
-                    db.add(q_img)
-                    image_urls.append(img_url)  # backward compatibility: diagram-only list
-                    normalized_box = refined_box
-
-                    logger.info(
-                        "Cropped and saved image for question %d: %s",
-                        question.id,
-                        img_url
-                    )
-
-                except Exception as e:
-                    logger.exception(
-                        "Failed to crop image for question %d: %s",
-                        item.id,
-                        str(e)
-                    )
-                    # 不阻断流程，继续处理其他题目
-
-            rebuild_started_at = time.perf_counter()
-            rebuild_json = None
-            if settings.enable_rebuild_json:
-                rebuild_json = question_rebuild_service.rebuild_question_json(
-                    item.text,
-                    diagram_image_bytes=diagram_image_bytes,
-                )
-            rebuild_ms_total += int((time.perf_counter() - rebuild_started_at) * 1000)
-
-            confidence_assessment = confidence_service.compute_rebuild_assessment(
-                source_text=item.text,
-                rebuild_json=rebuild_json,
-                has_image=has_image,
-                has_diagram_output=bool(diagram_image_url),
-                clean_fallback_used=clean_fallback,
+        try:
+            process_question = partial(
+                _process_question,
+                page=page,
+                image_width=image_width,
+                image_height=image_height,
+                ocr_filename=ocr_filename,
+                shared_page=shared_page,
+                deadline=deadline,
+                refine_batcher=refine_batcher,
             )
-            confidence = float(confidence_assessment.get("score", 0.0))
-            status = "ok"
-            if settings.force_manual_refine_on_low_conf and confidence < settings.rebuild_confidence_threshold:
-                status = "need_manual_refine"
-                manual_refine_count += 1
-
-            # 构建响应项
-            result_items.append(
-                OcrItemWithUrls(
-                    id=item.id,
-                    text=item.text,
-                    has_image=has_image,
-                    question_box=normalized_question_box,
-                    image_box=normalized_box,
-                    question_image_url=question_image_url,
-                    diagram_image_url=diagram_image_url,
-                    diagram_local_image_url=diagram_local_image_url,
-                    diagram_llm_image_url=diagram_llm_image_url,
-                    diagram_svg_url=diagram_svg_url,
-                    image_urls=image_urls,
-                    clean_source=clean_source,
-                    clean_fallback=clean_fallback,
-                    clean_fallback_reason=clean_fallback_reason,
-                    rebuild_json=rebuild_json,
-                    confidence=confidence,
-                    confidence_reasons=list(confidence_assessment.get("reasons", [])),
-                    confidence_breakdown=confidence_assessment.get("breakdown"),
-                    status=status,
-                )
+            outcomes = await _cancel_on_disconnect(
+                request,
+                gather_bounded(
+                    process_question,
+                    ocr_items,
+                    max_parallel=settings.ocr_question_max_workers,
+                ),
             )
+        finally:
+            if refine_batcher is not None:
+                await refine_batcher.aclose()
+            if shared_page is not None:
+                shared_page.close()
+
+        # 5. 按题号顺序统一写库、上传图片
+        result_items = await run_io(_persist_question_outcomes, db, storage, paper.id, outcomes)
+        clean_ms_total = sum(outcome.clean_ms for outcome in outcomes)
+        rebuild_ms_total = sum(outcome.rebuild_ms for outcome in outcomes)
+        clean_fallback_count = sum(1 for outcome in outcomes if outcome.clean_fallback)
+        manual_refine_count = sum(1 for result in result_items if result.status == "need_manual_refine")
+        refine_statuses = [outcome.refine_status for outcome in outcomes if outcome.refine_status]
+        refine_skipped_count = refine_statuses.count("skipped")
+        refine_accepted_count = refine_statuses.count("accepted")
+        refine_called_count = len(refine_statuses) - refine_skipped_count
+        refine_request_count = refine_batcher.request_count if refine_batcher is not None else refine_called_count
 
         crop_ms = int((time.perf_counter() - crop_start_at) * 1000)
         pipeline_metrics = OcrPipelineMetrics(
@@ -569,19 +954,26 @@ async def extract_questions(
             clean_fallback_count=clean_fallback_count,
             rebuild_ms=rebuild_ms_total,
             manual_refine_count=manual_refine_count,
-            preprocessing_enabled=bool(preprocess_meta.get("preprocessing_enabled")),
-            preprocessing_applied=bool(preprocess_meta.get("preprocessing_applied")),
-            preprocessing_engine=preprocess_meta.get("preprocessing_engine"),
-            deskew_angle=preprocess_meta.get("deskew_angle"),
-            preprocessing_fallback_reason=preprocess_meta.get("preprocessing_fallback_reason"),
+            refine_skipped_count=refine_skipped_count,
+            refine_called_count=refine_called_count,
+            refine_accepted_count=refine_accepted_count,
+            refine_request_count=refine_request_count,
+            ocr_cache_hits=cache_stats.hits,
+            ocr_cache_misses=cache_stats.misses,
+            refine_cache_hits=cache_stats.refine_hits,
+            refine_cache_misses=cache_stats.refine_misses,
+            ocr_hedge_fired=hedge_stats.fired,
+            ocr_hedge_won=hedge_stats.won,
+            **_preprocess_metrics(preprocess_meta),
         )
 
-        # 5. 更新 Paper 状态并提交
+        # 6. 更新 Paper 状态并提交
         paper.status = "processed"
-        db.commit()
+        await run_io(db.commit)
+        paper_dedup_service.get_paper_hash_index().add(paper.id, image_phash)
 
         logger.info(
-            "OCR processing completed: paper_id=%d, questions=%d preprocess_ms=%d ocr_ms=%d crop_ms=%d clean_ms=%d rebuild_ms=%d clean_fallback_count=%d manual_refine_count=%d preprocessing_applied=%s",
+            "OCR processing completed: paper_id=%d, questions=%d preprocess_ms=%d ocr_ms=%d crop_ms=%d clean_ms=%d rebuild_ms=%d clean_fallback_count=%d manual_refine_count=%d preprocessing_applied=%s ocr_cache_hits=%d ocr_cache_misses=%d refine_cache_hits=%d refine_cache_misses=%d ocr_hedge_fired=%d ocr_hedge_won=%d refine_skipped=%d refine_called=%d refine_accepted=%d refine_requests=%d",
             paper.id,
             len(result_items),
             pipeline_metrics.preprocess_ms,
@@ -592,6 +984,16 @@ async def extract_questions(
             pipeline_metrics.clean_fallback_count,
             pipeline_metrics.manual_refine_count,
             pipeline_metrics.preprocessing_applied,
+            pipeline_metrics.ocr_cache_hits,
+            pipeline_metrics.ocr_cache_misses,
+            pipeline_metrics.refine_cache_hits,
+            pipeline_metrics.refine_cache_misses,
+            pipeline_metrics.ocr_hedge_fired,
+            pipeline_metrics.ocr_hedge_won,
+            pipeline_metrics.refine_skipped_count,
+            pipeline_metrics.refine_called_count,
+            pipeline_metrics.refine_accepted_count,
+            pipeline_metrics.refine_request_count,
         )
 
         return OcrExtractResponseV2(
@@ -614,18 +1016,17 @@ async def extract_questions(
 
 
 @router.post("/api/ocr/extract/simple", response_model=OcrExtractResponse)
-async def extract_questions_simple(file: UploadFile = File(...)):
+async def extract_questions_simple(request: Request, file: UploadFile = File(...)):
     """
     OCR 提取题目（简单版本，不入库）
 
     仅执行 OCR 识别，不保存到数据库，用于快速测试。
     """
-    content_type = file.content_type or "image/png"
     filename = file.filename or "upload.png"
     try:
-        image_bytes = await file.read()
-        if not image_bytes:
-            raise HTTPException(status_code=400, detail="Empty upload.")
+        upload = await _ingest_upload(file)
+        image_bytes = upload.data
+        content_type = upload.content_type
 
         logger.info(
             "OCR simple upload: filename=%s bytes=%d",
@@ -634,20 +1035,26 @@ async def extract_questions_simple(file: UploadFile = File(...)):
         )
 
         preprocess_start_at = time.perf_counter()
-        ocr_image_bytes, ocr_content_type, ocr_filename, preprocess_meta = prepare_image_for_ocr_pipeline(
+        ocr_image_bytes, ocr_content_type, ocr_filename, preprocess_meta = await run_cpu(
+            prepare_image_for_ocr_pipeline,
             image_bytes,
             content_type,
             filename,
             enable_local_preprocess=settings.enable_local_preprocess,
+            working_max_side=settings.ocr_working_max_side,
+            preprocess_profile=settings.ocr_preprocess_profile,
         )
         preprocess_ms = int((time.perf_counter() - preprocess_start_at) * 1000)
         image_width, image_height = get_image_size(ocr_image_bytes)
 
         ocr_start_at = time.perf_counter()
-        items = ocr_service.extract_questions(
-            ocr_image_bytes,
-            ocr_content_type,
-            ocr_filename
+        items = await _cancel_on_disconnect(
+            request,
+            ocr_service.extract_questions_async(
+                ocr_image_bytes,
+                ocr_content_type,
+                ocr_filename
+            ),
         )
         ocr_ms = int((time.perf_counter() - ocr_start_at) * 1000)
         normalized_items = []
@@ -690,8 +1097,8 @@ async def generate_diagram_crop(payload: DiagramCropGenerateRequest):
     if not settings.enable_whatai_diagram_crop:
         return DiagramCropGenerateResponse()
 
-    question_image_bytes, content_type = _load_asset_bytes(payload.question_image_url)
-    result = diagram_llm_service.generate_diagram_crop(
+    question_image_bytes, content_type = await run_io(_load_asset_bytes, payload.question_image_url)
+    result = await diagram_llm_service.generate_diagram_crop_async(
         question_image_bytes,
         question_text=payload.question_text,
         content_type=content_type,
@@ -701,7 +1108,8 @@ async def generate_diagram_crop(payload: DiagramCropGenerateRequest):
         return DiagramCropGenerateResponse()
 
     storage = get_storage_service()
-    diagram_llm_image_url = storage.upload_question_asset(
+    diagram_llm_image_url = await run_io(
+        storage.upload_question_asset,
         result.image_bytes,
         payload.item_id or 0,
         90,
@@ -718,7 +1126,7 @@ async def generate_diagram_svg(payload: DiagramSvgGenerateRequest):
     diagram_seed_bytes = None
     if payload.diagram_image_url:
         try:
-            diagram_seed_bytes, _ = _load_asset_bytes(payload.diagram_image_url)
+            diagram_seed_bytes, _ = await run_io(_load_asset_bytes, payload.diagram_image_url)
         except HTTPException as exc:
             logger.warning(
                 "SVG seed diagram load failed for item=%s: %s",
@@ -727,7 +1135,7 @@ async def generate_diagram_svg(payload: DiagramSvgGenerateRequest):
             )
     if not diagram_seed_bytes and payload.question_image_url:
         try:
-            diagram_seed_bytes, _ = _load_asset_bytes(payload.question_image_url)
+            diagram_seed_bytes, _ = await run_io(_load_asset_bytes, payload.question_image_url)
         except HTTPException as exc:
             logger.warning(
                 "SVG seed question load failed for item=%s: %s",
@@ -735,7 +1143,7 @@ async def generate_diagram_svg(payload: DiagramSvgGenerateRequest):
                 exc.detail,
             )
 
-    diagram_svg = diagram_llm_service.generate_diagram_svg(
+    diagram_svg = await diagram_llm_service.generate_diagram_svg_async(
         payload.question_text,
         diagram_image_bytes=diagram_seed_bytes,
         trace_id=f"diagram-svg:item:{payload.item_id or 'unknown'}",
@@ -744,7 +1152,8 @@ async def generate_diagram_svg(payload: DiagramSvgGenerateRequest):
         return DiagramSvgGenerateResponse()
 
     storage = get_storage_service()
-    diagram_svg_url = storage.upload_question_asset(
+    diagram_svg_url = await run_io(
+        storage.upload_question_asset,
         diagram_svg.encode("utf-8"),
         payload.item_id or 0,
         91,
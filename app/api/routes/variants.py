@@ -10,9 +10,9 @@ logger = logging.getLogger("uvicorn.error")
 
 
 @router.post("/api/variants/generate", response_model=VariantsResponse)
-def generate_variants(payload: VariantsRequest):
+async def generate_variants(payload: VariantsRequest):
     try:
-        items = variant_service.generate_variants(
+        items = await variant_service.generate_variants_async(
             payload.source_text,
             payload.count,
             grade=payload.grade,
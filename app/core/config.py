@@ -60,8 +60,82 @@ class Settings:
         "http://localhost:8000/static"
     )
 
+    # Upload ingestion: byte and pixel budgets checked while streaming, before any full decode (0 = no limit).
+    upload_max_bytes: int = _env_int("UPLOAD_MAX_BYTES", 25 * 1024 * 1024)
+    upload_max_pixels: int = _env_int("UPLOAD_MAX_PIXELS", 50_000_000)
+
     # OCR pipeline preprocessing
     enable_local_preprocess: bool = _env_bool("ENABLE_LOCAL_PREPROCESS", True)
+    # quality (full-resolution NL-means) | balanced | fast (background division only) | auto (by size/noise)
+    ocr_preprocess_profile: str = os.getenv("OCR_PREPROCESS_PROFILE", "auto").strip()
+    # Working resolution of the OCR page (longest side, 0 = native). Larger JPEGs decode in draft mode.
+    ocr_working_max_side: int = _env_int("OCR_WORKING_MAX_SIDE", 4096)
+
+    # Skip the refine LLM pass when the local image_box score (0-1) reaches the threshold.
+    enable_refine_precheck: bool = _env_bool("ENABLE_REFINE_PRECHECK", True)
+    refine_precheck_min_score: float = _env_float("REFINE_PRECHECK_MIN_SCORE", 0.8)
+
+    # Batched refine: up to N question snapshots tiled into one refine call (1 = one call per question).
+    # Batches also flush after the linger window; they can hold at most OCR_QUESTION_MAX_WORKERS questions.
+    ocr_refine_batch_size: int = _env_int("OCR_REFINE_BATCH_SIZE", 1)
+    ocr_refine_batch_linger_ms: int = _env_int("OCR_REFINE_BATCH_LINGER_MS", 50)
+
+    # Per-question fan-out (refine / clean / rebuild); 1 keeps the serial path.
+    ocr_question_max_workers: int = _env_int("OCR_QUESTION_MAX_WORKERS", 4)
+    ocr_question_global_max_workers: int = _env_int("OCR_QUESTION_GLOBAL_MAX_WORKERS", 8)
+
+    # Off-event-loop execution: blocking I/O threads and CPU image processes (0 = use threads).
+    io_thread_pool_size: int = _env_int("IO_THREAD_POOL_SIZE", 16)
+    cpu_process_pool_size: int = _env_int("CPU_PROCESS_POOL_SIZE", os.cpu_count() or 2)
+    # Per-upload budget for image worker jobs (diagram cleanup); 0 disables the deadline.
+    image_worker_deadline_seconds: float = _env_float("IMAGE_WORKER_DEADLINE_SECONDS", 90.0)
+
+    # OCR retry ladder: overall budget per vision call (0 = none), jittered backoff between attempts,
+    # and uploads above OCR_ORIG_MAX_BYTES start from the downscaled candidate.
+    ocr_request_deadline_seconds: float = _env_float("OCR_REQUEST_DEADLINE_SECONDS", 240.0)
+    ocr_retry_backoff_base_seconds: float = _env_float("OCR_RETRY_BACKOFF_BASE_SECONDS", 0.5)
+    ocr_retry_backoff_max_seconds: float = _env_float("OCR_RETRY_BACKOFF_MAX_SECONDS", 4.0)
+    ocr_orig_max_bytes: int = _env_int("OCR_ORIG_MAX_BYTES", 6 * 1024 * 1024)
+
+    # Hedged OCR calls: if an attempt has not answered within the recent latency percentile
+    # (needs OCR_HEDGE_MIN_SAMPLES successes), send one identical request and keep the first answer.
+    ocr_hedge_enabled: bool = _env_bool("OCR_HEDGE_ENABLED", False)
+    ocr_hedge_percentile: float = _env_float("OCR_HEDGE_PERCENTILE", 0.9)
+    ocr_hedge_min_samples: int = _env_int("OCR_HEDGE_MIN_SAMPLES", 10)
+    ocr_hedge_min_delay_seconds: float = _env_float("OCR_HEDGE_MIN_DELAY_SECONDS", 2.0)
+
+    # LLM provider health: circuit opens after N consecutive failures or when the windowed
+    # error rate exceeds the threshold (once min samples are seen); one probe after the cool-down.
+    llm_circuit_failure_threshold: int = _env_int("LLM_CIRCUIT_FAILURE_THRESHOLD", 5)
+    llm_circuit_error_rate: float = _env_float("LLM_CIRCUIT_ERROR_RATE", 0.5)
+    llm_circuit_min_samples: int = _env_int("LLM_CIRCUIT_MIN_SAMPLES", 10)
+    llm_circuit_open_seconds: float = _env_float("LLM_CIRCUIT_OPEN_SECONDS", 30.0)
+    llm_health_window_seconds: float = _env_float("LLM_HEALTH_WINDOW_SECONDS", 60.0)
+
+    # LLM call telemetry: one JSONL record per provider call, written off the request path.
+    # Request/response bodies are attached to a sampled fraction of calls (0 = never, 1 = always).
+    llm_telemetry_enabled: bool = _env_bool("LLM_TELEMETRY_ENABLED", True)
+    llm_telemetry_path: str = os.getenv(
+        "LLM_TELEMETRY_PATH",
+        str(DEFAULT_STORAGE_DIR / "llm_telemetry.jsonl"),
+    )
+    llm_telemetry_body_sample_rate: float = _env_float("LLM_TELEMETRY_BODY_SAMPLE_RATE", 0.01)
+    llm_telemetry_body_max_chars: int = _env_int("LLM_TELEMETRY_BODY_MAX_CHARS", 2800)
+    llm_telemetry_queue_size: int = _env_int("LLM_TELEMETRY_QUEUE_SIZE", 10000)
+
+    # OCR result cache: memory (LRU) | sqlite (survives restarts) | off
+    ocr_cache_backend: str = os.getenv("OCR_CACHE_BACKEND", "memory").strip()
+    ocr_cache_path: str = os.getenv(
+        "OCR_CACHE_PATH",
+        str(DEFAULT_STORAGE_DIR / "ocr_cache.db"),
+    )
+    ocr_cache_ttl_seconds: float = _env_float("OCR_CACHE_TTL_SECONDS", 7 * 24 * 3600.0)
+    ocr_cache_max_entries: int = _env_int("OCR_CACHE_MAX_ENTRIES", 512)
+    ocr_cache_max_bytes: int = _env_int("OCR_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+    # Near-duplicate uploads (page dHash within this Hamming distance) reuse the prior paper's questions.
+    enable_paper_dedup_reuse: bool = _env_bool("ENABLE_PAPER_DEDUP_REUSE", False)
+    paper_dedup_max_distance: int = _env_int("PAPER_DEDUP_MAX_DISTANCE", 4)
 
     # Annotation cleaning fallback
     enable_annotation_saas_fallback: bool = _env_bool("ENABLE_ANNOTATION_SAAS_FALLBACK", False)
@@ -4,9 +4,13 @@ SILICONFLOW_BASE_URL = "https://api.siliconflow.cn/v1"
 SILICONFLOW_MODEL = "deepseek-ai/DeepSeek-V3"
 SILICONFLOW_OCR_MODEL = "Qwen/Qwen2-VL-72B-Instruct"  # Any VLM/OCR model from SiliconFlow
 SILICONFLOW_TIMEOUT_SECONDS = 180
+SILICONFLOW_POOL_SIZE = 8  # Keep-alive connections kept per provider
+SILICONFLOW_MAX_CONCURRENCY = 16  # In-flight async calls per provider
 
 WHATAI_API_KEY = "sk-please-fill"
 WHATAI_BASE_URL = "https://api.whatai.cc/v1"
 WHATAI_DIAGRAM_CROP_MODEL = "gemini-3.1-flash-image-preview"
 WHATAI_DIAGRAM_SVG_MODEL = "gemini-3.1-pro-preview"
 WHATAI_TIMEOUT_SECONDS = 180
+WHATAI_POOL_SIZE = 4
+WHATAI_MAX_CONCURRENCY = 8
@@ -11,6 +11,8 @@ class LlmSettings:
     model: Optional[str] = None
     timeout_seconds: int = 180
     ocr_model: Optional[str] = None
+    pool_size: int = 8
+    max_concurrency: int = 16
 
 
 @dataclass(frozen=True)
@@ -20,6 +22,8 @@ class WhataiSettings:
     diagram_crop_model: Optional[str] = None
     diagram_svg_model: Optional[str] = None
     timeout_seconds: int = 180
+    pool_size: int = 4
+    max_concurrency: int = 8
 
 
 def _load_from_secrets() -> dict[str, Optional[str]]:
@@ -34,6 +38,8 @@ def _load_from_secrets() -> dict[str, Optional[str]]:
         "model": getattr(secrets, "SILICONFLOW_MODEL", None),
         "ocr_model": getattr(secrets, "SILICONFLOW_OCR_MODEL", None),
         "timeout_seconds": getattr(secrets, "SILICONFLOW_TIMEOUT_SECONDS", None),
+        "pool_size": getattr(secrets, "SILICONFLOW_POOL_SIZE", None),
+        "max_concurrency": getattr(secrets, "SILICONFLOW_MAX_CONCURRENCY", None),
     }
 
 
@@ -49,9 +55,20 @@ def _load_whatai_from_secrets() -> dict[str, Optional[str]]:
         "diagram_crop_model": getattr(secrets, "WHATAI_DIAGRAM_CROP_MODEL", None),
         "diagram_svg_model": getattr(secrets, "WHATAI_DIAGRAM_SVG_MODEL", None),
         "timeout_seconds": getattr(secrets, "WHATAI_TIMEOUT_SECONDS", None),
+        "pool_size": getattr(secrets, "WHATAI_POOL_SIZE", None),
+        "max_concurrency": getattr(secrets, "WHATAI_MAX_CONCURRENCY", None),
     }
 
 
+def _parse_int(value: Optional[str], default: int) -> int:
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
 def load_llm_settings() -> Optional[LlmSettings]:
     config = _load_from_secrets()
 
@@ -60,6 +77,8 @@ def load_llm_settings() -> Optional[LlmSettings]:
     model = config.get("model") or os.getenv("SILICONFLOW_MODEL")
     ocr_model = config.get("ocr_model") or os.getenv("SILICONFLOW_OCR_MODEL")
     timeout_value = config.get("timeout_seconds") or os.getenv("SILICONFLOW_TIMEOUT_SECONDS")
+    pool_size_value = config.get("pool_size") or os.getenv("SILICONFLOW_POOL_SIZE")
+    max_concurrency_value = config.get("max_concurrency") or os.getenv("SILICONFLOW_MAX_CONCURRENCY")
 
     if not api_key or not base_url:
         return None
@@ -80,6 +99,8 @@ def load_llm_settings() -> Optional[LlmSettings]:
         model=model,
         timeout_seconds=timeout_seconds,
         ocr_model=ocr_model,
+        pool_size=_parse_int(pool_size_value, 8),
+        max_concurrency=_parse_int(max_concurrency_value, 16),
     )
 
 
@@ -99,6 +120,8 @@ def load_whatai_settings() -> Optional[WhataiSettings]:
         or "gemini-3.1-pro-preview"
     )
     timeout_value = config.get("timeout_seconds") or os.getenv("WHATAI_TIMEOUT_SECONDS")
+    pool_size_value = config.get("pool_size") or os.getenv("WHATAI_POOL_SIZE")
+    max_concurrency_value = config.get("max_concurrency") or os.getenv("WHATAI_MAX_CONCURRENCY")
 
     if not api_key or not base_url:
         return None
@@ -119,4 +142,6 @@ def load_whatai_settings() -> Optional[WhataiSettings]:
         diagram_crop_model=diagram_crop_model,
         diagram_svg_model=diagram_svg_model,
         timeout_seconds=timeout_seconds,
+        pool_size=_parse_int(pool_size_value, 4),
+        max_concurrency=_parse_int(max_concurrency_value, 8),
     )
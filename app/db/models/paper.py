@@ -12,6 +12,7 @@ class Paper(Base):
     title = Column(String(255), nullable=False)
     original_image_url = Column(String(512), nullable=True)
     status = Column(String(50), default="uploaded")  # uploaded, processed, error
+    image_phash = Column(String(16), nullable=True, index=True)  # 预处理后整页的 dHash（16 位十六进制）
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -17,6 +17,7 @@ class QuestionImage(Base):
     xmax = Column(Integer, nullable=False)
     width = Column(Integer, nullable=True)  # 裁剪后的宽高
     height = Column(Integer, nullable=True)
+    kind = Column(String(20), nullable=True)  # question_snapshot, diagram
     created_at = Column(DateTime, default=func.now())
 
     # Relationships
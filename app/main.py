@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+import logging
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -5,8 +7,27 @@ from fastapi.staticfiles import StaticFiles
 
 from app.api.router import api_router
 from app.core.config import settings
+from app.services.llm_client_service import aclose_llm_clients
+from app.services.llm_telemetry_service import shutdown_telemetry
+from app.services.worker_pool_service import run_io, shutdown_executors, warm_cpu_executor
 
-app = FastAPI(title=settings.app_name, version="0.1.0")
+logger = logging.getLogger("uvicorn.error")
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    try:
+        await run_io(warm_cpu_executor)
+    except Exception:
+        logger.warning("Image worker pool warm-up failed; jobs will start it lazily", exc_info=True)
+    yield
+    # Release the question/IO threads and CPU worker processes on shutdown.
+    shutdown_executors()
+    await aclose_llm_clients()
+    shutdown_telemetry()
+
+
+app = FastAPI(title=settings.app_name, version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
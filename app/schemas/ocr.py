@@ -42,6 +42,10 @@ class OcrExtractResponse(BaseModel):
 
 class OcrPipelineMetrics(BaseModel):
     preprocess_ms: int = 0
+    # preprocess_ms 的分段：解码成工作页 / 摆正降噪 / 编码（整页只解码、编码各一次）
+    preprocess_decode_ms: int = 0
+    preprocess_enhance_ms: int = 0
+    preprocess_encode_ms: int = 0
     ocr_ms: int = 0
     crop_ms: int = 0
     clean_ms: int = 0
@@ -51,8 +55,27 @@ class OcrPipelineMetrics(BaseModel):
     preprocessing_enabled: bool = False
     preprocessing_applied: bool = False
     preprocessing_engine: Optional[str] = None
+    preprocess_profile: Optional[str] = None  # 实际使用的预处理档位（auto 时为选中的档位）
+    preprocess_noise_sigma: Optional[float] = None
     deskew_angle: Optional[float] = None
     preprocessing_fallback_reason: Optional[str] = None
+    ocr_cache_hits: int = 0
+    ocr_cache_misses: int = 0
+    refine_cache_hits: int = 0  # 精修请求的缓存命中，不计入 ocr_cache_*
+    refine_cache_misses: int = 0
+    ocr_hedge_fired: int = 0  # 额外发出的对冲请求数
+    ocr_hedge_won: int = 0  # 其中先于原请求返回的次数
+    refine_skipped_count: int = 0  # 本地预检足够可信而未调用精修模型的题数
+    refine_called_count: int = 0
+    refine_accepted_count: int = 0  # 精修结果通过校验并被采用的题数
+    refine_request_count: int = 0  # 实际发出的精修请求数（合批后可少于 refine_called_count）
+    image_phash: Optional[str] = None
+    source_width: Optional[int] = None  # 上传原图尺寸（方向校正后）
+    source_height: Optional[int] = None
+    working_scale: float = 1.0  # 工作页/原图的边长比，框坐标除以它即回到原图坐标
+    draft_scale: int = 1  # JPEG draft 解码时的 DCT 缩小倍数（1/2/4/8）
+    dedup_source_paper_id: Optional[int] = None  # 命中近似重复时复用的试卷
+    dedup_distance: Optional[int] = None
 
 
 class OcrExtractResponseV2(BaseModel):
@@ -5,6 +5,7 @@ from typing import Any, Optional
 from urllib import error, request
 
 from app.core.config import settings
+from app.services.payload_service import Base64Blob, encode_json_payload
 
 logger = logging.getLogger("uvicorn.error")
 
@@ -35,13 +36,13 @@ def clean_diagram_with_saas(
         return None
 
     body = {
-        "image_base64": base64.b64encode(image_bytes).decode("utf-8"),
+        "image_base64": Base64Blob(image_bytes),
         "content_type": content_type,
         "file_name": file_name,
     }
     req = request.Request(
         settings.annotation_clean_api_url,
-        data=json.dumps(body).encode("utf-8"),
+        data=encode_json_payload(body).body,
         headers={
             "Content-Type": "application/json",
             **(
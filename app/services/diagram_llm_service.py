@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import base64
+import asyncio
 import json
 import logging
 import re
@@ -9,7 +9,8 @@ from typing import Any, Optional
 
 from app.schemas.common import ImageBox
 from app.services.image_service import crop_image, get_image_size, has_meaningful_content, normalize_image_box_for_source
-from app.services.llm_client_service import LlmClientError, get_whatai_client
+from app.services.llm_client_service import LlmClientError, circuit_open, get_whatai_client
+from app.services.payload_service import data_url
 
 
 logger = logging.getLogger("uvicorn.error")
@@ -143,27 +144,16 @@ def _extract_svg(content: Any) -> Optional[str]:
     return svg
 
 
-def generate_diagram_crop(
-    question_image_bytes: bytes,
-    *,
-    question_text: str = "",
-    content_type: str = "image/png",
-    trace_id: str = "",
-) -> Optional[DiagramCropResult]:
-    client = get_whatai_client()
-    if not client or not client.diagram_crop_model:
-        return None
-
-    encoded = base64.b64encode(question_image_bytes).decode("utf-8")
-    data_url = f"data:{content_type};base64,{encoded}"
-    payload = {
-        "model": client.diagram_crop_model,
+def _crop_payload(model: str, question_image_bytes: bytes, question_text: str, content_type: str) -> dict[str, Any]:
+    image_url = data_url(question_image_bytes, content_type)
+    return {
+        "model": model,
         "messages": [
             {"role": "system", "content": _CROP_SYSTEM_PROMPT},
             {
                 "role": "user",
                 "content": [
-                    {"type": "image_url", "image_url": {"url": data_url, "detail": "high"}},
+                    {"type": "image_url", "image_url": {"url": image_url, "detail": "high"}},
                     {
                         "type": "text",
                         "text": _CROP_USER_PROMPT_TEMPLATE.format(
@@ -176,55 +166,110 @@ def generate_diagram_crop(
         "temperature": 0.0,
     }
 
+
+def _crop_result_from_body(
+    body: dict[str, Any],
+    question_image_bytes: bytes,
+    model: str,
+) -> Optional[DiagramCropResult]:
+    message_content = (
+        body.get("choices", [{}])[0]
+        .get("message", {})
+        .get("content", "")
+    )
+    raw_box = _parse_diagram_box(message_content)
+    if not raw_box:
+        return None
+    image_w, image_h = get_image_size(question_image_bytes)
+    normalized_box = normalize_image_box_for_source(raw_box, image_w, image_h)
+    if not normalized_box:
+        return None
+    cropped_bytes, out_w, out_h = crop_image(
+        question_image_bytes,
+        normalized_box.ymin,
+        normalized_box.xmin,
+        normalized_box.ymax,
+        normalized_box.xmax,
+        max_size=None,
+    )
+    if not has_meaningful_content(cropped_bytes):
+        return None
+    return DiagramCropResult(
+        image_bytes=cropped_bytes,
+        width=out_w,
+        height=out_h,
+        box=normalized_box,
+        model=model,
+    )
+
+
+def generate_diagram_crop(
+    question_image_bytes: bytes,
+    *,
+    question_text: str = "",
+    content_type: str = "image/png",
+    trace_id: str = "",
+) -> Optional[DiagramCropResult]:
+    client = get_whatai_client()
+    if not client or not client.diagram_crop_model:
+        return None
+    if circuit_open("whatai", client.diagram_crop_model):
+        logger.info("Whatai diagram crop skipped: circuit open")
+        return None
+
+    payload = _crop_payload(client.diagram_crop_model, question_image_bytes, question_text, content_type)
     try:
         body = client.base_client.chat_completions(
             payload,
             trace_id=trace_id or "whatai_diagram_crop",
         )
-        message_content = (
-            body.get("choices", [{}])[0]
-            .get("message", {})
-            .get("content", "")
-        )
-        raw_box = _parse_diagram_box(message_content)
-        if not raw_box:
-            return None
-        image_w, image_h = get_image_size(question_image_bytes)
-        normalized_box = normalize_image_box_for_source(raw_box, image_w, image_h)
-        if not normalized_box:
-            return None
-        cropped_bytes, out_w, out_h = crop_image(
-            question_image_bytes,
-            normalized_box.ymin,
-            normalized_box.xmin,
-            normalized_box.ymax,
-            normalized_box.xmax,
-            max_size=None,
-        )
-        if not has_meaningful_content(cropped_bytes):
-            return None
-        return DiagramCropResult(
-            image_bytes=cropped_bytes,
-            width=out_w,
-            height=out_h,
-            box=normalized_box,
-            model=client.diagram_crop_model,
-        )
+        return _crop_result_from_body(body, question_image_bytes, client.diagram_crop_model)
     except (LlmClientError, ValueError) as exc:
         logger.warning("Whatai diagram crop failed: %s", str(exc))
         return None
 
 
-def generate_diagram_svg(
-    question_text: str,
+async def generate_diagram_crop_async(
+    question_image_bytes: bytes,
     *,
-    diagram_image_bytes: Optional[bytes] = None,
+    question_text: str = "",
+    content_type: str = "image/png",
     trace_id: str = "",
-) -> Optional[str]:
+) -> Optional[DiagramCropResult]:
+    """Async variant of `generate_diagram_crop`; the local crop runs in a worker thread."""
     client = get_whatai_client()
-    if not client or not client.diagram_svg_model:
+    if not client or not client.diagram_crop_model:
         return None
+    if circuit_open("whatai", client.diagram_crop_model):
+        logger.info("Whatai diagram crop skipped: circuit open")
+        return None
+    if client.async_client is None:
+        return await asyncio.to_thread(
+            generate_diagram_crop,
+            question_image_bytes,
+            question_text=question_text,
+            content_type=content_type,
+            trace_id=trace_id,
+        )
+
+    payload = _crop_payload(client.diagram_crop_model, question_image_bytes, question_text, content_type)
+    try:
+        body = await client.async_client.chat_completions(
+            payload,
+            trace_id=trace_id or "whatai_diagram_crop",
+        )
+        return await asyncio.to_thread(
+            _crop_result_from_body,
+            body,
+            question_image_bytes,
+            client.diagram_crop_model,
+        )
+    except (LlmClientError, ValueError) as exc:
+        logger.warning("Whatai diagram crop failed: %s", str(exc))
+        return None
+
 
+def _svg_payload(model: str, question_text: str, diagram_image_bytes: Optional[bytes]) -> dict[str, Any]:
     user_content: list[dict[str, Any]] = [
         {
             "type": "text",
@@ -232,19 +277,18 @@ def generate_diagram_svg(
         }
     ]
     if diagram_image_bytes:
-        encoded = base64.b64encode(diagram_image_bytes).decode("utf-8")
         user_content.append(
             {
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/png;base64,{encoded}",
+                    "url": data_url(diagram_image_bytes, "image/png"),
                     "detail": "low",
                 },
             }
         )
 
-    payload = {
-        "model": client.diagram_svg_model,
+    return {
+        "model": model,
         "messages": [
             {"role": "system", "content": _SVG_SYSTEM_PROMPT},
             {"role": "user", "content": user_content},
@@ -252,17 +296,69 @@ def generate_diagram_svg(
         "temperature": 0.2,
     }
 
+
+def _svg_from_body(body: dict[str, Any]) -> Optional[str]:
+    message_content = (
+        body.get("choices", [{}])[0]
+        .get("message", {})
+        .get("content", "")
+    )
+    return _extract_svg(message_content)
+
+
+def generate_diagram_svg(
+    question_text: str,
+    *,
+    diagram_image_bytes: Optional[bytes] = None,
+    trace_id: str = "",
+) -> Optional[str]:
+    client = get_whatai_client()
+    if not client or not client.diagram_svg_model:
+        return None
+    if circuit_open("whatai", client.diagram_svg_model):
+        logger.info("Whatai diagram svg skipped: circuit open")
+        return None
+
+    payload = _svg_payload(client.diagram_svg_model, question_text, diagram_image_bytes)
     try:
         body = client.base_client.chat_completions(
             payload,
             trace_id=trace_id or "whatai_diagram_svg",
         )
-        message_content = (
-            body.get("choices", [{}])[0]
-            .get("message", {})
-            .get("content", "")
+        return _svg_from_body(body)
+    except LlmClientError as exc:
+        logger.warning("Whatai diagram svg generation failed: %s", str(exc))
+        return None
+
+
+async def generate_diagram_svg_async(
+    question_text: str,
+    *,
+    diagram_image_bytes: Optional[bytes] = None,
+    trace_id: str = "",
+) -> Optional[str]:
+    """Async variant of `generate_diagram_svg`."""
+    client = get_whatai_client()
+    if not client or not client.diagram_svg_model:
+        return None
+    if circuit_open("whatai", client.diagram_svg_model):
+        logger.info("Whatai diagram svg skipped: circuit open")
+        return None
+    if client.async_client is None:
+        return await asyncio.to_thread(
+            generate_diagram_svg,
+            question_text,
+            diagram_image_bytes=diagram_image_bytes,
+            trace_id=trace_id,
+        )
+
+    payload = _svg_payload(client.diagram_svg_model, question_text, diagram_image_bytes)
+    try:
+        body = await client.async_client.chat_completions(
+            payload,
+            trace_id=trace_id or "whatai_diagram_svg",
         )
-        return _extract_svg(message_content)
+        return _svg_from_body(body)
     except LlmClientError as exc:
         logger.warning("Whatai diagram svg generation failed: %s", str(exc))
         return None
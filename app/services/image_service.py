@@ -1,9 +1,12 @@
+from dataclasses import dataclass
 from io import BytesIO
+import math
 from pathlib import Path
 from tempfile import TemporaryDirectory
 import subprocess
+import time
 from typing import Any, Optional
-from PIL import Image, ImageFilter, ImageOps
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
 import logging
 from app.schemas.common import ImageBox
 
@@ -91,6 +94,24 @@ MEANINGFUL_ALPHA_MIN_RATIO = 0.01
 MEANINGFUL_DARK_PIXEL_THRESHOLD = 175
 MEANINGFUL_MIN_DARK_RATIO_DEFAULT = 0.012
 
+# Local pre-check of an OCR image_box before the refine LLM pass.
+DIAGRAM_PRECHECK_MAX_SIDE = 480
+DIAGRAM_PRECHECK_RING_RATIO = 0.25
+DIAGRAM_PRECHECK_RING_MIN = 4
+DIAGRAM_PRECHECK_MIN_AREA_RATIO = 0.08
+DIAGRAM_PRECHECK_MAX_AREA_RATIO = 0.92
+DIAGRAM_PRECHECK_CUT_RATIO_MAX = 0.15
+DIAGRAM_PRECHECK_FILL_TARGET = 0.55
+DIAGRAM_PRECHECK_BORDER_WEIGHT = 0.6
+
+# Batched refine: question snapshots tiled into one labelled composite image.
+MOSAIC_MAX_SIDE = 2048
+MOSAIC_TILE_MAX_SIDE = 768
+MOSAIC_GAP = 24
+MOSAIC_LABEL_HEIGHT = 36
+MOSAIC_FRAME_COLOR = (170, 170, 170)
+MOSAIC_LABEL_COLOR = (200, 30, 30)
+
 BOX_NEEDLE_ASPECT_MIN = 0.35
 BOX_NEEDLE_ASPECT_MAX = 7.0
 BOX_IDEAL_ASPECT = 1.8
@@ -98,8 +119,33 @@ BOX_SCALE_SIDE_THRESHOLD = 2500
 BOX_SCALE_COORD_MAX = 1300
 BOX_SCALE_AREA_GAIN_THRESHOLD = 1.2
 
+# Working page: JPEG draft decoding may land down to this fraction of OCR_WORKING_MAX_SIDE,
+# which saves the full-resolution resize; anything still above the cap is resized.
+WORKING_DRAFT_MIN_FILL = 0.75
+WORKING_RESIZE_REDUCING_GAP = 2.0
+
 PREPROCESS_DESKEW_MIN_PIXELS = 120
 PREPROCESS_DESKEW_MAX_ANGLE = 18.0
+# 倾角在不超过该长边的缩小副本上估计，内存与耗时不随照片尺寸增长。
+PREPROCESS_DESKEW_MAX_SIDE = 1024
+
+# Preprocess profiles: quality = full-resolution NL-means (original behaviour),
+# balanced = background from a reduced copy + bilateral filter, fast = background division only.
+# auto picks fast for clean pages, quality for small noisy pages and balanced otherwise.
+PREPROCESS_PROFILE_QUALITY = "quality"
+PREPROCESS_PROFILE_BALANCED = "balanced"
+PREPROCESS_PROFILE_FAST = "fast"
+PREPROCESS_PROFILE_AUTO = "auto"
+PREPROCESS_PROFILES = (PREPROCESS_PROFILE_QUALITY, PREPROCESS_PROFILE_BALANCED, PREPROCESS_PROFILE_FAST)
+PREPROCESS_BACKGROUND_SIGMA = 17.0
+PREPROCESS_BACKGROUND_MAX_SIDE = 1024
+PREPROCESS_NLMEANS_H = 10
+PREPROCESS_BILATERAL_DIAMETER = 5
+PREPROCESS_BILATERAL_SIGMA_COLOR = 40
+PREPROCESS_BILATERAL_SIGMA_SPACE = 5
+PREPROCESS_NOISE_CROP_SIDE = 512
+PREPROCESS_AUTO_CLEAN_NOISE_MAX = 2.0
+PREPROCESS_AUTO_QUALITY_MAX_MEGAPIXELS = 2.0
 
 
 def _is_heic(content_type: str, filename: str) -> bool:
@@ -118,19 +164,72 @@ def _replace_ext(filename: str, new_ext: str) -> str:
     return f"{stem}{new_ext}"
 
 
-def _encode_normalized_jpeg(image_bytes: bytes) -> bytes:
+def _working_size(size: tuple[int, int], max_side: int) -> tuple[int, int]:
+    width, height = size
+    longest = max(width, height)
+    if max_side <= 0 or longest <= max_side:
+        return width, height
+    ratio = max_side / float(longest)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+
+def draft_for_max_side(img: Image.Image, max_side: int) -> int:
+    """
+    Before load(): let a JPEG decode at 1/2, 1/4 or 1/8 scale (DCT scaling) while its
+    longest side stays >= WORKING_DRAFT_MIN_FILL * max_side. Returns the scale used.
     """
-    Decode -> apply EXIF orientation -> encode as JPEG.
+    if img.format != "JPEG" or max_side <= 0:
+        return 1
+    raw_size = img.size
+    requested = _working_size(raw_size, int(max_side * WORKING_DRAFT_MIN_FILL))
+    if requested == raw_size or img.draft(img.mode, requested) is None:
+        return 1
+    return max(1, round(raw_size[0] / img.size[0]))
+
+
+def _decode_working_page(image_bytes: bytes, max_side: int = 0) -> tuple[Image.Image, dict[str, Any]]:
+    """
+    Decode -> apply EXIF orientation -> cap to `max_side`, as an RGB image in memory.
     This keeps OCR/cropping coordinate space consistent.
+
+    JPEG sources much larger than the cap are decoded with `draft()` (DCT scaling
+    to 1/2, 1/4 or 1/8, down to WORKING_DRAFT_MIN_FILL of the cap); what is still
+    above the cap is resized.
+    Returns the scale info: source size (after orientation) and working/source scale.
     """
-    with Image.open(BytesIO(image_bytes)) as img:
-        normalized = ImageOps.exif_transpose(img)
-        if normalized.mode != "RGB":
-            normalized = normalized.convert("RGB")
-        buffer = BytesIO()
-        normalized.save(buffer, format="JPEG", quality=92)
-        buffer.seek(0)
-        return buffer.read()
+    # 不用 with：close() 会释放像素，而这里要把解码结果交给后续阶段（数据源是内存 BytesIO）。
+    img = Image.open(BytesIO(image_bytes))
+    source_width, source_height = img.size
+    draft_scale = draft_for_max_side(img, max_side)
+    if img.getexif().get(EXIF_ORIENTATION_TAG) in EXIF_ORIENTATION_SWAPS_AXES:
+        source_width, source_height = source_height, source_width
+    img.load()
+    ImageOps.exif_transpose(img, in_place=True)
+    page = img if img.mode == "RGB" else img.convert("RGB")
+    target = _working_size(page.size, max_side)
+    if target != page.size:
+        page = page.resize(
+            target,
+            Image.Resampling.LANCZOS,
+            reducing_gap=WORKING_RESIZE_REDUCING_GAP,
+        )
+    return page, {
+        "source_width": source_width,
+        "source_height": source_height,
+        "working_scale": round(page.size[0] / float(source_width), 6),
+        "draft_scale": draft_scale,
+    }
+
+
+def _encode_page_jpeg(page: Image.Image, quality: int = 92) -> bytes:
+    buffer = BytesIO()
+    page.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _encode_normalized_jpeg(image_bytes: bytes, max_side: int = 0) -> tuple[bytes, dict[str, Any]]:
+    page, scale_info = _decode_working_page(image_bytes, max_side)
+    return _encode_page_jpeg(page), scale_info
 
 
 def _convert_heic_with_sips(image_bytes: bytes) -> bytes:
@@ -157,26 +256,29 @@ def _convert_heic_with_sips(image_bytes: bytes) -> bytes:
         return converted
 
 
-def normalize_image_for_ocr(
+def _normalize_page(
     image_bytes: bytes,
     content_type: str,
     filename: str,
-) -> tuple[bytes, str, str]:
+    max_side: int,
+) -> tuple[Optional[Image.Image], str, dict[str, Any]]:
     """
-    Normalize upload image before OCR call.
-    - Convert HEIC/HEIF to JPEG to satisfy upstream OCR provider.
+    Decode the upload into the working page (HEIC via Pillow plugin or `sips`).
+    Returns (page, filename, scale info); page is None when a non-HEIC upload
+    cannot be decoded and the original bytes should be used as is.
     """
     safe_content_type = content_type or "image/png"
     safe_filename = filename or "upload.png"
+    jpeg_filename = _replace_ext(safe_filename, ".jpg")
 
     working_bytes = image_bytes
 
     if _is_heic(safe_content_type, safe_filename):
         # Try Pillow HEIF support first (if plugin installed).
         try:
-            working_bytes = _encode_normalized_jpeg(image_bytes)
+            page, scale_info = _decode_working_page(image_bytes, max_side)
             logger.info("Converted HEIC image with Pillow for OCR")
-            return working_bytes, "image/jpeg", _replace_ext(safe_filename, ".jpg")
+            return page, jpeg_filename, scale_info
         except Exception:
             logger.warning("Pillow HEIC conversion unavailable, fallback to sips")
 
@@ -191,27 +293,60 @@ def normalize_image_for_ocr(
 
     # Normalize orientation for all images to keep bbox coordinates stable.
     try:
-        normalized_bytes = _encode_normalized_jpeg(working_bytes)
-        return normalized_bytes, "image/jpeg", _replace_ext(safe_filename, ".jpg")
+        page, scale_info = _decode_working_page(working_bytes, max_side)
+        return page, jpeg_filename, scale_info
     except Exception:
         # For non-HEIC, keep original bytes as fallback.
         if _is_heic(safe_content_type, safe_filename):
             raise RuntimeError("HEIC/HEIF 图片转换失败，请先转成 JPG/PNG 后再上传。")
         logger.warning("Failed to normalize image orientation; using original upload bytes")
-        return image_bytes, safe_content_type, safe_filename
+        return None, safe_filename, {"working_scale": 1.0}
+
+
+def normalize_image_for_ocr(
+    image_bytes: bytes,
+    content_type: str,
+    filename: str,
+    *,
+    max_side: int = 0,
+) -> tuple[bytes, str, str, dict[str, Any]]:
+    """
+    Normalize upload image before OCR call.
+    - Convert HEIC/HEIF to JPEG to satisfy upstream OCR provider.
+    - Cap the page to `max_side` (0 = native resolution); the returned scale info
+      maps working coordinates back to the upload.
+    """
+    page, normalized_filename, scale_info = _normalize_page(image_bytes, content_type, filename, max_side)
+    if page is None:
+        return image_bytes, content_type or "image/png", normalized_filename, scale_info
+    return _encode_page_jpeg(page), "image/jpeg", normalized_filename, scale_info
 
 
 def _estimate_skew_angle(gray_image: Any) -> float:
-    _, binary = cv2.threshold(gray_image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    coords = np.column_stack(np.where(binary > 0))
-    if coords.shape[0] < PREPROCESS_DESKEW_MIN_PIXELS:
+    """
+    Return the rotation (degrees, for `_rotate_with_white_background`) that levels the page.
+    Works on a copy whose long side is at most PREPROCESS_DESKEW_MAX_SIDE.
+    """
+    height, width = gray_image.shape[:2]
+    # 整数倍缩小走 INTER_AREA 的快速路径（非整数倍约慢 3 倍）。
+    factor = max(1, math.ceil(max(height, width) / PREPROCESS_DESKEW_MAX_SIDE))
+    small = gray_image
+    if factor > 1:
+        small = cv2.resize(gray_image, None, fx=1.0 / factor, fy=1.0 / factor, interpolation=cv2.INTER_AREA)
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # 像素数门槛按面积同比例缩小。
+    min_pixels = max(1, PREPROCESS_DESKEW_MIN_PIXELS // (factor * factor))
+    if cv2.countNonZero(binary) < min_pixels:
         return 0.0
 
-    angle = float(cv2.minAreaRect(coords.astype(np.float32))[-1])
-    if angle < -45:
-        angle = -(90 + angle)
-    else:
-        angle = -angle
+    # findNonZero 给出 (x, y) 的 int32 点；minAreaRect 只依赖凸包。
+    hull = cv2.convexHull(cv2.findNonZero(binary))
+    angle = float(cv2.minAreaRect(hull)[-1])
+    # OpenCV >= 4.5.1 返回 (0, 90]，旧版为 [-90, 0)；统一折到 (-45, 45]。
+    if angle > 45:
+        angle -= 90
+    elif angle <= -45:
+        angle += 90
 
     if abs(angle) > PREPROCESS_DESKEW_MAX_ANGLE:
         return 0.0
@@ -234,77 +369,290 @@ def _rotate_with_white_background(image: Any, angle: float) -> Any:
     )
 
 
-def _opencv_preprocess_for_ocr(image_bytes: bytes) -> tuple[bytes, dict[str, Any]]:
+# dHash：缩到 (N+1)xN 灰度后比较左右相邻像素，得到 N*N 位指纹。
+DHASH_SIZE = 8
+# 采样前先缩到这个尺度以内，JPEG 可直接按 draft 模式降采样解码。
+DHASH_DECODE_SIZE = (256, 256)
+
+
+def compute_image_dhash(gray: Image.Image) -> str:
+    """整页灰度图的感知哈希（dHash），返回 16 位十六进制字符串。重拍/轻微缩放时汉明距离很小。"""
+    small = gray.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.BOX)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            value = (value << 1) | int(pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{DHASH_SIZE * DHASH_SIZE // 4}x}"
+
+
+def compute_image_dhash_from_bytes(image_bytes: bytes) -> str:
+    with Image.open(BytesIO(image_bytes)) as img:
+        img.draft("L", DHASH_DECODE_SIZE)
+        return compute_image_dhash(img)
+
+
+def estimate_noise_sigma(gray: Any) -> float:
+    """
+    Immerkær 噪声估计（3x3 拉普拉斯差分的平均绝对值），只取中心一块，
+    开销与整页尺寸无关。文字边缘会让估计略偏高。
+    """
+    height, width = gray.shape[:2]
+    side = PREPROCESS_NOISE_CROP_SIDE
+    top, left = max(0, (height - side) // 2), max(0, (width - side) // 2)
+    crop = gray[top:top + side, left:left + side].astype(np.float32)
+    if crop.shape[0] < 3 or crop.shape[1] < 3:
+        return 0.0
+    kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+    response = cv2.filter2D(crop, -1, kernel)[1:-1, 1:-1]
+    return float(math.sqrt(math.pi / 2.0) * np.abs(response).mean() / 6.0)
+
+
+def select_preprocess_profile(gray: Any, requested: str) -> tuple[str, float]:
+    """解析配置的 profile；auto 时按噪声估计与页面像素数选择。返回 (profile, 噪声估计)。"""
+    noise_sigma = estimate_noise_sigma(gray)
+    profile = (requested or PREPROCESS_PROFILE_AUTO).strip().lower()
+    if profile in PREPROCESS_PROFILES:
+        return profile, noise_sigma
+    if profile != PREPROCESS_PROFILE_AUTO:
+        logger.warning("Unknown preprocess profile %s, fallback to auto", requested)
+    megapixels = gray.shape[0] * gray.shape[1] / 1_000_000.0
+    if noise_sigma <= PREPROCESS_AUTO_CLEAN_NOISE_MAX:
+        return PREPROCESS_PROFILE_FAST, noise_sigma
+    if megapixels <= PREPROCESS_AUTO_QUALITY_MAX_MEGAPIXELS:
+        return PREPROCESS_PROFILE_QUALITY, noise_sigma
+    return PREPROCESS_PROFILE_BALANCED, noise_sigma
+
+
+def _flatten_page_background(gray: Any, exact: bool) -> Any:
+    """除以大尺度模糊得到的背景来拉平光照；非 exact 时在缩小副本上估计背景再放大。"""
+    height, width = gray.shape[:2]
+    longest = max(height, width)
+    if exact or longest <= PREPROCESS_BACKGROUND_MAX_SIDE:
+        smooth = cv2.GaussianBlur(
+            gray,
+            (0, 0),
+            sigmaX=PREPROCESS_BACKGROUND_SIGMA,
+            sigmaY=PREPROCESS_BACKGROUND_SIGMA,
+        )
+        return cv2.divide(gray, smooth, scale=255)
+    ratio = PREPROCESS_BACKGROUND_MAX_SIDE / float(longest)
+    small = cv2.resize(
+        gray,
+        (max(1, round(width * ratio)), max(1, round(height * ratio))),
+        interpolation=cv2.INTER_AREA,
+    )
+    sigma = max(1.0, PREPROCESS_BACKGROUND_SIGMA * ratio)
+    smooth = cv2.resize(
+        cv2.GaussianBlur(small, (0, 0), sigmaX=sigma, sigmaY=sigma),
+        (width, height),
+        interpolation=cv2.INTER_LINEAR,
+    )
+    return cv2.divide(gray, smooth, scale=255)
+
+
+def _opencv_preprocess_for_ocr(
+    page: Image.Image,
+    profile: str = PREPROCESS_PROFILE_QUALITY,
+) -> tuple[Any, dict[str, Any]]:
+    """在内存中的 RGB 工作页上做摆正/白平衡/降噪，返回灰度数组（编码由调用方统一做一次）。"""
     if cv2 is None or np is None:
         raise RuntimeError("OpenCV dependency unavailable")
 
-    buffer = np.frombuffer(image_bytes, dtype=np.uint8)
-    decoded = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
-    if decoded is None:
-        raise RuntimeError("OpenCV failed to decode image bytes")
-
-    gray = cv2.cvtColor(decoded, cv2.COLOR_BGR2GRAY)
+    gray = cv2.cvtColor(np.asarray(page), cv2.COLOR_RGB2GRAY)
+    profile, noise_sigma = select_preprocess_profile(gray, profile)
     deskew_angle = _estimate_skew_angle(gray)
-    deskewed = _rotate_with_white_background(decoded, deskew_angle)
-    deskewed_gray = cv2.cvtColor(deskewed, cv2.COLOR_BGR2GRAY)
+    # 只旋转灰度页：后续只用灰度结果，省掉三通道旋转与再次灰度化。
+    deskewed_gray = _rotate_with_white_background(gray, deskew_angle)
 
     # White-balance by flattening uneven background, then denoise for OCR robustness.
-    smooth = cv2.GaussianBlur(deskewed_gray, (0, 0), sigmaX=17, sigmaY=17)
-    whitened = cv2.divide(deskewed_gray, smooth, scale=255)
-    denoised = cv2.fastNlMeansDenoising(whitened, None, h=10, templateWindowSize=7, searchWindowSize=21)
-
-    ok, encoded = cv2.imencode(".jpg", denoised, [int(cv2.IMWRITE_JPEG_QUALITY), 92])
-    if not ok:
-        raise RuntimeError("OpenCV failed to encode preprocessed image")
+    whitened = _flatten_page_background(deskewed_gray, exact=profile == PREPROCESS_PROFILE_QUALITY)
+    if profile == PREPROCESS_PROFILE_QUALITY:
+        denoised = cv2.fastNlMeansDenoising(
+            whitened,
+            None,
+            h=PREPROCESS_NLMEANS_H,
+            templateWindowSize=7,
+            searchWindowSize=21,
+        )
+    elif profile == PREPROCESS_PROFILE_BALANCED:
+        denoised = cv2.bilateralFilter(
+            whitened,
+            PREPROCESS_BILATERAL_DIAMETER,
+            PREPROCESS_BILATERAL_SIGMA_COLOR,
+            PREPROCESS_BILATERAL_SIGMA_SPACE,
+        )
+    else:
+        denoised = whitened
 
-    return encoded.tobytes(), {
+    return denoised, {
         "engine": "opencv",
+        "profile": profile,
+        "noise_sigma": round(noise_sigma, 2),
         "deskew_angle": round(deskew_angle, 3),
+        # 在摆正后的灰度页上取指纹，同一张卷子不同角度重拍也能对上。
+        "image_phash": compute_image_dhash(Image.fromarray(deskewed_gray)),
     }
 
 
+def _encode_gray_jpeg(gray: Any, quality: int = 92) -> bytes:
+    ok, encoded = cv2.imencode(".jpg", gray, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise RuntimeError("OpenCV failed to encode preprocessed image")
+    return encoded.tobytes()
+
+
+def _elapsed_ms(started: float) -> int:
+    return int((time.perf_counter() - started) * 1000)
+
+
 def prepare_image_for_ocr_pipeline(
     image_bytes: bytes,
     content_type: str,
     filename: str,
     *,
     enable_local_preprocess: bool = True,
+    working_max_side: int = 0,
+    preprocess_profile: str = PREPROCESS_PROFILE_QUALITY,
 ) -> tuple[bytes, str, str, dict[str, Any]]:
-    normalized_bytes, normalized_content_type, normalized_filename = normalize_image_for_ocr(
+    """
+    Upload -> OCR page. The upload is decoded once into the working page, which
+    stays in memory through preprocessing; the page is JPEG-encoded exactly once.
+    Per-stage timings land in the metadata (preprocess_*_ms).
+    """
+    started = time.perf_counter()
+    page, normalized_filename, scale_info = _normalize_page(
         image_bytes,
         content_type,
         filename,
+        working_max_side,
     )
 
     metadata: dict[str, Any] = {
         "preprocessing_enabled": enable_local_preprocess,
         "preprocessing_applied": False,
         "preprocessing_engine": None,
+        "preprocess_profile": None,
+        "noise_sigma": None,
         "deskew_angle": None,
         "preprocessing_fallback_reason": None,
+        "image_phash": None,
+        "source_width": scale_info.get("source_width"),
+        "source_height": scale_info.get("source_height"),
+        "working_scale": scale_info.get("working_scale", 1.0),
+        "draft_scale": scale_info.get("draft_scale", 1),
+        "preprocess_decode_ms": _elapsed_ms(started),
+        "preprocess_enhance_ms": 0,
+        "preprocess_encode_ms": 0,
     }
-    if not enable_local_preprocess:
-        return normalized_bytes, normalized_content_type, normalized_filename, metadata
+    if page is None:
+        # 无法解码：原样交给 OCR。
+        try:
+            metadata["image_phash"] = compute_image_dhash_from_bytes(image_bytes)
+        except Exception as exc:
+            logger.warning("Failed to compute page hash: %s", str(exc))
+        return image_bytes, content_type or "image/png", normalized_filename, metadata
+
+    if enable_local_preprocess:
+        started = time.perf_counter()
+        try:
+            processed, details = _opencv_preprocess_for_ocr(page, preprocess_profile)
+            metadata["preprocess_enhance_ms"] = _elapsed_ms(started)
+            started = time.perf_counter()
+            processed_bytes = _encode_gray_jpeg(processed)
+            metadata["preprocess_encode_ms"] = _elapsed_ms(started)
+            metadata["preprocessing_applied"] = True
+            metadata["preprocessing_engine"] = details.get("engine")
+            metadata["preprocess_profile"] = details.get("profile")
+            metadata["noise_sigma"] = details.get("noise_sigma")
+            metadata["deskew_angle"] = details.get("deskew_angle")
+            metadata["image_phash"] = details.get("image_phash")
+            return processed_bytes, "image/jpeg", normalized_filename, metadata
+        except Exception as exc:
+            metadata["preprocess_enhance_ms"] = _elapsed_ms(started)
+            metadata["preprocessing_fallback_reason"] = str(exc)
+            logger.warning(
+                "Local preprocess unavailable/failed, fallback to normalized image: %s",
+                str(exc),
+            )
 
     try:
-        processed_bytes, details = _opencv_preprocess_for_ocr(normalized_bytes)
-        metadata["preprocessing_applied"] = True
-        metadata["preprocessing_engine"] = details.get("engine")
-        metadata["deskew_angle"] = details.get("deskew_angle")
-        return processed_bytes, "image/jpeg", normalized_filename, metadata
+        metadata["image_phash"] = compute_image_dhash(page)
     except Exception as exc:
-        metadata["preprocessing_fallback_reason"] = str(exc)
-        logger.warning(
-            "Local preprocess unavailable/failed, fallback to normalized image: %s",
-            str(exc),
-        )
-        return normalized_bytes, normalized_content_type, normalized_filename, metadata
+        logger.warning("Failed to compute page hash: %s", str(exc))
+    started = time.perf_counter()
+    normalized_bytes = _encode_page_jpeg(page)
+    metadata["preprocess_encode_ms"] = _elapsed_ms(started)
+    return normalized_bytes, "image/jpeg", normalized_filename, metadata
+
 
+EXIF_ORIENTATION_TAG = 0x0112
+# Orientation 5-8 rotate by 90/270 degrees, so the displayed width/height swap.
+EXIF_ORIENTATION_SWAPS_AXES = {5, 6, 7, 8}
 
-def get_image_size(image_bytes: bytes) -> tuple[int, int]:
+
+class ImageContext:
+    """
+    一次上传只解码一次：持有方向已校正的整页 Pillow 图像，
+    NumPy 数组按需生成并缓存，供多道题的裁剪/清理/抠图复用。
+    """
+
+    __slots__ = ("image", "_array")
+
+    def __init__(self, image: Image.Image):
+        image.load()
+        self.image = image
+        self._array: Any = None
+
+    @classmethod
+    def from_bytes(cls, image_bytes: bytes) -> "ImageContext":
+        with Image.open(BytesIO(image_bytes)) as img:
+            normalized = ImageOps.exif_transpose(img)
+            normalized.load()
+        return cls(normalized)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.image.size
+
+    @property
+    def width(self) -> int:
+        return self.image.width
+
+    @property
+    def height(self) -> int:
+        return self.image.height
+
+    @property
+    def array(self) -> Any:
+        if np is None:
+            raise RuntimeError("numpy is not available")
+        if self._array is None:
+            self._array = np.asarray(self.image)
+        return self._array
+
+    def crop(self, box: tuple[int, int, int, int]) -> Image.Image:
+        """按 (left, upper, right, lower) 裁出独立副本，不影响整页图像。"""
+        return self.image.crop(box)
+
+
+def _open_image_source(source: "bytes | ImageContext") -> Image.Image:
+    if isinstance(source, ImageContext):
+        return source.image
+    img = Image.open(BytesIO(source))
+    return ImageOps.exif_transpose(img)
+
+
+def get_image_size(image_bytes: "bytes | ImageContext") -> tuple[int, int]:
+    if isinstance(image_bytes, ImageContext):
+        return image_bytes.size
+    # 只读文件头和 EXIF，不为了取尺寸而解码/旋转整张像素。
     with Image.open(BytesIO(image_bytes)) as img:
-        normalized = ImageOps.exif_transpose(img)
-        return normalized.size
+        width, height = img.size
+        if img.getexif().get(EXIF_ORIENTATION_TAG) in EXIF_ORIENTATION_SWAPS_AXES:
+            return height, width
+        return width, height
 
 
 def _clamp_image_box(box: ImageBox, width: int, height: int) -> ImageBox:
@@ -319,14 +667,23 @@ def _image_box_area(box: ImageBox) -> int:
     return max(0, box.ymax - box.ymin) * max(0, box.xmax - box.xmin)
 
 
-def _save_png_bytes(image: Image.Image, max_size: Optional[tuple[int, int]] = (800, 800)) -> tuple[bytes, int, int]:
+def _fit_within(image: Image.Image, max_size: Optional[tuple[int, int]]) -> Image.Image:
     output = image.copy()
     if max_size:
         output.thumbnail(max_size, Image.Resampling.LANCZOS)
+    return output
+
+
+def _encode_png(image: Image.Image) -> bytes:
     buffer = BytesIO()
-    output.save(buffer, format="PNG")
+    image.save(buffer, format="PNG")
     buffer.seek(0)
-    return buffer.read(), output.width, output.height
+    return buffer.read()
+
+
+def _save_png_bytes(image: Image.Image, max_size: Optional[tuple[int, int]] = (800, 800)) -> tuple[bytes, int, int]:
+    output = _fit_within(image, max_size)
+    return _encode_png(output), output.width, output.height
 
 
 def _build_annotation_mask_np(rgb_array: Any) -> Any:
@@ -483,20 +840,17 @@ def should_use_annotation_saas_fallback(clean_stats: dict[str, Any]) -> tuple[bo
     return False, None
 
 
-def _flatten_background_to_white(image: Image.Image) -> Image.Image:
-    """
-    Normalize uneven paper background into near-white while preserving strokes.
-    Useful for photos with gray/yellow shadows.
-    """
-    rgb = image.convert("RGB")
+def _estimate_flatten_background(rgb: Image.Image) -> Image.Image:
     width, height = rgb.size
-
     blur_radius = max(
         BG_FLATTEN_BLUR_RADIUS_MIN,
         int(min(width, height) * BG_FLATTEN_BLUR_RADIUS_RATIO),
     )
-    bg = rgb.convert("L").filter(ImageFilter.GaussianBlur(radius=blur_radius))
+    return rgb.convert("L").filter(ImageFilter.GaussianBlur(radius=blur_radius))
 
+
+def _flatten_background_to_white_basic(rgb: Image.Image, bg: Image.Image) -> Image.Image:
+    width, height = rgb.size
     src = rgb.load()
     bg_px = bg.load()
     out = Image.new("RGB", (width, height))
@@ -515,6 +869,27 @@ def _flatten_background_to_white(image: Image.Image) -> Image.Image:
     return out
 
 
+def _flatten_background_to_white_np(rgb: Image.Image, bg: Image.Image) -> Image.Image:
+    src = np.asarray(rgb, dtype=np.float64)
+    base = np.maximum(np.asarray(bg, dtype=np.float64), 12.0)
+    gain = np.clip(BG_FLATTEN_GAIN_TARGET / base, BG_FLATTEN_GAIN_MIN, BG_FLATTEN_GAIN_MAX)
+    # Same arithmetic as the per-pixel path: int() truncates toward zero before clipping.
+    out = np.trunc((src - 128.0) * gain[:, :, None] + 128.0 + BG_FLATTEN_LIGHT_BOOST)
+    return Image.fromarray(np.clip(out, 0, 255).astype(np.uint8), mode="RGB")
+
+
+def _flatten_background_to_white(image: Image.Image) -> Image.Image:
+    """
+    Normalize uneven paper background into near-white while preserving strokes.
+    Useful for photos with gray/yellow shadows.
+    """
+    rgb = image.convert("RGB")
+    bg = _estimate_flatten_background(rgb)
+    if np is None:
+        return _flatten_background_to_white_basic(rgb, bg)
+    return _flatten_background_to_white_np(rgb, bg)
+
+
 def _composite_on_white(image: Image.Image) -> Image.Image:
     if image.mode != "RGBA":
         return image.convert("RGB")
@@ -555,6 +930,75 @@ def _compute_otsu_threshold(gray: Image.Image) -> int:
     return max(OTSU_MIN_THRESHOLD, min(OTSU_MAX_THRESHOLD, threshold))
 
 
+def _cluster_diagram_components(
+    components: list[dict[str, Any]],
+    pad_x: int,
+    pad_y: int,
+) -> list[list[int]]:
+    """
+    Group components whose bboxes (grown by pad_x/pad_y) touch, i.e. the
+    transitive closure of the pairwise "near" rule.
+    A uniform grid bucket index limits comparisons to components sharing a
+    cell, and union-find merges them, so the cost stays near-linear in the
+    number of components. Clusters are returned in order of their first member.
+    """
+    n = len(components)
+    if n == 0:
+        return []
+
+    # Component i is near j iff [min_x, max_x + pad_x] x [min_y, max_y + pad_y] overlap.
+    spans_x = sorted(comp["max_x"] - comp["min_x"] + 1 + pad_x for comp in components)
+    spans_y = sorted(comp["max_y"] - comp["min_y"] + 1 + pad_y for comp in components)
+    cell_w = max(1, spans_x[n // 2])
+    cell_h = max(1, spans_y[n // 2])
+
+    parent = list(range(n))
+    size = [1] * n
+
+    def _find(idx: int) -> int:
+        root = idx
+        while parent[root] != root:
+            root = parent[root]
+        while parent[idx] != root:
+            parent[idx], idx = root, parent[idx]
+        return root
+
+    def _union(a: int, b: int) -> None:
+        root_a = _find(a)
+        root_b = _find(b)
+        if root_a == root_b:
+            return
+        if size[root_a] < size[root_b]:
+            root_a, root_b = root_b, root_a
+        parent[root_b] = root_a
+        size[root_a] += size[root_b]
+
+    grid: dict[tuple[int, int], list[int]] = {}
+    for i, comp in enumerate(components):
+        checked: set[int] = set()
+        for cx in range(comp["min_x"] // cell_w, (comp["max_x"] + pad_x) // cell_w + 1):
+            for cy in range(comp["min_y"] // cell_h, (comp["max_y"] + pad_y) // cell_h + 1):
+                bucket = grid.setdefault((cx, cy), [])
+                for j in bucket:
+                    if j in checked:
+                        continue
+                    checked.add(j)
+                    other = components[j]
+                    if not (
+                        comp["max_x"] + pad_x < other["min_x"]
+                        or other["max_x"] + pad_x < comp["min_x"]
+                        or comp["max_y"] + pad_y < other["min_y"]
+                        or other["max_y"] + pad_y < comp["min_y"]
+                    ):
+                        _union(i, j)
+                bucket.append(i)
+
+    clusters: dict[int, list[int]] = {}
+    for i in range(n):
+        clusters.setdefault(_find(i), []).append(i)
+    return list(clusters.values())
+
+
 def _extract_diagram_cutout(image: Image.Image) -> Image.Image:
     """
     在候选图示框中做前景提取并聚类，仅保留最可能的图示簇，输出透明 PNG。
@@ -564,73 +1008,14 @@ def _extract_diagram_cutout(image: Image.Image) -> Image.Image:
     img_area = max(1, width * height)
 
     threshold = _compute_otsu_threshold(gray)
-    raw = gray.tobytes()
-    binary = bytearray(1 if value < threshold else 0 for value in raw)
-    visited = bytearray(len(binary))
-
-    components = []
     min_component = max(
         DIAGRAM_COMPONENT_MIN_AREA_PIXELS,
         int(img_area * DIAGRAM_COMPONENT_MIN_AREA_RATIO),
     )
-
-    def _neighbors(idx: int):
-        y, x = divmod(idx, width)
-        if x > 0:
-            yield idx - 1
-        if x + 1 < width:
-            yield idx + 1
-        if y > 0:
-            yield idx - width
-        if y + 1 < height:
-            yield idx + width
-
-    for idx, is_fg in enumerate(binary):
-        if not is_fg or visited[idx]:
-            continue
-        stack = [idx]
-        visited[idx] = 1
-        pixels = []
-        min_x = width
-        max_x = 0
-        min_y = height
-        max_y = 0
-
-        while stack:
-            cur = stack.pop()
-            cy, cx = divmod(cur, width)
-            pixels.append(cur)
-            if cx < min_x:
-                min_x = cx
-            if cx > max_x:
-                max_x = cx
-            if cy < min_y:
-                min_y = cy
-            if cy > max_y:
-                max_y = cy
-            for nxt in _neighbors(cur):
-                if binary[nxt] and not visited[nxt]:
-                    visited[nxt] = 1
-                    stack.append(nxt)
-
-        area = len(pixels)
-        if area < min_component:
-            continue
-        box_w = max(1, max_x - min_x + 1)
-        box_h = max(1, max_y - min_y + 1)
-        density = area / (box_w * box_h)
-        components.append(
-            {
-                "pixels": pixels,
-                "area": area,
-                "min_x": min_x,
-                "max_x": max_x,
-                "min_y": min_y,
-                "max_y": max_y,
-                "center_y": (min_y + max_y) / 2.0,
-                "density": density,
-            }
-        )
+    if cv2 is None or np is None:
+        label_map, components = _label_diagram_components_basic(gray, threshold, min_component)
+    else:
+        label_map, components = _label_diagram_components_cc(gray, threshold, min_component)
 
     if not components:
         return image.convert("RGBA")
@@ -650,36 +1035,11 @@ def _extract_diagram_cutout(image: Image.Image) -> Image.Image:
         filtered = components
 
     # 按 bbox 接近关系聚类，优先取面积更大且位置更靠上的簇
-    n = len(filtered)
-    visited_cluster = [False] * n
     pad_x = max(DIAGRAM_CLUSTER_GAP_X_MIN, int(width * DIAGRAM_CLUSTER_GAP_X_RATIO))
     pad_y = max(DIAGRAM_CLUSTER_GAP_Y_MIN, int(height * DIAGRAM_CLUSTER_GAP_Y_RATIO))
 
-    def _is_near(a: dict, b: dict) -> bool:
-        return not (
-            a["max_x"] + pad_x < b["min_x"]
-            or b["max_x"] + pad_x < a["min_x"]
-            or a["max_y"] + pad_y < b["min_y"]
-            or b["max_y"] + pad_y < a["min_y"]
-        )
-
     clusters = []
-    for i in range(n):
-        if visited_cluster[i]:
-            continue
-        queue = [i]
-        visited_cluster[i] = True
-        indices = []
-        while queue:
-            cur = queue.pop()
-            indices.append(cur)
-            for j in range(n):
-                if visited_cluster[j]:
-                    continue
-                if _is_near(filtered[cur], filtered[j]):
-                    visited_cluster[j] = True
-                    queue.append(j)
-
+    for indices in _cluster_diagram_components(filtered, pad_x, pad_y):
         cluster_area = sum(filtered[idx]["area"] for idx in indices)
         min_y = min(filtered[idx]["min_y"] for idx in indices)
         max_y = max(filtered[idx]["max_y"] for idx in indices)
@@ -731,12 +1091,11 @@ def _extract_diagram_cutout(image: Image.Image) -> Image.Image:
         if x_gap <= max_gap_x and y_gap <= max_gap_y:
             selected_component_indices.update(cluster["indices"])
 
-    alpha = Image.new("L", (width, height), 0)
-    alpha_px = alpha.load()
-    for idx in selected_component_indices:
-        for p in filtered[idx]["pixels"]:
-            py, px = divmod(p, width)
-            alpha_px[px, py] = 255
+    selected_labels = [filtered[idx]["label"] for idx in selected_component_indices]
+    if cv2 is None or np is None:
+        alpha = _paint_component_alpha_basic(label_map, selected_labels, width, height)
+    else:
+        alpha = _paint_component_alpha_np(label_map, selected_labels)
 
     # 轻微膨胀，避免线条被切断
     alpha = alpha.filter(ImageFilter.MaxFilter(DIAGRAM_ALPHA_DILATE_SIZE))
@@ -757,12 +1116,139 @@ def _extract_diagram_cutout(image: Image.Image) -> Image.Image:
     return rgb
 
 
+def _label_diagram_components_cc(
+    gray: Image.Image,
+    threshold: int,
+    min_component: int,
+) -> tuple[Any, list[dict[str, Any]]]:
+    """
+    Label 4-connected foreground components with OpenCV.
+    Per-component bbox/area/density are computed as arrays; only components
+    above `min_component` are materialized, and pixels stay in the label image.
+    """
+    binary = (np.asarray(gray) < threshold).astype(np.uint8)
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=4)
+    if num_labels <= 1:
+        return labels, []
+
+    stats = stats[1:]
+    areas = stats[:, cv2.CC_STAT_AREA]
+    min_xs = stats[:, cv2.CC_STAT_LEFT]
+    min_ys = stats[:, cv2.CC_STAT_TOP]
+    max_xs = min_xs + stats[:, cv2.CC_STAT_WIDTH] - 1
+    max_ys = min_ys + stats[:, cv2.CC_STAT_HEIGHT] - 1
+    densities = areas / (stats[:, cv2.CC_STAT_WIDTH] * stats[:, cv2.CC_STAT_HEIGHT]).astype(np.float64)
+
+    # Labels follow raster order of each component's first pixel, same as the flood-fill scan.
+    components = [
+        {
+            "label": int(idx) + 1,
+            "area": int(areas[idx]),
+            "min_x": int(min_xs[idx]),
+            "max_x": int(max_xs[idx]),
+            "min_y": int(min_ys[idx]),
+            "max_y": int(max_ys[idx]),
+            "center_y": (int(min_ys[idx]) + int(max_ys[idx])) / 2.0,
+            "density": float(densities[idx]),
+        }
+        for idx in np.flatnonzero(areas >= min_component)
+    ]
+    return labels, components
+
+
+def _paint_component_alpha_np(labels: Any, selected_labels: list[int]) -> Image.Image:
+    lookup = np.zeros(int(labels.max()) + 1, dtype=np.uint8)
+    lookup[selected_labels] = 255
+    return Image.fromarray(lookup[labels], mode="L")
+
+
+def _label_diagram_components_basic(
+    gray: Image.Image,
+    threshold: int,
+    min_component: int,
+) -> tuple[list[int], list[dict[str, Any]]]:
+    width, height = gray.size
+    raw = gray.tobytes()
+    binary = bytearray(1 if value < threshold else 0 for value in raw)
+    label_map = [0] * len(binary)
+    next_label = 0
+    components = []
+
+    def _neighbors(idx: int):
+        y, x = divmod(idx, width)
+        if x > 0:
+            yield idx - 1
+        if x + 1 < width:
+            yield idx + 1
+        if y > 0:
+            yield idx - width
+        if y + 1 < height:
+            yield idx + width
+
+    for idx, is_fg in enumerate(binary):
+        if not is_fg or label_map[idx]:
+            continue
+        next_label += 1
+        stack = [idx]
+        label_map[idx] = next_label
+        area = 0
+        min_x = width
+        max_x = 0
+        min_y = height
+        max_y = 0
+
+        while stack:
+            cur = stack.pop()
+            cy, cx = divmod(cur, width)
+            area += 1
+            if cx < min_x:
+                min_x = cx
+            if cx > max_x:
+                max_x = cx
+            if cy < min_y:
+                min_y = cy
+            if cy > max_y:
+                max_y = cy
+            for nxt in _neighbors(cur):
+                if binary[nxt] and not label_map[nxt]:
+                    label_map[nxt] = next_label
+                    stack.append(nxt)
+
+        if area < min_component:
+            continue
+        box_w = max(1, max_x - min_x + 1)
+        box_h = max(1, max_y - min_y + 1)
+        density = area / (box_w * box_h)
+        components.append(
+            {
+                "label": next_label,
+                "area": area,
+                "min_x": min_x,
+                "max_x": max_x,
+                "min_y": min_y,
+                "max_y": max_y,
+                "center_y": (min_y + max_y) / 2.0,
+                "density": density,
+            }
+        )
+    return label_map, components
+
+
+def _paint_component_alpha_basic(
+    label_map: list[int],
+    selected_labels: list[int],
+    width: int,
+    height: int,
+) -> Image.Image:
+    selected = set(selected_labels)
+    data = bytes(255 if label in selected else 0 for label in label_map)
+    return Image.frombytes("L", (width, height), data)
+
+
 def _alpha_coverage_ratio(image: Image.Image) -> float:
-    rgba = image.convert("RGBA")
-    alpha = rgba.getchannel("A")
-    non_transparent = sum(1 for value in alpha.getdata() if value > 0)
+    rgba = image if image.mode == "RGBA" else image.convert("RGBA")
     total = max(1, rgba.width * rgba.height)
-    return non_transparent / total
+    return _nonzero_alpha_count(rgba) / total
 
 
 def _extract_diagram_cutout_relaxed(image: Image.Image) -> Image.Image:
@@ -790,21 +1276,7 @@ def _extract_diagram_cutout_relaxed(image: Image.Image) -> Image.Image:
     return rgba
 
 
-def _find_foreground_segment(
-    profile: list[float],
-    gap: int = 6,
-    prefer_top: bool = False,
-) -> Optional[tuple[int, int]]:
-    if not profile:
-        return None
-    max_value = max(profile)
-    if max_value < FOREGROUND_PROFILE_MIN_PEAK:
-        return None
-
-    threshold = max(
-        FOREGROUND_PROFILE_BASE_THRESHOLD,
-        max_value * FOREGROUND_PROFILE_PEAK_THRESHOLD_RATIO,
-    )
+def _profile_runs_basic(profile: list[float], threshold: float) -> list[tuple[int, int, float]]:
     segments: list[tuple[int, int, float]] = []
     start = None
     score = 0.0
@@ -823,6 +1295,46 @@ def _find_foreground_segment(
                 score = 0.0
     if start is not None:
         segments.append((start, len(profile) - 1, score))
+    return segments
+
+
+def _profile_runs_np(profile: Any, threshold: float) -> list[tuple[int, int, float]]:
+    """Run-length encode `profile >= threshold` into (start, end, summed value) segments."""
+    above = profile >= threshold
+    edges = np.diff(np.concatenate(([False], above, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(above, profile, 0.0))))
+    scores = sums[ends] - sums[starts]
+    return [
+        (int(start), int(end) - 1, float(score))
+        for start, end, score in zip(starts, ends, scores)
+    ]
+
+
+def _find_foreground_segment(
+    profile: Any,
+    gap: int = 6,
+    prefer_top: bool = False,
+) -> Optional[tuple[int, int]]:
+    if len(profile) == 0:
+        return None
+    if np is None:
+        max_value = max(profile)
+    else:
+        profile = np.asarray(profile, dtype=np.float64)
+        max_value = float(profile.max())
+    if max_value < FOREGROUND_PROFILE_MIN_PEAK:
+        return None
+
+    threshold = max(
+        FOREGROUND_PROFILE_BASE_THRESHOLD,
+        max_value * FOREGROUND_PROFILE_PEAK_THRESHOLD_RATIO,
+    )
+    if np is None:
+        segments = _profile_runs_basic(profile, threshold)
+    else:
+        segments = _profile_runs_np(profile, threshold)
 
     if not segments:
         return None
@@ -869,13 +1381,7 @@ def _find_foreground_segment(
     return best
 
 
-def _tighten_to_foreground(
-    image: Image.Image,
-    *,
-    prefer_top: bool = True,
-    trim_bottom_on_tall: bool = True,
-) -> Image.Image:
-    gray = image.convert("L")
+def _foreground_profiles_basic(gray: Image.Image) -> tuple[list[float], list[float]]:
     width, height = gray.size
     pixels = gray.load()
 
@@ -894,6 +1400,26 @@ def _tighten_to_foreground(
             if pixels[x, y] < FOREGROUND_DARK_PIXEL_THRESHOLD:
                 dark += 1
         col_profile.append(dark / max(1, height))
+    return row_profile, col_profile
+
+
+def _foreground_profiles(gray: Image.Image) -> tuple[Any, Any]:
+    """Per-row / per-column share of dark pixels."""
+    if np is None:
+        return _foreground_profiles_basic(gray)
+    dark = np.asarray(gray) < FOREGROUND_DARK_PIXEL_THRESHOLD
+    return dark.mean(axis=1), dark.mean(axis=0)
+
+
+def _tighten_to_foreground(
+    image: Image.Image,
+    *,
+    prefer_top: bool = True,
+    trim_bottom_on_tall: bool = True,
+) -> Image.Image:
+    gray = image.convert("L")
+    width, height = gray.size
+    row_profile, col_profile = _foreground_profiles(gray)
 
     row_seg = _find_foreground_segment(row_profile, gap=3, prefer_top=prefer_top)
     col_seg = _find_foreground_segment(col_profile, gap=4)
@@ -925,6 +1451,32 @@ def _tighten_to_foreground(
     return image.crop((left, top, right, bottom))
 
 
+def _nonzero_alpha_count(image: Image.Image) -> int:
+    alpha_hist = image.getchannel("A").histogram()
+    return image.width * image.height - alpha_hist[0]
+
+
+def has_meaningful_image_content(
+    image: Any,
+    min_dark_ratio: float = MEANINGFUL_MIN_DARK_RATIO_DEFAULT,
+) -> bool:
+    """
+    Same check as `has_meaningful_content`, on an already decoded Pillow image,
+    NumPy array or `ImageContext`, so callers holding pixels never re-encode to PNG for it.
+    """
+    if isinstance(image, ImageContext):
+        image = image.image
+    elif np is not None and isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    total = max(1, image.width * image.height)
+    if "A" in image.getbands():
+        if _nonzero_alpha_count(image) / total < MEANINGFUL_ALPHA_MIN_RATIO:
+            return False
+    gray_hist = image.convert("L").histogram()
+    dark = sum(gray_hist[:MEANINGFUL_DARK_PIXEL_THRESHOLD])
+    return (dark / total) >= min_dark_ratio
+
+
 def has_meaningful_content(
     image_bytes: bytes,
     min_dark_ratio: float = MEANINGFUL_MIN_DARK_RATIO_DEFAULT,
@@ -934,26 +1486,96 @@ def has_meaningful_content(
     """
     try:
         with Image.open(BytesIO(image_bytes)) as img:
-            if "A" in img.getbands():
-                alpha = img.getchannel("A")
-                non_transparent = sum(1 for value in alpha.getdata() if value > 0)
-                total = max(1, img.width * img.height)
-                if non_transparent / total < MEANINGFUL_ALPHA_MIN_RATIO:
-                    return False
-            gray = img.convert("L")
-            pixels = gray.load()
-            width, height = gray.size
-            dark = 0
-            total = max(1, width * height)
-            for y in range(height):
-                for x in range(width):
-                    if pixels[x, y] < MEANINGFUL_DARK_PIXEL_THRESHOLD:
-                        dark += 1
-            return (dark / total) >= min_dark_ratio
+            return has_meaningful_image_content(img, min_dark_ratio=min_dark_ratio)
     except Exception:
         return True
 
 
+def score_diagram_box(
+    source: "bytes | ImageContext",
+    question_box: ImageBox,
+    image_box: ImageBox,
+) -> dict[str, Any]:
+    """
+    本地评估 OCR 给出的 image_box 是否已贴合插图，score 取 0~1：
+    - 边界：框外一圈中与框内前景连通的暗像素（被框切断的笔画）越多越低；
+    - 充实度：框内有效连通域（去掉噪点）外接框占框面积的比例，框偏大时偏低；
+    - 相对题目区域过大/过小或框内空白直接判 0。
+    缺少 numpy/OpenCV 时返回 0，即始终走模型精修。
+    """
+    stats: dict[str, Any] = {"score": 0.0}
+    if cv2 is None or np is None:
+        stats["reason"] = "no_cv"
+        return stats
+
+    question_area = max(1, _image_box_area(question_box))
+    box_area = _image_box_area(image_box)
+    area_ratio = box_area / question_area
+    stats["area_ratio"] = round(area_ratio, 4)
+    if not DIAGRAM_PRECHECK_MIN_AREA_RATIO <= area_ratio <= DIAGRAM_PRECHECK_MAX_AREA_RATIO:
+        stats["reason"] = "area"
+        return stats
+
+    img = _open_image_source(source)
+    box_h = image_box.ymax - image_box.ymin
+    box_w = image_box.xmax - image_box.xmin
+    ring_y = max(DIAGRAM_PRECHECK_RING_MIN, int(box_h * DIAGRAM_PRECHECK_RING_RATIO))
+    ring_x = max(DIAGRAM_PRECHECK_RING_MIN, int(box_w * DIAGRAM_PRECHECK_RING_RATIO))
+    top = max(question_box.ymin, image_box.ymin - ring_y)
+    left = max(question_box.xmin, image_box.xmin - ring_x)
+    bottom = min(question_box.ymax, image_box.ymax + ring_y)
+    right = min(question_box.xmax, image_box.xmax + ring_x)
+    region = img.crop((left, top, right, bottom)).convert("L")
+
+    scale = min(1.0, DIAGRAM_PRECHECK_MAX_SIDE / max(1, region.width, region.height))
+    if scale < 1.0:
+        region = region.resize(
+            (max(1, int(region.width * scale)), max(1, int(region.height * scale))),
+            Image.Resampling.BILINEAR,
+        )
+    iy0 = int((image_box.ymin - top) * scale)
+    ix0 = int((image_box.xmin - left) * scale)
+    iy1 = max(iy0 + 1, int(round((image_box.ymax - top) * scale)))
+    ix1 = max(ix0 + 1, int(round((image_box.xmax - left) * scale)))
+
+    dark = np.asarray(region) < FOREGROUND_DARK_PIXEL_THRESHOLD
+    inner = dark[iy0:iy1, ix0:ix1]
+    inner_dark = int(inner.sum())
+    if inner_dark / max(1, inner.size) < MEANINGFUL_MIN_DARK_RATIO_DEFAULT:
+        stats["reason"] = "blank"
+        return stats
+
+    _, labels, cc_stats, _ = cv2.connectedComponentsWithStats(dark.astype(np.uint8), connectivity=8)
+    inside_labels = np.unique(labels[iy0:iy1, ix0:ix1])
+    inside_labels = inside_labels[inside_labels > 0]
+    outside = np.ones(dark.shape, dtype=bool)
+    outside[iy0:iy1, ix0:ix1] = False
+    cut_pixels = int(np.isin(labels[outside], inside_labels).sum())
+    cut_ratio = cut_pixels / max(1, inner_dark)
+    border_score = max(0.0, 1.0 - cut_ratio / DIAGRAM_PRECHECK_CUT_RATIO_MAX)
+
+    significant = inside_labels[cc_stats[inside_labels, cv2.CC_STAT_AREA] >= DIAGRAM_COMPONENT_MIN_AREA_PIXELS]
+    coverage = 0.0
+    if significant.size:
+        comp = cc_stats[significant]
+        y0 = max(iy0, int(comp[:, cv2.CC_STAT_TOP].min()))
+        x0 = max(ix0, int(comp[:, cv2.CC_STAT_LEFT].min()))
+        y1 = min(iy1, int((comp[:, cv2.CC_STAT_TOP] + comp[:, cv2.CC_STAT_HEIGHT]).max()))
+        x1 = min(ix1, int((comp[:, cv2.CC_STAT_LEFT] + comp[:, cv2.CC_STAT_WIDTH]).max()))
+        coverage = max(0, y1 - y0) * max(0, x1 - x0) / max(1, inner.size)
+    fill_score = min(1.0, coverage / DIAGRAM_PRECHECK_FILL_TARGET)
+
+    stats.update(
+        score=round(
+            DIAGRAM_PRECHECK_BORDER_WEIGHT * border_score + (1.0 - DIAGRAM_PRECHECK_BORDER_WEIGHT) * fill_score,
+            4,
+        ),
+        cut_ratio=round(cut_ratio, 4),
+        coverage=round(coverage, 4),
+    )
+    return stats
+
+
 def normalize_image_box_for_source(
     box: Optional[ImageBox],
     image_width: int,
@@ -1022,8 +1644,76 @@ def normalize_image_box_for_source(
     return _clamp_image_box(chosen, image_width, image_height)
 
 
+def clamp_crop_box(
+    width: int,
+    height: int,
+    ymin: int,
+    xmin: int,
+    ymax: int,
+    xmax: int,
+) -> tuple[int, int, int, int]:
+    """把 (ymin, xmin, ymax, xmax) 限制在图像范围内；空区域抛 ValueError。"""
+    ymin = max(0, min(ymin, height))
+    xmin = max(0, min(xmin, width))
+    ymax = max(ymin, min(ymax, height))
+    xmax = max(xmin, min(xmax, width))
+    if ymax <= ymin or xmax <= xmin:
+        raise ValueError("Invalid crop coordinates")
+    return ymin, xmin, ymax, xmax
+
+
+def clean_diagram_crop(
+    cropped: Image.Image,
+    max_size: Optional[tuple[int, int]] = (800, 800),
+) -> tuple[bytes, int, int, dict[str, Any]]:
+    """
+    对已粗裁的插图区域执行清理链：去批注 -> 背景拉白 -> 收紧前景 -> 抠图。
+    返回 PNG 字节、尺寸与统计信息；不依赖整页图像，可在独立进程中执行。
+    """
+    cleaned, clean_stats = clean_annotations_with_rules(cropped)
+    normalized = _flatten_background_to_white(cleaned)
+    # Diagram may appear in the lower half; avoid top-biased trimming here.
+    tightened = _tighten_to_foreground(
+        normalized,
+        prefer_top=False,
+        trim_bottom_on_tall=False,
+    )
+    cutout = _extract_diagram_cutout(tightened)
+    alpha_ratio = _alpha_coverage_ratio(cutout)
+
+    source_area = max(1, tightened.width * tightened.height)
+    cutout_area = max(1, cutout.width * cutout.height)
+    if alpha_ratio < DIAGRAM_CUTOUT_ALPHA_MIN_RATIO:
+        relaxed = _extract_diagram_cutout_relaxed(tightened)
+        relaxed_alpha_ratio = _alpha_coverage_ratio(relaxed)
+        if relaxed_alpha_ratio > alpha_ratio:
+            cutout = relaxed
+            alpha_ratio = relaxed_alpha_ratio
+            cutout_area = max(1, cutout.width * cutout.height)
+
+    # 若抠图相对候选框过小且前景覆盖也偏低，使用放宽版掩码避免主体丢失。
+    if cutout_area / source_area < DIAGRAM_CUTOUT_MIN_AREA_RATIO and alpha_ratio < 0.10:
+        relaxed = _extract_diagram_cutout_relaxed(tightened)
+        relaxed_alpha_ratio = _alpha_coverage_ratio(relaxed)
+        if relaxed_alpha_ratio >= alpha_ratio:
+            cutout = relaxed
+            alpha_ratio = relaxed_alpha_ratio
+            cutout_area = max(1, cutout.width * cutout.height)
+
+    # Keep transparent alpha so result follows real glyph/shape contours.
+    final_image = _fit_within(cutout.convert("RGBA"), max_size)
+    result_bytes = _encode_png(final_image)
+    out_w, out_h = final_image.size
+
+    clean_stats["alpha_ratio"] = round(alpha_ratio, 4)
+    clean_stats["cutout_area_ratio"] = round(cutout_area / source_area, 4)
+    # Checked on the exact pixels we encoded, so callers can skip decoding the PNG again.
+    clean_stats["meaningful_content"] = has_meaningful_image_content(final_image)
+    return result_bytes, out_w, out_h, clean_stats
+
+
 def crop_diagram_image_with_metadata(
-    image_bytes: bytes,
+    image_bytes: "bytes | ImageContext",
     ymin: int,
     xmin: int,
     ymax: int,
@@ -1037,54 +1727,12 @@ def crop_diagram_image_with_metadata(
     - 按前景密度自动收紧，尽量避开手写答案区
     """
     try:
-        img = Image.open(BytesIO(image_bytes))
-        img = ImageOps.exif_transpose(img)
+        img = _open_image_source(image_bytes)
         width, height = img.size
-
-        ymin = max(0, min(ymin, height))
-        xmin = max(0, min(xmin, width))
-        ymax = max(ymin, min(ymax, height))
-        xmax = max(xmin, min(xmax, width))
-        if ymax <= ymin or xmax <= xmin:
-            raise ValueError("Invalid crop coordinates")
+        ymin, xmin, ymax, xmax = clamp_crop_box(width, height, ymin, xmin, ymax, xmax)
 
         cropped = img.crop((xmin, ymin, xmax, ymax))
-        cleaned, clean_stats = clean_annotations_with_rules(cropped)
-        normalized = _flatten_background_to_white(cleaned)
-        # Diagram may appear in the lower half; avoid top-biased trimming here.
-        tightened = _tighten_to_foreground(
-            normalized,
-            prefer_top=False,
-            trim_bottom_on_tall=False,
-        )
-        cutout = _extract_diagram_cutout(tightened)
-        alpha_ratio = _alpha_coverage_ratio(cutout)
-
-        source_area = max(1, tightened.width * tightened.height)
-        cutout_area = max(1, cutout.width * cutout.height)
-        if alpha_ratio < DIAGRAM_CUTOUT_ALPHA_MIN_RATIO:
-            relaxed = _extract_diagram_cutout_relaxed(tightened)
-            relaxed_alpha_ratio = _alpha_coverage_ratio(relaxed)
-            if relaxed_alpha_ratio > alpha_ratio:
-                cutout = relaxed
-                alpha_ratio = relaxed_alpha_ratio
-                cutout_area = max(1, cutout.width * cutout.height)
-
-        # 若抠图相对候选框过小且前景覆盖也偏低，使用放宽版掩码避免主体丢失。
-        if cutout_area / source_area < DIAGRAM_CUTOUT_MIN_AREA_RATIO and alpha_ratio < 0.10:
-            relaxed = _extract_diagram_cutout_relaxed(tightened)
-            relaxed_alpha_ratio = _alpha_coverage_ratio(relaxed)
-            if relaxed_alpha_ratio >= alpha_ratio:
-                cutout = relaxed
-                alpha_ratio = relaxed_alpha_ratio
-                cutout_area = max(1, cutout.width * cutout.height)
-
-        # Keep transparent alpha so result follows real glyph/shape contours.
-        final_image = cutout.convert("RGBA")
-        result_bytes, out_w, out_h = _save_png_bytes(final_image, max_size=max_size)
-
-        clean_stats["alpha_ratio"] = round(alpha_ratio, 4)
-        clean_stats["cutout_area_ratio"] = round(cutout_area / source_area, 4)
+        result_bytes, out_w, out_h, clean_stats = clean_diagram_crop(cropped, max_size=max_size)
 
         logger.info(
             "Cropped diagram image: (%d,%d,%d,%d) -> %dx%d alpha_ratio=%.4f cutout_area_ratio=%.4f",
@@ -1094,8 +1742,8 @@ def crop_diagram_image_with_metadata(
             xmax,
             out_w,
             out_h,
-            alpha_ratio,
-            cutout_area / source_area,
+            clean_stats["alpha_ratio"],
+            clean_stats["cutout_area_ratio"],
         )
         return result_bytes, out_w, out_h, clean_stats
     except ValueError:
@@ -1106,7 +1754,7 @@ def crop_diagram_image_with_metadata(
 
 
 def crop_diagram_image(
-    image_bytes: bytes,
+    image_bytes: "bytes | ImageContext",
     ymin: int,
     xmin: int,
     ymax: int,
@@ -1124,8 +1772,114 @@ def crop_diagram_image(
     return result_bytes, out_w, out_h
 
 
+@dataclass(frozen=True)
+class MosaicTile:
+    """一张快照在拼图中的位置；scale 为拼图像素 / 原快照像素。"""
+
+    index: int
+    left: int
+    top: int
+    width: int
+    height: int
+    scale: float
+    source_width: int
+    source_height: int
+
+    def to_source_box(self, box: ImageBox) -> Optional[ImageBox]:
+        """把拼图坐标系下的框映射回该快照坐标；框中心不在本格内时返回 None。"""
+        center_x = (box.xmin + box.xmax) / 2
+        center_y = (box.ymin + box.ymax) / 2
+        if not (
+            self.left <= center_x <= self.left + self.width
+            and self.top <= center_y <= self.top + self.height
+        ):
+            return None
+        mapped = ImageBox(
+            ymin=int((box.ymin - self.top) / self.scale),
+            xmin=int((box.xmin - self.left) / self.scale),
+            ymax=int(round((box.ymax - self.top) / self.scale)),
+            xmax=int(round((box.xmax - self.left) / self.scale)),
+        )
+        mapped = _clamp_image_box(mapped, self.source_width, self.source_height)
+        if _image_box_area(mapped) <= 0:
+            return None
+        return mapped
+
+
+def _mosaic_font(size: int) -> Any:
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow built without FreeType
+        return ImageFont.load_default()
+
+
+def build_snapshot_mosaic(snapshots: list[bytes]) -> tuple[bytes, list[MosaicTile]]:
+    """
+    把多张题目快照按网格拼成一张 PNG，每格上方标注 #1..#N 并加浅灰边框，
+    供一次精修请求同时定位多题插图；整图最长边不超过 MOSAIC_MAX_SIDE。
+    """
+    if not snapshots:
+        raise ValueError("No snapshots to tile")
+    images = []
+    for snapshot in snapshots:
+        with Image.open(BytesIO(snapshot)) as img:
+            images.append(ImageOps.exif_transpose(img).convert("RGB"))
+
+    columns = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    cell = min(
+        MOSAIC_TILE_MAX_SIDE,
+        (MOSAIC_MAX_SIDE - MOSAIC_GAP * (columns + 1)) // columns,
+        (MOSAIC_MAX_SIDE - MOSAIC_GAP * (rows + 1)) // rows - MOSAIC_LABEL_HEIGHT,
+    )
+    canvas = Image.new(
+        "RGB",
+        (
+            MOSAIC_GAP + columns * (cell + MOSAIC_GAP),
+            MOSAIC_GAP + rows * (cell + MOSAIC_LABEL_HEIGHT + MOSAIC_GAP),
+        ),
+        "white",
+    )
+    draw = ImageDraw.Draw(canvas)
+    font = _mosaic_font(MOSAIC_LABEL_HEIGHT - 8)
+
+    tiles: list[MosaicTile] = []
+    for position, image in enumerate(images):
+        row, column = divmod(position, columns)
+        scale = min(1.0, cell / max(1, image.width, image.height))
+        tile = image
+        if scale < 1.0:
+            tile = image.resize(
+                (max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+                Image.Resampling.LANCZOS,
+            )
+        left = MOSAIC_GAP + column * (cell + MOSAIC_GAP)
+        label_top = MOSAIC_GAP + row * (cell + MOSAIC_LABEL_HEIGHT + MOSAIC_GAP)
+        top = label_top + MOSAIC_LABEL_HEIGHT
+        canvas.paste(tile, (left, top))
+        draw.rectangle(
+            (left - 2, top - 2, left + tile.width + 1, top + tile.height + 1),
+            outline=MOSAIC_FRAME_COLOR,
+            width=2,
+        )
+        draw.text((left, label_top + 2), f"#{position + 1}", fill=MOSAIC_LABEL_COLOR, font=font)
+        tiles.append(
+            MosaicTile(
+                index=position + 1,
+                left=left,
+                top=top,
+                width=tile.width,
+                height=tile.height,
+                scale=tile.width / max(1, image.width),
+                source_width=image.width,
+                source_height=image.height,
+            )
+        )
+    return _encode_png(canvas), tiles
+
+
 def crop_image(
-    image_bytes: bytes,
+    image_bytes: "bytes | ImageContext",
     ymin: int,
     xmin: int,
     ymax: int,
@@ -1136,7 +1890,7 @@ def crop_image(
     裁剪图片并返回裁剪后的字节流。
 
     Args:
-        image_bytes: 原始图片字节流
+        image_bytes: 原始图片字节流，或已解码的 ImageContext（多次裁剪时复用）
         ymin, xmin, ymax, xmax: 裁剪坐标（原始图片坐标系）
         max_size: 最大尺寸限制（宽，高），None 表示不限制
 
@@ -1148,8 +1902,7 @@ def crop_image(
         RuntimeError: 图片处理失败
     """
     try:
-        img = Image.open(BytesIO(image_bytes))
-        img = ImageOps.exif_transpose(img)
+        img = _open_image_source(image_bytes)
         width, height = img.size
 
         # 坐标校验（防止越界）
@@ -0,0 +1,159 @@
+import logging
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Optional
+
+from PIL import Image
+
+from app.services.image_service import (
+    ImageContext,
+    clamp_crop_box,
+    clean_diagram_crop,
+    crop_diagram_image_with_metadata,
+    np,
+)
+from app.services.worker_pool_service import discard_cpu_executor, get_cpu_executor
+
+logger = logging.getLogger("uvicorn.error")
+
+# Pillow modes whose NumPy view round-trips through Image.fromarray unchanged.
+SHAREABLE_MODES = {"L", "RGB", "RGBA"}
+
+
+class ImageJobTimeoutError(RuntimeError):
+    """Image job did not finish before the request deadline."""
+
+
+@dataclass(frozen=True)
+class SharedImageSpec:
+    """子进程附加共享内存所需的最小描述，可 pickle。"""
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+
+class SharedPage:
+    """
+    把整页像素放入一块共享内存，供图像工作进程按框读取，避免每个任务重复传整页。
+    由创建方负责释放（close + unlink），配合 with 使用。
+    """
+
+    def __init__(self, page: ImageContext):
+        array = page.array
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=self._shm.buf)
+        view[...] = array
+        del view
+        self.spec = SharedImageSpec(
+            name=self._shm.name,
+            shape=tuple(array.shape),
+            dtype=array.dtype.str,
+        )
+        self._closed = False
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SharedPage":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def share_page(page: ImageContext) -> Optional[SharedPage]:
+    """进程池可用且图像模式支持时返回 SharedPage，否则返回 None（调用方走进程内路径）。"""
+    if np is None or page.image.mode not in SHAREABLE_MODES:
+        return None
+    if get_cpu_executor() is None:
+        return None
+    try:
+        return SharedPage(page)
+    except Exception as exc:
+        logger.warning("Shared memory for page unavailable, using in-process image work: %s", exc)
+        return None
+
+
+def _crop_shared_diagram(
+    spec: SharedImageSpec,
+    box: tuple[int, int, int, int],
+    max_size: Optional[tuple[int, int]],
+) -> tuple[bytes, int, int, dict[str, Any]]:
+    """工作进程入口：从共享内存拷出框内区域，执行插图清理链。"""
+    ymin, xmin, ymax, xmax = box
+    shm = shared_memory.SharedMemory(name=spec.name)
+    try:
+        page = np.ndarray(spec.shape, dtype=np.dtype(spec.dtype), buffer=shm.buf)
+        region = page[ymin:ymax, xmin:xmax].copy()
+        # 关闭映射前必须释放所有指向共享缓冲区的视图。
+        del page
+    finally:
+        shm.close()
+    try:
+        return clean_diagram_crop(Image.fromarray(region), max_size=max_size)
+    except Exception as exc:
+        raise RuntimeError(f"Diagram crop failed: {str(exc)}") from exc
+
+
+def crop_diagram(
+    page: ImageContext,
+    shared: Optional[SharedPage],
+    ymin: int,
+    xmin: int,
+    ymax: int,
+    xmax: int,
+    max_size: Optional[tuple[int, int]] = (800, 800),
+    deadline: Optional[float] = None,
+) -> tuple[bytes, int, int, dict[str, Any]]:
+    """
+    与 `crop_diagram_image_with_metadata` 等价，但在图像工作进程中执行清理链。
+
+    deadline 为 time.monotonic() 时间点，超时抛 ImageJobTimeoutError；
+    没有共享页、进程池关闭或子进程崩溃时退回当前线程内执行。
+    """
+    if shared is None:
+        return crop_diagram_image_with_metadata(page, ymin, xmin, ymax, xmax, max_size=max_size)
+
+    box = clamp_crop_box(page.width, page.height, ymin, xmin, ymax, xmax)
+    executor = get_cpu_executor()
+    if executor is None:
+        return crop_diagram_image_with_metadata(page, *box, max_size=max_size)
+
+    timeout = None
+    if deadline is not None:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise ImageJobTimeoutError("Image job deadline exceeded before submit")
+
+    try:
+        future = executor.submit(_crop_shared_diagram, shared.spec, box, max_size)
+        result = future.result(timeout=timeout)
+    except FutureTimeoutError as exc:
+        future.cancel()
+        raise ImageJobTimeoutError(f"Diagram crop exceeded deadline ({timeout:.1f}s)") from exc
+    except BrokenProcessPool:
+        logger.warning("Image worker pool broken, running diagram crop in-process")
+        discard_cpu_executor(executor)
+        return crop_diagram_image_with_metadata(page, *box, max_size=max_size)
+
+    _, out_w, out_h, clean_stats = result
+    logger.info(
+        "Cropped diagram image (worker): (%d,%d,%d,%d) -> %dx%d alpha_ratio=%.4f cutout_area_ratio=%.4f",
+        *box,
+        out_w,
+        out_h,
+        clean_stats["alpha_ratio"],
+        clean_stats["cutout_area_ratio"],
+    )
+    return result
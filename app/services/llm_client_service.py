@@ -1,14 +1,29 @@
 from __future__ import annotations
 
+import asyncio
 import http.client
 import json
 import logging
-import re
+import ssl
+import threading
+import time
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Callable, Optional
 from urllib import error, request
+from urllib.parse import urlsplit
 
-from app.core.llm_settings import load_llm_settings, load_whatai_settings
+import httpx
+
+from app.core.llm_settings import LlmSettings, WhataiSettings, load_llm_settings, load_whatai_settings
+from app.services import llm_health_service, llm_telemetry_service
+from app.services.payload_service import EncodedPayload, encode_json_payload
+from app.services.llm_health_service import (
+    OUTCOME_CANCELLED,
+    OUTCOME_FAILURE,
+    OUTCOME_NEUTRAL,
+    OUTCOME_OK,
+    ProviderHealth,
+)
 
 
 logger = logging.getLogger("uvicorn.error")
@@ -31,6 +46,61 @@ class LlmNetworkError(LlmClientError):
     pass
 
 
+class LlmCircuitOpenError(LlmClientError):
+    """Raised without calling the provider while its circuit is open."""
+
+    def __init__(self, provider: str, model: Optional[str]):
+        super().__init__(f"{provider} circuit open for model {model or '-'}")
+        self.provider = provider
+        self.model = model
+
+
+def _call_outcome(exc: BaseException) -> str:
+    if isinstance(exc, LlmHttpError):
+        # 4xx 多是请求本身的问题，不代表上游不健康；429 与 5xx 才触发退让。
+        if exc.status_code == 429 or exc.status_code >= 500:
+            return OUTCOME_FAILURE
+        return OUTCOME_NEUTRAL
+    if isinstance(exc, LlmClientError):
+        return OUTCOME_FAILURE
+    return OUTCOME_CANCELLED
+
+
+def _provider_health(provider: str, payload: dict[str, Any], max_concurrency: int) -> ProviderHealth:
+    return llm_health_service.get_provider_health(
+        provider,
+        payload.get("model"),
+        max_concurrency=max_concurrency,
+    )
+
+
+def _admit_or_raise(health: ProviderHealth) -> None:
+    """Called with a limiter slot held; gives the slot back if the circuit rejects the call."""
+    if not health.admit():
+        health.limiter.release(OUTCOME_NEUTRAL)
+        raise LlmCircuitOpenError(health.provider, health.model)
+
+
+def _finish_call(health: ProviderHealth, outcome: str, started: float) -> None:
+    health.limiter.release(outcome)
+    health.record(outcome, time.monotonic() - started)
+
+
+def _remaining_timeout(timeout: Optional[float], started: float) -> Optional[float]:
+    if timeout is None:
+        return None
+    return max(1.0, timeout - (time.monotonic() - started))
+
+
+def circuit_open(provider: str, model: Optional[str]) -> bool:
+    """True while calls to provider/model would fail fast; optional stages use it to skip early."""
+    return llm_health_service.is_circuit_open(provider, model)
+
+
+def llm_health_snapshot() -> list[dict[str, Any]]:
+    return llm_health_service.snapshot_all()
+
+
 def _truncate(value: str, max_chars: int = _MAX_LOG_CHARS) -> str:
     text = str(value or "")
     if len(text) <= max_chars:
@@ -38,97 +108,516 @@ def _truncate(value: str, max_chars: int = _MAX_LOG_CHARS) -> str:
     return f"{text[:max_chars]} ...[truncated {len(text) - max_chars} chars]"
 
 
-def _sanitize_for_log(payload: Any) -> Any:
-    if isinstance(payload, dict):
-        result: dict[str, Any] = {}
-        for key, value in payload.items():
-            lowered = str(key).lower()
-            if lowered in {"authorization", "api_key", "apikey", "token"}:
-                result[key] = "***"
+# A reused keep-alive socket may have been closed by the server between calls;
+# these surface before any response byte is read and are safe to retry once.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+class HttpConnectionPool:
+    """
+    Per-host keep-alive pool of `http.client` connections.
+
+    Connections are borrowed for one request/response and returned afterwards;
+    at most `max_size` idle connections are kept, extra ones are closed on return.
+    """
+
+    def __init__(self, base_url: str, *, timeout_seconds: float, max_size: int = 8):
+        parts = urlsplit(base_url)
+        if parts.scheme not in {"http", "https"} or not parts.hostname:
+            raise ValueError(f"Unsupported LLM base url: {base_url}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.path_prefix = parts.path.rstrip("/")
+        self.timeout_seconds = timeout_seconds
+        self.max_size = max(1, int(max_size))
+        self.connections_created = 0
+        self._idle: list[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._ssl_context = ssl.create_default_context() if parts.scheme == "https" else None
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        with self._lock:
+            self.connections_created += 1
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(
+                self.host,
+                self.port,
+                timeout=self.timeout_seconds,
+                context=self._ssl_context,
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout_seconds)
+
+    def _acquire(self) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if not self._closed and len(self._idle) < self.max_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        body: bytes,
+        headers: dict[str, str],
+        timeout: Optional[float] = None,
+    ) -> tuple[int, bytes]:
+        """
+        Send one request; returns (status, body). Network failures raise OSError/HTTPException.
+        `timeout` overrides the pool's socket timeout for this request only.
+        """
+        url_path = f"{self.path_prefix}{path}"
+        effective_timeout = timeout if timeout is not None else self.timeout_seconds
+        while True:
+            conn, reused = self._acquire()
+            # Pooled connections keep the previous borrower's timeout; reset it every time.
+            conn.timeout = effective_timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(effective_timeout)
+            try:
+                conn.request(method, url_path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
             else:
-                result[key] = _sanitize_for_log(value)
-        return result
-    if isinstance(payload, list):
-        return [_sanitize_for_log(item) for item in payload]
-    if isinstance(payload, str):
-        if payload.startswith("data:image/") and ";base64," in payload:
-            prefix, _, raw = payload.partition(";base64,")
-            return f"{prefix};base64,[{len(raw)} chars]"
-        if re.match(r"^[A-Za-z0-9+/=]{500,}$", payload):
-            return f"[base64 text {len(payload)} chars]"
-        return _truncate(payload, max_chars=900)
-    return payload
-
-
-def _to_json_preview(payload: Any) -> str:
-    try:
-        encoded = json.dumps(_sanitize_for_log(payload), ensure_ascii=False)
-    except Exception:
-        encoded = str(payload)
-    return _truncate(encoded, max_chars=_MAX_LOG_CHARS)
+                self._release(conn)
+            return resp.status, data
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def _uses_proxy(base_url: str) -> bool:
+    parts = urlsplit(base_url)
+    proxies = request.getproxies()
+    if parts.scheme not in proxies:
+        return False
+    return not request.proxy_bypass(parts.hostname or "")
 
 
 class BaseLlmClient:
     """Common OpenAI-compatible client with baseline IO logging."""
 
-    def __init__(self, *, provider: str, base_url: str, api_key: str, timeout_seconds: int = 180):
+    def __init__(
+        self,
+        *,
+        provider: str,
+        base_url: str,
+        api_key: str,
+        timeout_seconds: int = 180,
+        pool_size: int = 8,
+        max_concurrency: int = 16,
+    ):
         self.provider = provider
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.timeout_seconds = max(5, int(timeout_seconds))
+        self.max_concurrency = max(1, int(max_concurrency))
+        # Proxied environments keep the urllib path so HTTP(S)_PROXY still applies.
+        self.transport: Optional[HttpConnectionPool] = None
+        if not _uses_proxy(self.base_url):
+            self.transport = HttpConnectionPool(
+                self.base_url,
+                timeout_seconds=self.timeout_seconds,
+                max_size=pool_size,
+            )
 
-    def chat_completions(self, payload: dict[str, Any], *, trace_id: str) -> dict[str, Any]:
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+
+    def _post_json(
+        self,
+        endpoint: str,
+        path: str,
+        body: bytes,
+        timeout: Optional[float] = None,
+    ) -> tuple[int, str]:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        if self.transport is not None:
+            status, raw = self.transport.request("POST", path, body=body, headers=headers, timeout=timeout)
+            return status, raw.decode("utf-8", errors="replace")
+
+        req = request.Request(endpoint, data=body, headers=headers, method="POST")
+        try:
+            with request.urlopen(req, timeout=timeout if timeout is not None else self.timeout_seconds) as resp:
+                return resp.status, resp.read().decode("utf-8", errors="replace")
+        except error.HTTPError as exc:
+            return int(exc.code), exc.read().decode("utf-8", errors="replace")
+
+    def chat_completions(
+        self,
+        payload: dict[str, Any],
+        *,
+        trace_id: str,
+        timeout: Optional[float] = None,
+    ) -> dict[str, Any]:
+        """
+        `timeout` (seconds) caps this call below the client default, e.g. to honour a request deadline.
+        Waits for an adaptive concurrency slot and fails fast with LlmCircuitOpenError while the
+        provider/model circuit is open.
+        """
+        health = _provider_health(self.provider, payload, self.max_concurrency)
+        started = time.monotonic()
+        if not health.limiter.acquire(timeout if timeout is not None else self.timeout_seconds):
+            raise LlmNetworkError(f"{self.provider} concurrency slot wait timed out")
+        _admit_or_raise(health)
+        outcome = OUTCOME_CANCELLED
+        try:
+            result = self._send_chat(payload, trace_id=trace_id, timeout=_remaining_timeout(timeout, started))
+            outcome = OUTCOME_OK
+            return result
+        except BaseException as exc:
+            outcome = _call_outcome(exc)
+            raise
+        finally:
+            _finish_call(health, outcome, started)
+
+    def _send_chat(self, payload: dict[str, Any], *, trace_id: str, timeout: Optional[float]) -> dict[str, Any]:
         endpoint = f"{self.base_url}/chat/completions"
-        logger.info(
-            "LLM request provider=%s trace_id=%s endpoint=%s payload=%s",
-            self.provider,
-            trace_id,
-            endpoint,
-            _to_json_preview(payload),
-        )
+        encoded = encode_json_payload(payload)
+        _log_llm_request(self.provider, trace_id, endpoint, encoded)
 
-        req = request.Request(
-            endpoint,
-            data=json.dumps(payload).encode("utf-8"),
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            },
-            method="POST",
-        )
+        started = time.monotonic()
         try:
-            with request.urlopen(req, timeout=self.timeout_seconds) as resp:
-                raw = resp.read().decode("utf-8", errors="replace")
-        except error.HTTPError as exc:
-            body = exc.read().decode("utf-8", errors="replace")
-            logger.error(
-                "LLM HTTP error provider=%s trace_id=%s status=%s body=%s",
-                self.provider,
-                trace_id,
-                exc.code,
-                _truncate(body),
-            )
-            raise LlmHttpError(status_code=int(exc.code), body=body) from exc
-        except (TimeoutError, error.URLError, http.client.HTTPException, ConnectionError) as exc:
-            logger.warning(
-                "LLM network error provider=%s trace_id=%s err=%s",
-                self.provider,
-                trace_id,
-                str(exc),
+            status, raw = self._post_json(
+                endpoint,
+                "/chat/completions",
+                encoded.body,
+                timeout=timeout,
             )
-            raise LlmNetworkError(str(exc)) from exc
+        except (TimeoutError, error.URLError, http.client.HTTPException, OSError) as exc:
+            _record_call(self.provider, payload, trace_id, encoded, started, "network_error", error=exc)
+            raise _network_error(self.provider, trace_id, exc) from exc
+
+        _record_call(self.provider, payload, trace_id, encoded, started, status, response_text=raw)
+        return _decode_llm_response(self.provider, trace_id, status, raw)
+
+
+def _log_llm_request(provider: str, trace_id: str, endpoint: str, encoded: EncodedPayload) -> None:
+    # 请求体只进入抽样的 telemetry 记录，这里不再输出。
+    logger.debug(
+        "LLM request provider=%s trace_id=%s endpoint=%s bytes=%d images=%d",
+        provider,
+        trace_id,
+        endpoint,
+        len(encoded.body),
+        encoded.blob_count,
+    )
 
-        logger.info(
-            "LLM response provider=%s trace_id=%s body=%s",
-            self.provider,
+
+def _record_call(
+    provider: str,
+    payload: dict[str, Any],
+    trace_id: str,
+    encoded: EncodedPayload,
+    started: float,
+    status: Any,
+    *,
+    response_text: Optional[str] = None,
+    response_bytes: Optional[int] = None,
+    error: Optional[BaseException] = None,
+) -> None:
+    if response_bytes is None:
+        response_bytes = len(response_text.encode("utf-8")) if response_text else 0
+    llm_telemetry_service.record_llm_call(
+        provider=provider,
+        model=payload.get("model"),
+        trace_id=trace_id,
+        status=status,
+        latency_seconds=time.monotonic() - started,
+        bytes_out=len(encoded.body),
+        bytes_in=response_bytes,
+        images=encoded.blob_count,
+        error=(str(error) or type(error).__name__) if error is not None else None,
+        request_preview=encoded.log_preview,
+        response_text=response_text,
+    )
+
+
+def _network_error(provider: str, trace_id: str, exc: BaseException) -> LlmNetworkError:
+    logger.warning(
+        "LLM network error provider=%s trace_id=%s err=%s",
+        provider,
+        trace_id,
+        str(exc) or type(exc).__name__,
+    )
+    return LlmNetworkError(str(exc) or type(exc).__name__)
+
+
+def _decode_llm_response(provider: str, trace_id: str, status: int, raw: str) -> dict[str, Any]:
+    if status >= 400:
+        logger.error(
+            "LLM HTTP error provider=%s trace_id=%s status=%s body=%s",
+            provider,
             trace_id,
+            status,
             _truncate(raw),
         )
+        raise LlmHttpError(status_code=status, body=raw)
+
+    logger.debug(
+        "LLM response provider=%s trace_id=%s chars=%d",
+        provider,
+        trace_id,
+        len(raw),
+    )
+
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as exc:
+        raise LlmClientError(f"Invalid JSON response from {provider}: {str(exc)}") from exc
+
+
+# 请求体按块交给 httpx，避免为发送再复制一份完整的 bytes。
+_ASYNC_BODY_CHUNK_BYTES = 64 * 1024
+ASYNC_CLOSE_TIMEOUT_SECONDS = 5.0
 
+
+async def _iter_body(body: "bytes | bytearray") -> AsyncIterator[memoryview]:
+    view = memoryview(body)
+    for start in range(0, len(view), _ASYNC_BODY_CHUNK_BYTES):
+        yield view[start:start + _ASYNC_BODY_CHUNK_BYTES]
+
+
+class AsyncHttpTransport:
+    """
+    Keep-alive `httpx.AsyncClient` for one provider (TLS, proxies from the environment).
+
+    The client is bound to the event loop that first used it; a different loop
+    (e.g. separate `asyncio.run` calls in scripts) gets a fresh client. Each request
+    runs under a single deadline covering connect, upload and response read.
+    """
+
+    def __init__(self, base_url: str, *, timeout_seconds: float, max_size: int = 8):
+        parts = urlsplit(base_url)
+        if parts.scheme not in {"http", "https"} or not parts.hostname:
+            raise ValueError(f"Unsupported LLM base url: {base_url}")
+        self.base_url = base_url.rstrip("/")
+        self.timeout_seconds = timeout_seconds
+        self.max_size = max(1, int(max_size))
+        self.connections_created = 0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bound_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self.close()
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                # 超时由 request() 的整体 deadline 控制，不按阶段分别计时。
+                timeout=httpx.Timeout(None),
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.max_size),
+            )
+            self._loop = loop
+        return self._client
+
+    async def _trace(self, event: str, info: dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.complete":
+            self.connections_created += 1
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        body: "bytes | bytearray",
+        headers: dict[str, str],
+        timeout: Optional[float] = None,
+    ) -> tuple[int, bytes]:
+        """Send one request; returns (status, body). Failures raise httpx.TransportError or TimeoutError."""
+        client = self._bound_client()
+        effective_timeout = timeout if timeout is not None else self.timeout_seconds
+        async with asyncio.timeout(effective_timeout):
+            response = await client.request(
+                method,
+                path,
+                content=_iter_body(body),
+                # 显式长度：httpx 不再改用 chunked 编码。
+                headers={**headers, "Content-Length": str(len(body))},
+                extensions={"trace": self._trace},
+            )
+        return response.status_code, response.content
+
+    async def aclose(self) -> None:
+        """在所属事件循环内关闭（应用关停走 app/main.py 的 lifespan）。"""
+        client, loop = self._client, self._loop
+        self._client, self._loop = None, None
+        if client is None:
+            return
+        if loop is asyncio.get_running_loop():
+            await client.aclose()
+        else:
+            self._close_client(client, loop)
+
+    def close(self) -> None:
+        """
+        Close from synchronous code. The loop that owns the client decides how:
+        not running -> closed here; running in another thread -> closed there and
+        waited for; running in this thread -> only scheduled (use `aclose` instead);
+        already closed -> its sockets went with it, the client is dropped.
+        """
+        client, loop = self._client, self._loop
+        self._client, self._loop = None, None
+        if client is not None and loop is not None:
+            self._close_client(client, loop)
+
+    @staticmethod
+    def _close_client(client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop) -> None:
+        if loop.is_closed():
+            return
         try:
-            return json.loads(raw)
-        except json.JSONDecodeError as exc:
-            raise LlmClientError(f"Invalid JSON response from {self.provider}: {str(exc)}") from exc
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if current is loop:
+            loop.create_task(client.aclose())
+        elif loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(ASYNC_CLOSE_TIMEOUT_SECONDS)
+            except Exception as exc:
+                logger.warning("LLM async client close failed: %s", exc)
+        elif current is None:
+            loop.run_until_complete(client.aclose())
+        else:
+            # 另一个事件循环正在本线程运行，无法驱动已停止的所属循环。
+            logger.warning("LLM async client dropped: owning event loop is stopped and this thread runs another loop")
+
+
+class AsyncBaseLlmClient:
+    """
+    asyncio counterpart of `BaseLlmClient`: same logging and errors, no thread
+    held while waiting on the provider. `max_concurrency` bounds in-flight calls
+    for this provider across all requests sharing the cached client; within it the
+    per-model AIMD limiter and circuit breaker (shared with the sync client) apply.
+    """
+
+    def __init__(
+        self,
+        *,
+        provider: str,
+        base_url: str,
+        api_key: str,
+        timeout_seconds: int = 180,
+        pool_size: int = 8,
+        max_concurrency: int = 16,
+    ):
+        self.provider = provider
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout_seconds = max(5, int(timeout_seconds))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.transport = AsyncHttpTransport(
+            self.base_url,
+            timeout_seconds=self.timeout_seconds,
+            max_size=pool_size,
+        )
+
+    def _slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    async def chat_completions(
+        self,
+        payload: dict[str, Any],
+        *,
+        trace_id: str,
+        timeout: Optional[float] = None,
+    ) -> dict[str, Any]:
+        health = _provider_health(self.provider, payload, self.max_concurrency)
+        started = time.monotonic()
+        async with self._slots():
+            if not await health.limiter.acquire_async(timeout if timeout is not None else self.timeout_seconds):
+                raise LlmNetworkError(f"{self.provider} concurrency slot wait timed out")
+            _admit_or_raise(health)
+            outcome = OUTCOME_CANCELLED
+            try:
+                result = await self._send_chat(payload, trace_id=trace_id, timeout=_remaining_timeout(timeout, started))
+                outcome = OUTCOME_OK
+                return result
+            except BaseException as exc:
+                outcome = _call_outcome(exc)
+                raise
+            finally:
+                _finish_call(health, outcome, started)
+
+    async def _send_chat(self, payload: dict[str, Any], *, trace_id: str, timeout: Optional[float]) -> dict[str, Any]:
+        endpoint = f"{self.base_url}/chat/completions"
+        encoded = encode_json_payload(payload)
+        _log_llm_request(self.provider, trace_id, endpoint, encoded)
+        started = time.monotonic()
+        try:
+            status, data = await self.transport.request(
+                "POST",
+                "/chat/completions",
+                body=encoded.body,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                timeout=timeout,
+            )
+        except (TimeoutError, httpx.TransportError, OSError) as exc:
+            _record_call(self.provider, payload, trace_id, encoded, started, "network_error", error=exc)
+            raise _network_error(self.provider, trace_id, exc) from exc
+        except asyncio.CancelledError:
+            _record_call(self.provider, payload, trace_id, encoded, started, "cancelled")
+            raise
+        raw = data.decode("utf-8", errors="replace")
+        _record_call(
+            self.provider,
+            payload,
+            trace_id,
+            encoded,
+            started,
+            status,
+            response_text=raw,
+            response_bytes=len(data),
+        )
+        return _decode_llm_response(self.provider, trace_id, status, raw)
 
 
 @dataclass(frozen=True)
@@ -136,6 +625,7 @@ class SiliconflowClient:
     base_client: BaseLlmClient
     default_model: Optional[str]
     ocr_model: Optional[str]
+    async_client: Optional[AsyncBaseLlmClient] = None
 
 
 @dataclass(frozen=True)
@@ -143,37 +633,112 @@ class WhataiClient:
     base_client: BaseLlmClient
     diagram_crop_model: Optional[str]
     diagram_svg_model: Optional[str]
+    async_client: Optional[AsyncBaseLlmClient] = None
 
 
-def get_siliconflow_client() -> Optional[SiliconflowClient]:
-    settings = load_llm_settings()
-    if not settings:
-        return None
+_client_cache: dict[str, tuple[Any, Any]] = {}
+_client_cache_lock = threading.Lock()
+
+
+def _cached_client(provider: str, config: Any, build: Callable[[Any], Any]) -> Any:
+    """
+    Return the cached client for `provider` while its settings are unchanged.
+    A settings change (e.g. rotated key) builds a new client and closes the old pool.
+    """
+    with _client_cache_lock:
+        cached = _client_cache.get(provider)
+        if cached and cached[0] == config:
+            return cached[1]
+        client = build(config)
+        _client_cache[provider] = (config, client)
+    if cached:
+        _close_client(cached[1])
+    return client
+
+
+def _close_client(client: Any) -> None:
+    client.base_client.close()
+    if client.async_client is not None:
+        client.async_client.close()
+
+
+def reset_llm_clients() -> None:
+    """Drop cached clients and close their pooled connections."""
+    with _client_cache_lock:
+        cached = list(_client_cache.values())
+        _client_cache.clear()
+    for _, client in cached:
+        _close_client(client)
+
+
+async def aclose_llm_clients() -> None:
+    """`reset_llm_clients` for the app lifespan: async transports are closed on the running loop."""
+    with _client_cache_lock:
+        cached = list(_client_cache.values())
+        _client_cache.clear()
+    for _, client in cached:
+        client.base_client.close()
+        if client.async_client is not None:
+            await client.async_client.aclose()
+
+
+def _build_siliconflow_client(settings: LlmSettings) -> SiliconflowClient:
     base = BaseLlmClient(
         provider="siliconflow",
         base_url=settings.base_url,
         api_key=settings.api_key,
         timeout_seconds=settings.timeout_seconds,
+        pool_size=settings.pool_size,
+        max_concurrency=settings.max_concurrency,
     )
     return SiliconflowClient(
         base_client=base,
         default_model=settings.model,
         ocr_model=settings.ocr_model,
+        async_client=AsyncBaseLlmClient(
+            provider="siliconflow",
+            base_url=settings.base_url,
+            api_key=settings.api_key,
+            timeout_seconds=settings.timeout_seconds,
+            pool_size=settings.pool_size,
+            max_concurrency=settings.max_concurrency,
+        ),
     )
 
 
-def get_whatai_client() -> Optional[WhataiClient]:
-    settings = load_whatai_settings()
-    if not settings:
-        return None
+def _build_whatai_client(settings: WhataiSettings) -> WhataiClient:
     base = BaseLlmClient(
         provider="whatai",
         base_url=settings.base_url,
         api_key=settings.api_key,
         timeout_seconds=settings.timeout_seconds,
+        pool_size=settings.pool_size,
+        max_concurrency=settings.max_concurrency,
     )
     return WhataiClient(
         base_client=base,
         diagram_crop_model=settings.diagram_crop_model,
         diagram_svg_model=settings.diagram_svg_model,
+        async_client=AsyncBaseLlmClient(
+            provider="whatai",
+            base_url=settings.base_url,
+            api_key=settings.api_key,
+            timeout_seconds=settings.timeout_seconds,
+            pool_size=settings.pool_size,
+            max_concurrency=settings.max_concurrency,
+        ),
     )
+
+
+def get_siliconflow_client() -> Optional[SiliconflowClient]:
+    settings = load_llm_settings()
+    if not settings:
+        return None
+    return _cached_client("siliconflow", settings, _build_siliconflow_client)
+
+
+def get_whatai_client() -> Optional[WhataiClient]:
+    settings = load_whatai_settings()
+    if not settings:
+        return None
+    return _cached_client("whatai", settings, _build_whatai_client)
@@ -0,0 +1,248 @@
+"""
+Per provider/model health for LLM calls: rolling latency/error stats, a circuit
+breaker that fails fast while the upstream is degraded, and an AIMD limiter
+that adapts how many calls may be in flight.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+
+from app.core.config import settings
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+OUTCOME_OK = "ok"
+OUTCOME_FAILURE = "failure"
+# 4xx 等与上游健康无关的结果：释放并发名额，但不计入熔断统计。
+OUTCOME_NEUTRAL = "neutral"
+# 调用被取消/因本地原因中断：只归还名额，半开探测可由下一个请求重新发起。
+OUTCOME_CANCELLED = "cancelled"
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 并发限制：成功时上限每轮加 1（+1/limit），失败（超时/5xx/429）时减半。
+    同一份限额同时服务同步线程与异步协程。
+    """
+
+    def __init__(self, *, initial: int, minimum: int = 1, maximum: int):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_waiters: deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(self._has_capacity, timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._lock:
+                if self._has_capacity():
+                    self.in_flight += 1
+                    return True
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                return False
+
+    def release(self, outcome: str) -> None:
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if outcome == OUTCOME_OK:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / max(1.0, self.limit))
+            elif outcome == OUTCOME_FAILURE:
+                self.limit = max(float(self.minimum), self.limit / 2.0)
+            self._cond.notify()
+            waiters, self._async_waiters = self._async_waiters, deque()
+        # 唤醒的协程会重新检查名额，抢不到就再次排队。
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class ProviderHealth:
+    """单个 provider/model 的滚动统计与熔断状态。"""
+
+    def __init__(self, provider: str, model: str, *, max_concurrency: int):
+        self.provider = provider
+        self.model = model
+        self.limiter = AdaptiveConcurrencyLimiter(initial=max_concurrency, maximum=max_concurrency)
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.open_count = 0
+        self.rejected_count = 0
+        self._probe_in_flight = False
+        self._samples: deque[tuple[float, float, bool]] = deque(maxlen=512)
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - settings.llm_health_window_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    def admit(self) -> bool:
+        """熔断打开时返回 False（调用方应快速失败）；冷却期过后放行一个探测请求。"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN and now - (self.opened_at or now) >= settings.llm_circuit_open_seconds:
+                self.state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected_count += 1
+            return False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return False
+            if self.state == STATE_OPEN:
+                return time.monotonic() - (self.opened_at or 0.0) < settings.llm_circuit_open_seconds
+            return self._probe_in_flight
+
+    def record(self, outcome: str, latency_seconds: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if outcome == OUTCOME_CANCELLED:
+                self._probe_in_flight = False
+                return
+            if outcome == OUTCOME_NEUTRAL:
+                if self.state == STATE_HALF_OPEN:
+                    self._close()
+                return
+            ok = outcome == OUTCOME_OK
+            self._samples.append((now, latency_seconds, ok))
+            self._prune(now)
+            if ok:
+                self.consecutive_failures = 0
+                if self.state == STATE_HALF_OPEN:
+                    self._close()
+                return
+
+            self.consecutive_failures += 1
+            if self.state == STATE_HALF_OPEN:
+                self._open(now)
+                return
+            total = len(self._samples)
+            failures = sum(1 for _, _, sample_ok in self._samples if not sample_ok)
+            if self.consecutive_failures >= settings.llm_circuit_failure_threshold or (
+                total >= settings.llm_circuit_min_samples
+                and failures / total >= settings.llm_circuit_error_rate
+            ):
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = STATE_OPEN
+        self.opened_at = now
+        self.open_count += 1
+        self._probe_in_flight = False
+
+    def _close(self) -> None:
+        self.state = STATE_CLOSED
+        self.opened_at = None
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def snapshot(self) -> dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            samples = list(self._samples)
+            state = self.state
+            retry_in = None
+            if state == STATE_OPEN and self.opened_at is not None:
+                retry_in = max(0.0, settings.llm_circuit_open_seconds - (now - self.opened_at))
+            consecutive_failures = self.consecutive_failures
+            open_count = self.open_count
+            rejected_count = self.rejected_count
+        latencies = sorted(latency for _, latency, ok in samples if ok)
+        failures = sum(1 for _, _, ok in samples if not ok)
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "state": state,
+            "retry_in_seconds": round(retry_in, 1) if retry_in is not None else None,
+            "consecutive_failures": consecutive_failures,
+            "window_seconds": settings.llm_health_window_seconds,
+            "window_calls": len(samples),
+            "window_error_rate": round(failures / len(samples), 3) if samples else 0.0,
+            "latency_p50_ms": _percentile_ms(latencies, 0.5),
+            "latency_p95_ms": _percentile_ms(latencies, 0.95),
+            "concurrency_limit": int(self.limiter.limit),
+            "concurrency_max": self.limiter.maximum,
+            "in_flight": self.limiter.in_flight,
+            "open_count": open_count,
+            "rejected_count": rejected_count,
+        }
+
+
+def _percentile_ms(sorted_values: list[float], fraction: float) -> Optional[int]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return int(sorted_values[index] * 1000)
+
+
+_registry: dict[tuple[str, str], ProviderHealth] = {}
+_registry_lock = threading.Lock()
+
+
+def get_provider_health(provider: str, model: Optional[str], *, max_concurrency: int = 16) -> ProviderHealth:
+    key = (provider, model or "")
+    health = _registry.get(key)
+    if health is None:
+        with _registry_lock:
+            health = _registry.get(key)
+            if health is None:
+                health = ProviderHealth(provider, model or "", max_concurrency=max(1, max_concurrency))
+                _registry[key] = health
+    return health
+
+
+def is_circuit_open(provider: str, model: Optional[str]) -> bool:
+    health = _registry.get((provider, model or ""))
+    return health is not None and health.is_open()
+
+
+def snapshot_all() -> list[dict[str, Any]]:
+    with _registry_lock:
+        entries = list(_registry.values())
+    return [health.snapshot() for health in sorted(entries, key=lambda item: (item.provider, item.model))]
+
+
+def reset_provider_health() -> None:
+    with _registry_lock:
+        _registry.clear()
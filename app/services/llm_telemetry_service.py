@@ -0,0 +1,221 @@
+"""
+Structured per-call telemetry for LLM requests.
+
+Each provider call becomes one JSON line (provider, model, trace_id, attempt, bytes
+in/out, latency, status). Request/response bodies are attached only to a sampled
+fraction of calls. Records are queued and written by a background thread, so the
+request path never waits on disk; when the queue is full the record is dropped.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+_STOP = object()
+
+# 调用方（如 OCR 重试阶梯）声明的第几次尝试；未声明时为 1。
+_attempt: contextvars.ContextVar[int] = contextvars.ContextVar("llm_call_attempt", default=1)
+
+
+class JsonlTelemetrySink:
+    """有界队列 + 后台线程，按批追加写入 JSONL 文件。"""
+
+    def __init__(self, path: str, *, max_queue: int = 10000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.written = 0
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_queue))
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="llm-telemetry", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: dict[str, Any]) -> bool:
+        """非阻塞入队；队列已满或 sink 已关闭时丢弃并返回 False。"""
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已入队记录全部落盘（测试与关停时使用）。"""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("LLM telemetry queue still full on close; pending records dropped")
+            return
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        with self.path.open("a", encoding="utf-8") as handle:
+            while True:
+                batch = [self._queue.get()]
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = False
+                waiters: list[threading.Event] = []
+                for item in batch:
+                    if item is _STOP:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        self._write(handle, item)
+                handle.flush()
+                for waiter in waiters:
+                    waiter.set()
+                if stop:
+                    return
+
+    def _write(self, handle, record: dict[str, Any]) -> None:
+        try:
+            handle.write(json.dumps(record, ensure_ascii=False, default=str))
+            handle.write("\n")
+            self.written += 1
+        except (OSError, TypeError, ValueError) as exc:
+            self.dropped += 1
+            logger.warning("LLM telemetry write failed: %s", exc)
+
+
+_sink: Optional[JsonlTelemetrySink] = None
+_sink_lock = threading.Lock()
+_sink_built = False
+
+
+def _build_sink() -> Optional[JsonlTelemetrySink]:
+    if not settings.llm_telemetry_enabled or not settings.llm_telemetry_path:
+        return None
+    try:
+        return JsonlTelemetrySink(settings.llm_telemetry_path, max_queue=settings.llm_telemetry_queue_size)
+    except OSError as exc:
+        logger.warning("LLM telemetry disabled, cannot open %s: %s", settings.llm_telemetry_path, exc)
+        return None
+
+
+def get_telemetry_sink() -> Optional[JsonlTelemetrySink]:
+    """返回进程级 sink；LLM_TELEMETRY_ENABLED=0 时为 None。"""
+    global _sink, _sink_built
+    if not _sink_built:
+        with _sink_lock:
+            if not _sink_built:
+                _sink = _build_sink()
+                _sink_built = True
+    return _sink
+
+
+def set_telemetry_sink(sink: Optional[JsonlTelemetrySink]) -> None:
+    """替换 sink（测试或运维脚本使用），旧 sink 会被关闭。"""
+    global _sink, _sink_built
+    with _sink_lock:
+        previous, _sink = _sink, sink
+        _sink_built = True
+    if previous is not None and previous is not sink:
+        previous.close()
+
+
+def shutdown_telemetry() -> None:
+    """进程关停时落盘剩余记录。"""
+    global _sink, _sink_built
+    with _sink_lock:
+        previous, _sink = _sink, None
+        _sink_built = False
+    if previous is not None:
+        previous.close()
+
+
+@contextmanager
+def call_attempt(number: int) -> Iterator[None]:
+    """标记其中发起的 LLM 调用属于第 `number` 次尝试。"""
+    token = _attempt.set(number)
+    try:
+        yield
+    finally:
+        _attempt.reset(token)
+
+
+def should_sample_body() -> bool:
+    rate = settings.llm_telemetry_body_sample_rate
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def _clip(text: str) -> str:
+    limit = settings.llm_telemetry_body_max_chars
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]} ...[truncated {len(text) - limit} chars]"
+
+
+def record_llm_call(
+    *,
+    provider: str,
+    model: Optional[str],
+    trace_id: str,
+    status: Any,
+    latency_seconds: float,
+    bytes_out: int,
+    bytes_in: int,
+    images: int = 0,
+    error: Optional[str] = None,
+    request_preview: Optional[str] = None,
+    response_text: Optional[str] = None,
+) -> None:
+    """
+    Queue one call record. `status` is the HTTP status, or a short reason
+    (network_error / cancelled) when no response arrived. Bodies are kept only
+    for sampled calls.
+    """
+    sink = get_telemetry_sink()
+    if sink is None:
+        return
+    record: dict[str, Any] = {
+        "ts": round(time.time(), 3),
+        "provider": provider,
+        "model": model,
+        "trace_id": trace_id,
+        "attempt": _attempt.get(),
+        "status": status,
+        "latency_ms": int(latency_seconds * 1000),
+        "bytes_out": bytes_out,
+        "bytes_in": bytes_in,
+        "images": images,
+    }
+    if error:
+        record["error"] = error
+    if should_sample_body():
+        record["sampled"] = True
+        if request_preview is not None:
+            record["request"] = request_preview
+        if response_text is not None:
+            record["response"] = _clip(response_text)
+    sink.emit(record)
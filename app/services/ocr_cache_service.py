@@ -0,0 +1,309 @@
+import abc
+import contextvars
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+# 查找用途：整页 OCR 与插图框精修分开计数，页面级命中率不被精修请求稀释。
+CACHE_KIND_OCR = "ocr"
+CACHE_KIND_REFINE = "refine"
+
+
+@dataclass
+class OcrCacheStats:
+    """命中/未命中计数；进程级一份，另按请求通过 begin_request() 单独统计。"""
+
+    hits: int = 0
+    misses: int = 0
+    refine_hits: int = 0
+    refine_misses: int = 0
+
+
+def build_cache_key(
+    image_bytes: bytes,
+    *,
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float,
+) -> str:
+    """
+    内容寻址的缓存键：预处理后的图片字节 + 提示词 + 模型 + 温度。
+    任一项变化（包括改提示词）都会得到新键，旧结果自然失效。
+    """
+    digest = hashlib.sha256()
+    for part in (model, system_prompt, user_prompt, repr(float(temperature))):
+        encoded = part.encode("utf-8")
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+
+class OcrCacheBackend(abc.ABC):
+    """
+    缓存后端接口：值为模型返回的原始文本，按 TTL 过期、按总字节数淘汰。
+    缺少 get/set/clear 的后端在实例化时即报 TypeError。
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[str]: ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: str) -> None: ...
+
+    @abc.abstractmethod
+    def clear(self) -> None: ...
+
+    def close(self) -> None:
+        return None
+
+
+class MemoryOcrCache(OcrCacheBackend):
+    """进程内 LRU：超过 max_entries 或 max_bytes 时淘汰最久未使用的条目。"""
+
+    def __init__(self, *, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[str, int, float]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, stored_at = entry
+            if self.ttl_seconds > 0 and time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._total_bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._entries[key] = (value, size, time.time())
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteOcrCache(OcrCacheBackend):
+    """
+    SQLite 持久化缓存，服务重启后仍可命中。
+    总字节数超过 max_bytes 时按最近访问时间淘汰。
+    """
+
+    def __init__(self, path: str, *, max_bytes: int, ttl_seconds: float):
+        self.path = path
+        self.max_bytes = max(1, max_bytes)
+        self.ttl_seconds = ttl_seconds
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_ocr_cache_accessed_at ON ocr_cache (accessed_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM ocr_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            value, stored_at = row
+            if self.ttl_seconds > 0 and now - stored_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE ocr_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ocr_cache (key, value, size, stored_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now),
+                )
+                if self.ttl_seconds > 0:
+                    self._conn.execute(
+                        "DELETE FROM ocr_cache WHERE stored_at < ?",
+                        (now - self.ttl_seconds,),
+                    )
+                self._evict_over_budget()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict_over_budget(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM ocr_cache ORDER BY accessed_at ASC").fetchall()
+        evicted: list[tuple[str]] = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM ocr_cache WHERE key = ?", evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM ocr_cache")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+
+
+stats = OcrCacheStats()
+_request_stats: contextvars.ContextVar[Optional[OcrCacheStats]] = contextvars.ContextVar(
+    "ocr_cache_request_stats",
+    default=None,
+)
+_stats_lock = threading.Lock()
+_backend: Optional[OcrCacheBackend] = None
+_backend_lock = threading.Lock()
+
+
+def _build_backend() -> Optional[OcrCacheBackend]:
+    kind = settings.ocr_cache_backend.lower()
+    if kind in {"", "off", "none", "disabled"}:
+        return None
+    if kind == "sqlite":
+        try:
+            return SqliteOcrCache(
+                settings.ocr_cache_path,
+                max_bytes=settings.ocr_cache_max_bytes,
+                ttl_seconds=settings.ocr_cache_ttl_seconds,
+            )
+        except sqlite3.Error as exc:
+            logger.warning("OCR cache sqlite unavailable (%s), fallback to memory: %s", settings.ocr_cache_path, exc)
+    elif kind != "memory":
+        logger.warning("Unknown OCR_CACHE_BACKEND=%s, fallback to memory", settings.ocr_cache_backend)
+    return MemoryOcrCache(
+        max_entries=settings.ocr_cache_max_entries,
+        max_bytes=settings.ocr_cache_max_bytes,
+        ttl_seconds=settings.ocr_cache_ttl_seconds,
+    )
+
+
+def get_ocr_cache() -> Optional[OcrCacheBackend]:
+    """返回进程级缓存后端；OCR_CACHE_BACKEND=off 时为 None。"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _build_backend()
+    return _backend
+
+
+def set_ocr_cache(backend: Optional[OcrCacheBackend]) -> None:
+    """替换缓存后端（测试或运维脚本使用），旧后端会被关闭。"""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    if previous is not None and previous is not backend:
+        previous.close()
+
+
+def begin_request() -> OcrCacheStats:
+    """
+    为当前请求开启独立计数并返回之。
+    每个请求运行在各自的任务上下文中，派生的协程与 to_thread 调用共享这份计数。
+    """
+    request_stats = OcrCacheStats()
+    _request_stats.set(request_stats)
+    return request_stats
+
+
+def _record(hit: bool, kind: str) -> None:
+    targets = [stats]
+    request_stats = _request_stats.get()
+    if request_stats is not None:
+        targets.append(request_stats)
+    with _stats_lock:
+        for target in targets:
+            if kind == CACHE_KIND_REFINE:
+                if hit:
+                    target.refine_hits += 1
+                else:
+                    target.refine_misses += 1
+            elif hit:
+                target.hits += 1
+            else:
+                target.misses += 1
+
+
+def lookup(key: str, *, kind: str = CACHE_KIND_OCR) -> Optional[str]:
+    backend = get_ocr_cache()
+    if backend is None:
+        return None
+    try:
+        value = backend.get(key)
+    except Exception as exc:
+        # 缓存故障不影响识别，按未命中处理。
+        logger.warning("OCR cache lookup failed: %s", exc)
+        value = None
+    _record(value is not None, kind)
+    if value is not None:
+        logger.info("OCR cache hit kind=%s key=%s", kind, key[:16])
+    return value
+
+
+def store(key: str, value: str) -> None:
+    backend = get_ocr_cache()
+    if backend is None or not value.strip():
+        return
+    try:
+        backend.set(key, value)
+    except Exception as exc:
+        logger.warning("OCR cache store failed: %s", exc)
@@ -1,22 +1,34 @@
-import base64
+import asyncio
+import contextvars
 import http.client
 from io import BytesIO
 import json
 import logging
+import random
 import re
+import threading
 import time
-from typing import Optional
+from collections import deque
+from concurrent import futures
+from dataclasses import dataclass
+from typing import Iterator, Optional
 
 from PIL import Image, ImageOps
 
+from app.core.config import settings
 from app.schemas.common import ImageBox
 from app.schemas.ocr import OcrItem
+from app.services import image_service, llm_telemetry_service, ocr_cache_service
 from app.services.llm_client_service import (
+    LlmCircuitOpenError,
     LlmClientError,
     LlmHttpError,
     LlmNetworkError,
+    SiliconflowClient,
+    circuit_open,
     get_siliconflow_client,
 )
+from app.services.payload_service import data_url
 
 
 logger = logging.getLogger("uvicorn.error")
@@ -55,6 +67,16 @@ REFINE_USER_PROMPT = (
     "Coordinates must be in CURRENT IMAGE pixels."
 )
 
+REFINE_BATCH_USER_PROMPT_TEMPLATE = (
+    "This image tiles {count} question snapshots. Each snapshot is framed in light gray "
+    "and labelled #1 to #{count} in red just above its frame. "
+    "For EVERY snapshot, locate the clean printed diagram area inside that frame only. "
+    "Return ONLY a JSON array with one object per snapshot. "
+    "Format: [{{\"index\": int, \"diagram_box\": {{\"ymin\": int, \"xmin\": int, \"ymax\": int, \"xmax\": int}}}}]. "
+    "Use \"diagram_box\": null when a snapshot has no printed diagram. "
+    "Coordinates must be in CURRENT IMAGE pixels of the whole tiled image."
+)
+
 RETRYABLE_UPSTREAM_CODE_MARKERS = ("50507", "unknown error")
 OCR_RETRY_MAX_SIDE = 2048
 OCR_RETRY_QUALITY = 88
@@ -72,6 +94,8 @@ def _downscale_for_ocr(image_bytes: bytes, max_side: int = OCR_RETRY_MAX_SIDE) -
     Create a JPEG retry candidate with bounded resolution and size.
     """
     with Image.open(BytesIO(image_bytes)) as img:
+        # 页面已是编码后的 JPEG：按 DCT 缩放解码，省掉整页全尺寸解码。
+        image_service.draft_for_max_side(img, max_side)
         normalized = ImageOps.exif_transpose(img)
         if normalized.mode != "RGB":
             normalized = normalized.convert("RGB")
@@ -271,90 +295,413 @@ def _parse_refine_box(text: str) -> Optional[ImageBox]:
     )
 
 
-def _call_vision_completion(
-    image_bytes: bytes,
-    content_type: str,
-    file_name: str,
-    system_prompt: str,
-    user_prompt: str,
-    temperature: float = 0.2,
-) -> str:
-    client = get_siliconflow_client()
-    if not client or not client.ocr_model:
-        logger.error("OCR config missing. Please set SILICONFLOW_OCR_MODEL.")
-        raise RuntimeError("SILICONFLOW OCR config missing. Please set SILICONFLOW_OCR_MODEL.")
+def _parse_refine_boxes(text: str) -> dict[int, ImageBox]:
+    """解析批量精修结果，返回 {标注序号: 拼图坐标下的框}。"""
+    cleaned = _strip_code_fence(text).strip()
+    if not cleaned:
+        return {}
+    payload = None
+    try:
+        payload = json.loads(cleaned)
+    except json.JSONDecodeError:
+        match = re.search(r"\[.*\]", cleaned, re.DOTALL)
+        if match:
+            try:
+                payload = json.loads(match.group(0))
+            except json.JSONDecodeError:
+                payload = None
+    if isinstance(payload, dict):
+        payload = payload.get("items") or payload.get("results") or []
+    if not isinstance(payload, list):
+        return {}
+
+    boxes: dict[int, ImageBox] = {}
+    for entry in payload:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get("index"))
+        except (TypeError, ValueError):
+            continue
+        box = _to_image_box(entry.get("diagram_box") or entry.get("box"))
+        if box and box.ymax > box.ymin and box.xmax > box.xmin:
+            boxes[index] = box
+    return boxes
 
-    retry_candidates: list[tuple[str, bytes, str, str]] = [
-        ("orig-high", image_bytes, content_type, "high"),
-    ]
 
-    try:
-        retry_bytes, retry_content_type = _downscale_for_ocr(image_bytes)
-        retry_candidates.append(("scaled-high", retry_bytes, retry_content_type, "high"))
-        retry_candidates.append(("scaled-low", retry_bytes, retry_content_type, "low"))
-    except Exception as exc:
-        logger.warning("Failed to build scaled OCR retry candidate: %s", str(exc))
-        retry_candidates.append(("orig-low", image_bytes, content_type, "low"))
-
-    total_attempts = len(retry_candidates)
-    last_error_message = "OCR request failed."
-
-    for index, (tag, candidate_bytes, candidate_content_type, detail) in enumerate(retry_candidates, start=1):
-        encoded = base64.b64encode(candidate_bytes).decode("utf-8")
-        data_url = f"data:{candidate_content_type};base64,{encoded}"
-        payload = {
-            "model": client.ocr_model,
+class _VisionAttempt:
+    __slots__ = ("index", "tag", "candidate_bytes", "detail", "payload", "trace_id", "timeout", "started_at")
+
+    def __init__(
+        self,
+        index: int,
+        tag: str,
+        candidate_bytes: bytes,
+        detail: str,
+        payload: dict,
+        trace_id: str,
+        timeout: float,
+    ):
+        self.index = index
+        self.tag = tag
+        self.candidate_bytes = candidate_bytes
+        self.detail = detail
+        self.payload = payload
+        self.trace_id = trace_id
+        self.timeout = timeout
+        self.started_at = time.monotonic()
+
+
+class _LadderHistory:
+    """
+    各模型、各档位（orig-high / scaled-high ...）最近的上游结果，用于挑选起始档位。
+    只记录可重试的失败（5xx、超时、断连），4xx 与档位无关不计入。
+    """
+
+    def __init__(self, window_seconds: float = 300.0, max_samples: int = 20):
+        self.window_seconds = window_seconds
+        self.max_samples = max_samples
+        self._samples: dict[tuple[str, str], deque[tuple[float, bool]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, tag: str, ok: bool) -> None:
+        with self._lock:
+            samples = self._samples.setdefault((model, tag), deque(maxlen=self.max_samples))
+            samples.append((time.monotonic(), ok))
+
+    def failure_rate(self, model: str, tag: str) -> tuple[float, int]:
+        """返回 (失败率, 窗口内样本数)。"""
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            recent = [ok for stamp, ok in self._samples.get((model, tag), ()) if stamp >= cutoff]
+        if not recent:
+            return 0.0, 0
+        return recent.count(False) / len(recent), len(recent)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+_ladder_history = _LadderHistory()
+
+
+class _LatencyHistory:
+    """各模型、各档位最近成功调用的耗时，用于决定对冲请求的等待时间。"""
+
+    def __init__(self, max_samples: int = 100):
+        self.max_samples = max_samples
+        self._samples: dict[tuple[str, str], deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, tag: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault((model, tag), deque(maxlen=self.max_samples)).append(seconds)
+
+    def percentile(self, model: str, tag: str, fraction: float) -> tuple[Optional[float], int]:
+        """返回 (分位耗时, 样本数)；无样本时为 (None, 0)。"""
+        with self._lock:
+            values = sorted(self._samples.get((model, tag), ()))
+        if not values:
+            return None, 0
+        index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+        return values[index], len(values)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+_latency_history = _LatencyHistory()
+
+
+@dataclass
+class OcrHedgeStats:
+    """对冲请求计数：fired 为额外发出的请求数，won 为其中先于原请求返回的次数。"""
+
+    fired: int = 0
+    won: int = 0
+
+
+hedge_stats = OcrHedgeStats()
+_hedge_request_stats: contextvars.ContextVar[Optional[OcrHedgeStats]] = contextvars.ContextVar(
+    "ocr_hedge_request_stats",
+    default=None,
+)
+_hedge_stats_lock = threading.Lock()
+
+
+def begin_hedge_request() -> OcrHedgeStats:
+    """为当前请求开启独立的对冲计数（与 ocr_cache_service.begin_request 相同的上下文约定）。"""
+    request_stats = OcrHedgeStats()
+    _hedge_request_stats.set(request_stats)
+    return request_stats
+
+
+def _record_hedge(*, won: bool) -> None:
+    targets = [hedge_stats]
+    request_stats = _hedge_request_stats.get()
+    if request_stats is not None:
+        targets.append(request_stats)
+    with _hedge_stats_lock:
+        for target in targets:
+            if won:
+                target.won += 1
+            else:
+                target.fired += 1
+
+
+# 档位失败率达到该值（且样本数足够）时，直接从下一档开始。
+OCR_LADDER_SKIP_FAILURE_RATE = 0.6
+OCR_LADDER_SKIP_MIN_SAMPLES = 3
+# 剩余时间不足以完成一次有意义的请求时不再发起新尝试。
+OCR_MIN_ATTEMPT_SECONDS = 5.0
+
+
+class _VisionRetryPlan:
+    """
+    OCR 重试策略（原图高清 -> 缩放高清 -> 缩放低清），与传输方式无关。
+
+    - 缩放候选按需生成：首个档位成功时不做缩放与重新编码。
+    - 起始档位按原图大小与该模型近期各档失败率自适应选择，跳过注定失败的尝试。
+    - 两次尝试之间带抖动退避；整体受 deadline 约束，单次超时不超过剩余时间。
+
+    同步/异步调用方只负责发请求：按 attempts() 依次发送（先等待 backoff_seconds()），
+    成功交给 on_success() 取正文，失败交给 on_error()（不可重试时抛 RuntimeError）。
+    """
+
+    def __init__(
+        self,
+        model: str,
+        timeout_seconds: int,
+        image_bytes: bytes,
+        content_type: str,
+        file_name: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float,
+        *,
+        deadline: Optional[float] = None,
+        history: Optional[_LadderHistory] = None,
+        latencies: Optional[_LatencyHistory] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        self.model = model
+        self.timeout_seconds = timeout_seconds
+        self.image_bytes = image_bytes
+        self.content_type = content_type
+        self.file_name = file_name
+        self.system_prompt = system_prompt
+        self.user_prompt = user_prompt
+        self.temperature = temperature
+        self.deadline = deadline
+        self.history = history if history is not None else _ladder_history
+        self.latencies = latencies if latencies is not None else _latency_history
+        self._rng = rng or random.Random()
+        self.last_error_message = "OCR request failed."
+        self._scaled: Optional[tuple[bytes, str]] = None
+        self._scaled_failed = False
+        self._failures = 0
+
+        self.ladder: list[tuple[str, str]] = [
+            ("orig-high", "high"),
+            ("scaled-high", "high"),
+            ("scaled-low", "low"),
+        ]
+        self.start_index = self._choose_start()
+
+    def _choose_start(self) -> int:
+        last = len(self.ladder) - 1
+        start = 0
+        if len(self.image_bytes) > settings.ocr_orig_max_bytes:
+            start = 1
+            logger.info(
+                "OCR ladder starts scaled: bytes=%d > OCR_ORIG_MAX_BYTES=%d",
+                len(self.image_bytes),
+                settings.ocr_orig_max_bytes,
+            )
+        while start < last:
+            tag = self.ladder[start][0]
+            rate, samples = self.history.failure_rate(self.model, tag)
+            if samples < OCR_LADDER_SKIP_MIN_SAMPLES or rate < OCR_LADDER_SKIP_FAILURE_RATE:
+                break
+            logger.info(
+                "OCR ladder skips tag=%s model=%s recent_failure_rate=%.2f samples=%d",
+                tag,
+                self.model,
+                rate,
+                samples,
+            )
+            start += 1
+        return start
+
+    def _scaled_candidate(self) -> Optional[tuple[bytes, str]]:
+        if self._scaled is None and not self._scaled_failed:
+            try:
+                self._scaled = _downscale_for_ocr(self.image_bytes)
+            except Exception as exc:
+                self._scaled_failed = True
+                logger.warning("Failed to build scaled OCR retry candidate: %s", str(exc))
+        return self._scaled
+
+    def prepare(self, next_attempt: int = 1) -> None:
+        """
+        第 next_attempt 次尝试要用缩放候选时预先生成
+        （异步调用方放到线程里执行，避免在事件循环上做缩放编码）。
+        """
+        ladder_index = self.start_index + next_attempt - 1
+        if ladder_index < len(self.ladder) and self.ladder[ladder_index][0].startswith("scaled"):
+            self._scaled_candidate()
+
+    def _remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def attempt_timeout(self) -> float:
+        remaining = self._remaining()
+        if remaining is None:
+            return float(self.timeout_seconds)
+        return max(1.0, min(float(self.timeout_seconds), remaining))
+
+    def hedge_delay(self, attempt: _VisionAttempt) -> Optional[float]:
+        """
+        发出对冲请求前的等待秒数；未开启、样本不足或剩余超时不够再发一次时返回 None。
+        """
+        if not settings.ocr_hedge_enabled:
+            return None
+        delay, samples = self.latencies.percentile(self.model, attempt.tag, settings.ocr_hedge_percentile)
+        if delay is None or samples < max(1, settings.ocr_hedge_min_samples):
+            return None
+        delay = max(settings.ocr_hedge_min_delay_seconds, delay)
+        if attempt.timeout - delay < OCR_MIN_ATTEMPT_SECONDS:
+            return None
+        return delay
+
+    def backoff_seconds(self) -> float:
+        """下一次尝试前的等待：指数退避 + 全抖动，且不挤占剩余时间。"""
+        if self._failures == 0:
+            return 0.0
+        ceiling = min(
+            settings.ocr_retry_backoff_max_seconds,
+            settings.ocr_retry_backoff_base_seconds * (2 ** (self._failures - 1)),
+        )
+        delay = self._rng.uniform(0.0, max(0.0, ceiling))
+        remaining = self._remaining()
+        if remaining is not None:
+            delay = max(0.0, min(delay, remaining - OCR_MIN_ATTEMPT_SECONDS))
+        return delay
+
+    def _payload(self, candidate_bytes: bytes, candidate_content_type: str, detail: str) -> dict:
+        image_url = data_url(candidate_bytes, candidate_content_type)
+        return {
+            "model": self.model,
             "messages": [
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": self.system_prompt},
                 {
                     "role": "user",
                     "content": [
-                        {"type": "image_url", "image_url": {"url": data_url, "detail": detail}},
-                        {"type": "text", "text": user_prompt},
+                        {"type": "image_url", "image_url": {"url": image_url, "detail": detail}},
+                        {"type": "text", "text": self.user_prompt},
                     ],
                 },
             ],
-            "temperature": temperature,
+            "temperature": self.temperature,
         }
 
-        logger.info(
-            "OCR request start attempt=%d/%d tag=%s model=%s bytes=%d detail=%s filename=%s timeout=%ss",
-            index,
-            total_attempts,
-            tag,
-            client.ocr_model,
-            len(candidate_bytes),
-            detail,
-            file_name,
-            client.base_client.timeout_seconds,
-        )
-        start_time = time.monotonic()
+    @property
+    def total_attempts(self) -> int:
+        return len(self.ladder) - self.start_index
 
-        try:
-            body = client.base_client.chat_completions(
-                payload,
-                trace_id=f"ocr:{file_name}:{tag}:{index}",
-            )
-            content = (
-                body.get("choices", [{}])[0]
-                .get("message", {})
-                .get("content", "")
-            )
-            elapsed = time.monotonic() - start_time
+    def attempts(self) -> Iterator[_VisionAttempt]:
+        total_attempts = self.total_attempts
+        used_orig_low = False
+        for index, (tag, detail) in enumerate(self.ladder[self.start_index:], start=1):
+            remaining = self._remaining()
+            if remaining is not None and remaining < OCR_MIN_ATTEMPT_SECONDS:
+                logger.warning(
+                    "OCR deadline reached before attempt=%d/%d tag=%s filename=%s",
+                    index,
+                    total_attempts,
+                    tag,
+                    self.file_name,
+                )
+                if index == 1:
+                    self.last_error_message = "OCR request deadline exceeded."
+                return
+
+            candidate_bytes, candidate_content_type = self.image_bytes, self.content_type
+            if tag.startswith("scaled"):
+                scaled = self._scaled_candidate()
+                if scaled is None:
+                    # 无法缩放时只保留一次原图低清尝试。
+                    if used_orig_low:
+                        continue
+                    used_orig_low = True
+                    tag, detail = "orig-low", "low"
+                else:
+                    candidate_bytes, candidate_content_type = scaled
+
+            timeout = self.attempt_timeout()
             logger.info(
-                "OCR response received attempt=%d/%d tag=%s length=%d elapsed=%.2fs",
+                "OCR request start attempt=%d/%d tag=%s model=%s bytes=%d detail=%s filename=%s timeout=%.0fs",
                 index,
                 total_attempts,
                 tag,
-                len(content),
-                elapsed,
+                self.model,
+                len(candidate_bytes),
+                detail,
+                self.file_name,
+                timeout,
             )
-            return content
-        except LlmHttpError as exc:
+            yield _VisionAttempt(
+                index,
+                tag,
+                candidate_bytes,
+                detail,
+                self._payload(candidate_bytes, candidate_content_type, detail),
+                trace_id=f"ocr:{self.file_name}:{tag}:{index}",
+                timeout=timeout,
+            )
+
+    def on_success(self, attempt: _VisionAttempt, body: dict) -> str:
+        self.history.record(self.model, attempt.tag, True)
+        content = (
+            body.get("choices", [{}])[0]
+            .get("message", {})
+            .get("content", "")
+        )
+        elapsed = time.monotonic() - attempt.started_at
+        # 对冲获胜时记录的是自原请求发出起的耗时，即原请求耗时的下界。
+        self.latencies.record(self.model, attempt.tag, elapsed)
+        logger.info(
+            "OCR response received attempt=%d/%d tag=%s length=%d elapsed=%.2fs",
+            attempt.index,
+            self.total_attempts,
+            attempt.tag,
+            len(content),
+            elapsed,
+        )
+        return content
+
+    def on_error(self, attempt: _VisionAttempt, exc: BaseException) -> None:
+        """Return to try the next candidate; raise RuntimeError when the call should fail."""
+        total_attempts = self.total_attempts
+        index = attempt.index
+        tag = attempt.tag
+        elapsed = time.monotonic() - attempt.started_at
+        has_next = index < total_attempts
+
+        if isinstance(exc, LlmCircuitOpenError):
+            # 同一模型的其它档位也会被拒绝，直接失败；不计入档位历史。
+            logger.error("OCR call rejected attempt=%d/%d tag=%s: %s", index, total_attempts, tag, str(exc))
+            self.last_error_message = "OCR 上游服务暂时不可用，请稍后重试。"
+            raise RuntimeError(self.last_error_message) from exc
+        if isinstance(exc, LlmHttpError):
             body_text = exc.body
-            elapsed = time.monotonic() - start_time
             retryable = _is_retryable_ocr_http_error(exc.status_code, body_text)
-            has_next = index < total_attempts
+            if retryable:
+                self.history.record(self.model, tag, False)
             logger.error(
                 "OCR HTTP error attempt=%d/%d tag=%s status=%s retryable=%s elapsed=%.2fs body=%s",
                 index,
@@ -365,16 +712,18 @@ def _call_vision_completion(
                 elapsed,
                 body_text,
             )
-            if retryable and has_next:
-                continue
             if retryable:
-                last_error_message = "OCR 上游服务暂时异常，请稍后重试。"
+                self._failures += 1
+                self.last_error_message = "OCR 上游服务暂时异常，请稍后重试。"
+                if has_next:
+                    return
             else:
-                last_error_message = f"OCR request failed ({exc.status_code})."
-            raise RuntimeError(last_error_message) from exc
-        except (LlmNetworkError, http.client.RemoteDisconnected, ConnectionError) as exc:
-            elapsed = time.monotonic() - start_time
-            has_next = index < total_attempts
+                self.last_error_message = f"OCR request failed ({exc.status_code})."
+            raise RuntimeError(self.last_error_message) from exc
+
+        if isinstance(exc, (LlmNetworkError, http.client.RemoteDisconnected, ConnectionError)):
+            self.history.record(self.model, tag, False)
+            self._failures += 1
             logger.warning(
                 "OCR request timeout/network error attempt=%d/%d tag=%s retryable=%s elapsed=%.2fs err=%s",
                 index,
@@ -384,29 +733,297 @@ def _call_vision_completion(
                 elapsed,
                 str(exc),
             )
-            if has_next:
-                continue
-            last_error_message = (
+            self.last_error_message = (
                 "OCR request failed or timed out. Try again, use a smaller image, "
                 "or increase SILICONFLOW_TIMEOUT_SECONDS."
             )
-            raise RuntimeError(last_error_message) from exc
-        except LlmClientError as exc:
-            raise RuntimeError(f"OCR request failed: {str(exc)}") from exc
+            if has_next:
+                return
+            raise RuntimeError(self.last_error_message) from exc
 
-    raise RuntimeError(last_error_message)
+        raise RuntimeError(f"OCR request failed: {str(exc)}") from exc
 
+    def exhausted(self) -> RuntimeError:
+        return RuntimeError(self.last_error_message)
 
-def extract_questions(image_bytes: bytes, content_type: str, file_name: str) -> list[OcrItem]:
-    """Call SiliconFlow vision model to extract questions."""
-    content = _call_vision_completion(
-        image_bytes=image_bytes,
-        content_type=content_type,
-        file_name=file_name,
-        system_prompt=SYSTEM_PROMPT,
-        user_prompt=USER_PROMPT,
-        temperature=0.2,
+
+def _vision_deadline() -> Optional[float]:
+    if settings.ocr_request_deadline_seconds <= 0:
+        return None
+    return time.monotonic() + settings.ocr_request_deadline_seconds
+
+
+_VISION_CALL_ERRORS = (LlmClientError, http.client.RemoteDisconnected, ConnectionError)
+
+
+_hedge_executor: Optional[futures.ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> futures.ThreadPoolExecutor:
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = futures.ThreadPoolExecutor(
+                    max_workers=max(2, settings.io_thread_pool_size),
+                    thread_name_prefix="ocr-hedge",
+                )
+    return _hedge_executor
+
+
+def _log_hedge(attempt: _VisionAttempt, delay: float) -> None:
+    logger.info(
+        "OCR hedge request sent attempt=%d tag=%s after=%.2fs trace_id=%s",
+        attempt.index,
+        attempt.tag,
+        delay,
+        attempt.trace_id,
     )
+
+
+def _send_vision_attempt(client: SiliconflowClient, plan: _VisionRetryPlan, attempt: _VisionAttempt) -> dict:
+    """
+    Send one ladder attempt, hedged when the plan says so. The blocking loser cannot be
+    interrupted; it finishes in the hedge pool and its answer is dropped.
+    """
+    send = client.base_client.chat_completions
+    delay = plan.hedge_delay(attempt)
+    with llm_telemetry_service.call_attempt(attempt.index):
+        if delay is None:
+            return send(attempt.payload, trace_id=attempt.trace_id, timeout=attempt.timeout)
+        # 线程池任务不继承 ContextVar，复制当前上下文以带上尝试序号。
+        context = contextvars.copy_context()
+
+    executor = _get_hedge_executor()
+    primary = executor.submit(
+        context.copy().run,
+        send,
+        attempt.payload,
+        trace_id=attempt.trace_id,
+        timeout=attempt.timeout,
+    )
+    done, _ = futures.wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+    hedge = executor.submit(
+        context.run,
+        send,
+        attempt.payload,
+        trace_id=f"{attempt.trace_id}:hedge",
+        timeout=max(1.0, attempt.timeout - delay),
+    )
+    _record_hedge(won=False)
+    _log_hedge(attempt, delay)
+    return _first_answer_sync(primary, hedge)
+
+
+def _first_answer_sync(primary: futures.Future, hedge: futures.Future) -> dict:
+    pending = {primary, hedge}
+    first_error: Optional[BaseException] = None
+    while pending:
+        done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+        for future in done:
+            exc = future.exception()
+            if exc is not None:
+                first_error = first_error or exc
+                continue
+            if future is hedge:
+                _record_hedge(won=True)
+            return future.result()
+    raise first_error
+
+
+async def _send_vision_attempt_async(
+    client: SiliconflowClient,
+    plan: _VisionRetryPlan,
+    attempt: _VisionAttempt,
+) -> dict:
+    """Async counterpart of `_send_vision_attempt`; the slower request is cancelled."""
+    send = client.async_client.chat_completions
+    delay = plan.hedge_delay(attempt)
+    # 派生的任务在创建时复制上下文，主请求与对冲请求都带上尝试序号。
+    with llm_telemetry_service.call_attempt(attempt.index):
+        if delay is None:
+            return await send(attempt.payload, trace_id=attempt.trace_id, timeout=attempt.timeout)
+
+        primary = asyncio.ensure_future(send(attempt.payload, trace_id=attempt.trace_id, timeout=attempt.timeout))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            hedge = asyncio.ensure_future(
+                send(
+                    attempt.payload,
+                    trace_id=f"{attempt.trace_id}:hedge",
+                    timeout=max(1.0, attempt.timeout - delay),
+                )
+            )
+            tasks.append(hedge)
+            _record_hedge(won=False)
+            _log_hedge(attempt, delay)
+
+            pending = set(tasks)
+            first_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    exc = task.exception()
+                    if exc is not None:
+                        first_error = first_error or exc
+                        continue
+                    if task is hedge:
+                        _record_hedge(won=True)
+                    return task.result()
+            raise first_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _ocr_client() -> SiliconflowClient:
+    client = get_siliconflow_client()
+    if not client or not client.ocr_model:
+        logger.error("OCR config missing. Please set SILICONFLOW_OCR_MODEL.")
+        raise RuntimeError("SILICONFLOW OCR config missing. Please set SILICONFLOW_OCR_MODEL.")
+    return client
+
+
+def _ocr_circuit_open() -> bool:
+    client = get_siliconflow_client()
+    return bool(client and client.ocr_model and circuit_open("siliconflow", client.ocr_model))
+
+
+def _cached_vision_content(
+    model: str,
+    image_bytes: bytes,
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float,
+    cache_kind: str = ocr_cache_service.CACHE_KIND_OCR,
+) -> tuple[str, Optional[str]]:
+    """Return (cache_key, cached_content or None); hashing and backend I/O are blocking."""
+    key = ocr_cache_service.build_cache_key(
+        image_bytes,
+        model=model,
+        system_prompt=system_prompt,
+        user_prompt=user_prompt,
+        temperature=temperature,
+    )
+    return key, ocr_cache_service.lookup(key, kind=cache_kind)
+
+
+def _call_vision_completion(
+    image_bytes: bytes,
+    content_type: str,
+    file_name: str,
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.2,
+    cache_kind: str = ocr_cache_service.CACHE_KIND_OCR,
+) -> str:
+    client = _ocr_client()
+    cache_key, cached = _cached_vision_content(
+        client.ocr_model,
+        image_bytes,
+        system_prompt,
+        user_prompt,
+        temperature,
+        cache_kind,
+    )
+    if cached is not None:
+        return cached
+    plan = _VisionRetryPlan(
+        client.ocr_model,
+        client.base_client.timeout_seconds,
+        image_bytes,
+        content_type,
+        file_name,
+        system_prompt,
+        user_prompt,
+        temperature,
+        deadline=_vision_deadline(),
+    )
+    for attempt in plan.attempts():
+        delay = plan.backoff_seconds()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            body = _send_vision_attempt(client, plan, attempt)
+        except _VISION_CALL_ERRORS as exc:
+            plan.on_error(attempt, exc)
+            continue
+        content = plan.on_success(attempt, body)
+        ocr_cache_service.store(cache_key, content)
+        return content
+    raise plan.exhausted()
+
+
+async def _call_vision_completion_async(
+    image_bytes: bytes,
+    content_type: str,
+    file_name: str,
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.2,
+    cache_kind: str = ocr_cache_service.CACHE_KIND_OCR,
+) -> str:
+    client = _ocr_client()
+    if client.async_client is None:
+        return await asyncio.to_thread(
+            _call_vision_completion,
+            image_bytes,
+            content_type,
+            file_name,
+            system_prompt,
+            user_prompt,
+            temperature,
+            cache_kind,
+        )
+    cache_key, cached = await asyncio.to_thread(
+        _cached_vision_content,
+        client.ocr_model,
+        image_bytes,
+        system_prompt,
+        user_prompt,
+        temperature,
+        cache_kind,
+    )
+    if cached is not None:
+        return cached
+    plan = _VisionRetryPlan(
+        client.ocr_model,
+        client.async_client.timeout_seconds,
+        image_bytes,
+        content_type,
+        file_name,
+        system_prompt,
+        user_prompt,
+        temperature,
+        deadline=_vision_deadline(),
+    )
+    # The scaled candidate decodes/re-encodes the image; build it off the event loop.
+    await asyncio.to_thread(plan.prepare, 1)
+    for attempt in plan.attempts():
+        delay = plan.backoff_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            body = await _send_vision_attempt_async(client, plan, attempt)
+        except _VISION_CALL_ERRORS as exc:
+            plan.on_error(attempt, exc)
+            await asyncio.to_thread(plan.prepare, attempt.index + 1)
+            continue
+        content = plan.on_success(attempt, body)
+        await asyncio.to_thread(ocr_cache_service.store, cache_key, content)
+        return content
+    raise plan.exhausted()
+
+
+def _items_from_content(content: str) -> list[OcrItem]:
     items = _parse_items(content)
     logger.info("OCR parsed items=%d", len(items))
     if not items and content.strip():
@@ -421,11 +1038,55 @@ def extract_questions(image_bytes: bytes, content_type: str, file_name: str) ->
     return items
 
 
+def _refine_box_from_content(content: str) -> Optional[ImageBox]:
+    box = _parse_refine_box(content)
+    if box:
+        logger.info(
+            "Refine diagram box parsed: (%d,%d,%d,%d)",
+            box.ymin,
+            box.xmin,
+            box.ymax,
+            box.xmax,
+        )
+    else:
+        logger.info("Refine diagram box not found")
+    return box
+
+
+def extract_questions(image_bytes: bytes, content_type: str, file_name: str) -> list[OcrItem]:
+    """Call SiliconFlow vision model to extract questions."""
+    content = _call_vision_completion(
+        image_bytes=image_bytes,
+        content_type=content_type,
+        file_name=file_name,
+        system_prompt=SYSTEM_PROMPT,
+        user_prompt=USER_PROMPT,
+        temperature=0.2,
+    )
+    return _items_from_content(content)
+
+
+async def extract_questions_async(image_bytes: bytes, content_type: str, file_name: str) -> list[OcrItem]:
+    """Async variant of `extract_questions`; waits on the provider without holding a thread."""
+    content = await _call_vision_completion_async(
+        image_bytes=image_bytes,
+        content_type=content_type,
+        file_name=file_name,
+        system_prompt=SYSTEM_PROMPT,
+        user_prompt=USER_PROMPT,
+        temperature=0.2,
+    )
+    return _items_from_content(content)
+
+
 def refine_diagram_box(image_bytes: bytes, content_type: str, file_name: str) -> Optional[ImageBox]:
     """
     Second-pass refinement for printed diagram region.
-    Input should be one question snapshot.
+    Input should be one question snapshot. Skipped (None) while the OCR model circuit is open.
     """
+    if _ocr_circuit_open():
+        logger.info("Refine diagram box skipped: OCR circuit open")
+        return None
     content = _call_vision_completion(
         image_bytes=image_bytes,
         content_type=content_type,
@@ -433,16 +1094,190 @@ def refine_diagram_box(image_bytes: bytes, content_type: str, file_name: str) ->
         system_prompt=REFINE_SYSTEM_PROMPT,
         user_prompt=REFINE_USER_PROMPT,
         temperature=0.0,
+        cache_kind=ocr_cache_service.CACHE_KIND_REFINE,
     )
-    box = _parse_refine_box(content)
-    if box:
-        logger.info(
-            "Refine diagram box parsed: (%d,%d,%d,%d)",
-            box.ymin,
-            box.xmin,
-            box.ymax,
-            box.xmax,
+    return _refine_box_from_content(content)
+
+
+async def refine_diagram_box_async(image_bytes: bytes, content_type: str, file_name: str) -> Optional[ImageBox]:
+    """Async variant of `refine_diagram_box`."""
+    if _ocr_circuit_open():
+        logger.info("Refine diagram box skipped: OCR circuit open")
+        return None
+    content = await _call_vision_completion_async(
+        image_bytes=image_bytes,
+        content_type=content_type,
+        file_name=file_name,
+        system_prompt=REFINE_SYSTEM_PROMPT,
+        user_prompt=REFINE_USER_PROMPT,
+        temperature=0.0,
+        cache_kind=ocr_cache_service.CACHE_KIND_REFINE,
+    )
+    return _refine_box_from_content(content)
+
+
+def _mosaic_box_readings(
+    box: ImageBox,
+    mosaic_width: int,
+    mosaic_height: int,
+) -> tuple[Optional[ImageBox], Optional[ImageBox]]:
+    """模型框的两种理解：(拼图像素, 0~1000 归一化坐标换算成的拼图像素)；两者都先纠正 x/y 颠倒。"""
+    as_pixels = image_service.normalize_image_box_for_source(box, mosaic_width, mosaic_height)
+    unit = image_service.normalize_image_box_for_source(box, 1000, 1000)
+    as_unit = None
+    if unit:
+        as_unit = ImageBox(
+            ymin=round(unit.ymin * mosaic_height / 1000),
+            xmin=round(unit.xmin * mosaic_width / 1000),
+            ymax=round(unit.ymax * mosaic_height / 1000),
+            xmax=round(unit.xmax * mosaic_width / 1000),
         )
-    else:
-        logger.info("Refine diagram box not found")
-    return box
+    return as_pixels, as_unit
+
+
+def _boxes_from_mosaic(
+    content: str,
+    tiles: list[image_service.MosaicTile],
+    mosaic_size: tuple[int, int],
+) -> list[Optional[ImageBox]]:
+    """
+    拼图尺寸通常低于 normalize_image_box_for_source 的 0~1000 判定阈值，
+    因此整份回答按两种坐标系各映射一次，取落回自己编号格子最多的一种（平局按像素）。
+    """
+    mosaic_width, mosaic_height = mosaic_size
+    readings = {
+        index: _mosaic_box_readings(box, mosaic_width, mosaic_height)
+        for index, box in _parse_refine_boxes(content).items()
+    }
+    mapped: list[Optional[ImageBox]] = [None] * len(tiles)
+    best_hits, coordinate_space = -1, "pixel"
+    for reading, space in enumerate(("pixel", "unit1000")):
+        candidate = []
+        for tile in tiles:
+            box = readings[tile.index][reading] if tile.index in readings else None
+            candidate.append(tile.to_source_box(box) if box else None)
+        hits = sum(1 for box in candidate if box is not None)
+        if hits > best_hits:
+            mapped, best_hits, coordinate_space = candidate, hits, space
+    logger.info(
+        "Batched refine parsed boxes=%d mapped=%d tiles=%d coords=%s",
+        len(readings),
+        best_hits,
+        len(tiles),
+        coordinate_space,
+    )
+    return mapped
+
+
+def refine_diagram_boxes(snapshots: list[bytes], file_name: str) -> list[Optional[ImageBox]]:
+    """
+    Batched `refine_diagram_box`: tile the PNG snapshots into one labelled image, ask for
+    every diagram box in one call and map each box back to its snapshot's pixels.
+    """
+    if _ocr_circuit_open():
+        logger.info("Batched refine skipped: OCR circuit open")
+        return [None] * len(snapshots)
+    mosaic_bytes, tiles = image_service.build_snapshot_mosaic(snapshots)
+    content = _call_vision_completion(
+        image_bytes=mosaic_bytes,
+        content_type="image/png",
+        file_name=file_name,
+        system_prompt=REFINE_SYSTEM_PROMPT,
+        user_prompt=REFINE_BATCH_USER_PROMPT_TEMPLATE.format(count=len(tiles)),
+        temperature=0.0,
+        cache_kind=ocr_cache_service.CACHE_KIND_REFINE,
+    )
+    return _boxes_from_mosaic(content, tiles, image_service.get_image_size(mosaic_bytes))
+
+
+async def refine_diagram_boxes_async(snapshots: list[bytes], file_name: str) -> list[Optional[ImageBox]]:
+    """Async variant of `refine_diagram_boxes`; tiling runs in a worker thread."""
+    if _ocr_circuit_open():
+        logger.info("Batched refine skipped: OCR circuit open")
+        return [None] * len(snapshots)
+    mosaic_bytes, tiles = await asyncio.to_thread(image_service.build_snapshot_mosaic, snapshots)
+    content = await _call_vision_completion_async(
+        image_bytes=mosaic_bytes,
+        content_type="image/png",
+        file_name=file_name,
+        system_prompt=REFINE_SYSTEM_PROMPT,
+        user_prompt=REFINE_BATCH_USER_PROMPT_TEMPLATE.format(count=len(tiles)),
+        temperature=0.0,
+        cache_kind=ocr_cache_service.CACHE_KIND_REFINE,
+    )
+    return _boxes_from_mosaic(content, tiles, image_service.get_image_size(mosaic_bytes))
+
+
+class RefineBatcher:
+    """
+    单次上传内的精修请求合批：各题并发调用 refine()，凑满 max_batch 张或等待
+    linger_seconds 后一起发出；单张时退回普通的单题精修。
+    一批失败时该批所有题都收到同一异常，由调用方回退到初始框。
+    """
+
+    def __init__(self, file_name: str, *, max_batch: int, linger_seconds: float):
+        self.file_name = file_name
+        self.max_batch = max(1, max_batch)
+        self.linger_seconds = max(0.0, linger_seconds)
+        self.request_count = 0
+        self._pending: list[tuple[bytes, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def refine(self, snapshot: bytes) -> Optional[ImageBox]:
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._pending.append((snapshot, waiter))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger_seconds, self._flush)
+        return await waiter
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = [(snapshot, waiter) for snapshot, waiter in self._pending if not waiter.done()]
+        self._pending = []
+        if not batch:
+            return
+        self.request_count += 1
+        task = asyncio.ensure_future(self._run(batch, self.request_count))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[bytes, asyncio.Future]], batch_no: int) -> None:
+        snapshots = [snapshot for snapshot, _ in batch]
+        try:
+            if len(snapshots) == 1:
+                boxes = [
+                    await refine_diagram_box_async(
+                        snapshots[0],
+                        "image/png",
+                        f"{self.file_name}-refine-{batch_no}.png",
+                    )
+                ]
+            else:
+                boxes = await refine_diagram_boxes_async(snapshots, f"{self.file_name}-refine-batch-{batch_no}.png")
+        except Exception as exc:
+            for _, waiter in batch:
+                if not waiter.done():
+                    waiter.set_exception(exc)
+            return
+        for (_, waiter), box in zip(batch, boxes):
+            if not waiter.done():
+                waiter.set_result(box)
+
+    async def aclose(self) -> None:
+        """Cancel batches still in flight (e.g. the client went away)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for _, waiter in self._pending:
+            waiter.cancel()
+        self._pending = []
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,152 @@
+import logging
+import threading
+from typing import Generic, Optional, TypeVar
+
+from sqlalchemy.orm import Session
+
+from app.db.models.paper import Paper
+
+logger = logging.getLogger("uvicorn.error")
+
+V = TypeVar("V")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def parse_phash(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value, 16)
+    except ValueError:
+        return None
+
+
+class _BkNode(Generic[V]):
+    __slots__ = ("key", "values", "children")
+
+    def __init__(self, key: int, value: V):
+        self.key = key
+        self.values: list[V] = [value]
+        self.children: dict[int, "_BkNode[V]"] = {}
+
+
+class BkTree(Generic[V]):
+    """
+    汉明距离上的 BK 树：按到父节点的距离分叉，
+    查询半径 r 时只需下探距离落在 [d-r, d+r] 的子树，无需全表扫描。
+    """
+
+    def __init__(self) -> None:
+        self._root: Optional[_BkNode[V]] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: int, value: V) -> None:
+        self._size += 1
+        if self._root is None:
+            self._root = _BkNode(key, value)
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(key, node.key)
+            if distance == 0:
+                node.values.append(value)
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _BkNode(key, value)
+                return
+            node = child
+
+    def search(self, key: int, max_distance: int) -> list[tuple[int, V]]:
+        """返回 (距离, 值) 列表，按距离升序。"""
+        if self._root is None:
+            return []
+        found: list[tuple[int, V]] = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(key, node.key)
+            if distance <= max_distance:
+                found.extend((distance, value) for value in node.values)
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for edge, child in node.children.items() if low <= edge <= high)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+class PaperHashIndex:
+    """
+    已处理试卷的整页指纹索引（进程内）。
+
+    首次使用时从数据库加载，之后由识别流程在提交后增量加入。
+    多进程部署时各进程各自加载，其他进程新增的试卷要到重启后才可见。
+    """
+
+    def __init__(self) -> None:
+        self._tree: BkTree[int] = BkTree()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self, db: Session) -> None:
+        if self._loaded:
+            return
+        rows = (
+            db.query(Paper.id, Paper.image_phash)
+            .filter(Paper.image_phash.isnot(None), Paper.status == "processed")
+            .all()
+        )
+        with self._lock:
+            if self._loaded:
+                return
+            for paper_id, phash in rows:
+                key = parse_phash(phash)
+                if key is not None:
+                    self._tree.add(key, paper_id)
+            self._loaded = True
+        logger.info("Paper hash index loaded: papers=%d", len(self._tree))
+
+    def add(self, paper_id: int, phash: Optional[str]) -> None:
+        key = parse_phash(phash)
+        if key is None:
+            return
+        with self._lock:
+            if self._loaded:
+                self._tree.add(key, paper_id)
+
+    def find(self, phash: Optional[str], max_distance: int) -> list[tuple[int, int]]:
+        """返回 (距离, paper_id)，距离升序；同距离时新试卷在前。"""
+        key = parse_phash(phash)
+        if key is None:
+            return []
+        with self._lock:
+            matches = self._tree.search(key, max_distance)
+        return sorted(matches, key=lambda pair: (pair[0], -pair[1]))
+
+
+_index = PaperHashIndex()
+
+
+def get_paper_hash_index() -> PaperHashIndex:
+    return _index
+
+
+def find_near_duplicate(db: Session, phash: Optional[str], max_distance: int) -> Optional[tuple[Paper, int]]:
+    """
+    查找与 phash 汉明距离不超过 max_distance 的已处理试卷，返回 (Paper, 距离)。
+    索引里的记录若已被删除或状态变化则跳过。
+    """
+    if not phash:
+        return None
+    index = get_paper_hash_index()
+    index.ensure_loaded(db)
+    for distance, paper_id in index.find(phash, max_distance):
+        paper = db.get(Paper, paper_id)
+        if paper is not None and paper.status == "processed" and paper.questions:
+            return paper, distance
+    return None
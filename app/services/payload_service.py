@@ -0,0 +1,138 @@
+"""
+JSON request bodies with embedded images, built without intermediate base64 strings.
+
+Payload dicts carry a `Base64Blob` where a base64 (or data URL) string belongs;
+`encode_json_payload` walks the payload once, serialises the small JSON skeleton
+and writes each blob's base64 straight into one pre-sized bytearray from a
+memoryview of the image. The same walk produces the sanitised log preview.
+"""
+
+from __future__ import annotations
+
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+
+# 3 的倍数，保证分块编码拼接后与整体编码一致（中间块不产生 '=' 填充）。
+_B64_CHUNK_BYTES = 3 * 64 * 1024
+_LOG_TEXT_MAX_CHARS = 900
+_LOG_PREVIEW_MAX_CHARS = 2800
+_SECRET_KEYS = {"authorization", "api_key", "apikey", "token"}
+
+
+class Base64Blob:
+    """JSON 字符串占位：序列化时把 data 以 base64 写出，可带 data URL 前缀。"""
+
+    __slots__ = ("data", "content_type", "prefix")
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview], *, content_type: Optional[str] = None):
+        self.data = memoryview(data).cast("B")
+        self.content_type = content_type
+        self.prefix = f"data:{content_type};base64," if content_type else ""
+
+    @property
+    def encoded_length(self) -> int:
+        return len(self.prefix) + 4 * ((len(self.data) + 2) // 3)
+
+    def log_text(self) -> str:
+        kind = self.content_type or "binary"
+        return f"[{kind} base64 {len(self.data)} bytes]"
+
+
+def data_url(data: Union[bytes, bytearray, memoryview], content_type: str) -> Base64Blob:
+    return Base64Blob(data, content_type=content_type)
+
+
+@dataclass
+class EncodedPayload:
+    body: bytearray
+    log_preview: str
+    blob_bytes: int = 0
+    blob_count: int = 0
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]} ...[truncated {len(text) - max_chars} chars]"
+
+
+def _split(value: Any, blobs: list[Base64Blob]) -> tuple[Any, Any]:
+    """返回 (请求骨架, 日志骨架)；blob 在请求骨架里替换为按序号的占位串。"""
+    if isinstance(value, Base64Blob):
+        marker = f"\x00blob{len(blobs)}\x00"
+        blobs.append(value)
+        return marker, value.log_text()
+    if isinstance(value, dict):
+        body: dict[str, Any] = {}
+        log: dict[str, Any] = {}
+        for key, item in value.items():
+            body[key], log[key] = _split(item, blobs)
+            if str(key).lower() in _SECRET_KEYS:
+                log[key] = "***"
+        return body, log
+    if isinstance(value, (list, tuple)):
+        pairs = [_split(item, blobs) for item in value]
+        return [body for body, _ in pairs], [log for _, log in pairs]
+    if isinstance(value, str):
+        return value, _truncate(value, _LOG_TEXT_MAX_CHARS)
+    return value, value
+
+
+def _write_base64(out: bytearray, offset: int, data: memoryview) -> int:
+    for start in range(0, len(data), _B64_CHUNK_BYTES):
+        chunk = binascii.b2a_base64(data[start:start + _B64_CHUNK_BYTES], newline=False)
+        out[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+    return offset
+
+
+def encode_json_payload(payload: Any) -> EncodedPayload:
+    """
+    Serialise `payload` (plain JSON values plus `Base64Blob`) to UTF-8 JSON bytes.
+    Output matches `json.dumps(...)` of the equivalent payload with base64 strings inlined.
+    """
+    blobs: list[Base64Blob] = []
+    skeleton, log_skeleton = _split(payload, blobs)
+    text = json.dumps(skeleton)
+    try:
+        log_preview = json.dumps(log_skeleton, ensure_ascii=False)
+    except (TypeError, ValueError):
+        log_preview = str(log_skeleton)
+    log_preview = _truncate(log_preview, _LOG_PREVIEW_MAX_CHARS)
+
+    if not blobs:
+        return EncodedPayload(body=bytearray(text.encode("utf-8")), log_preview=log_preview)
+
+    segments: list[bytes] = []
+    cursor = 0
+    for index in range(len(blobs)):
+        # 占位串在 JSON 中以转义后的带引号形式出现，且只出现一次。
+        token = json.dumps(f"\x00blob{index}\x00")
+        position = text.index(token, cursor)
+        segments.append(text[cursor:position].encode("utf-8"))
+        cursor = position + len(token)
+    segments.append(text[cursor:].encode("utf-8"))
+
+    total = sum(len(segment) for segment in segments) + sum(blob.encoded_length + 2 for blob in blobs)
+    out = bytearray(total)
+    offset = 0
+    for segment, blob in zip(segments, blobs):
+        out[offset:offset + len(segment)] = segment
+        offset += len(segment)
+        prefix = b'"' + blob.prefix.encode("ascii")
+        out[offset:offset + len(prefix)] = prefix
+        offset += len(prefix)
+        offset = _write_base64(out, offset, blob.data)
+        out[offset] = ord('"')
+        offset += 1
+    tail = segments[-1]
+    out[offset:offset + len(tail)] = tail
+
+    return EncodedPayload(
+        body=out,
+        log_preview=log_preview,
+        blob_bytes=sum(len(blob.data) for blob in blobs),
+        blob_count=len(blobs),
+    )
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import base64
+import asyncio
 import json
 import logging
 import re
@@ -8,8 +8,10 @@ from typing import Any, Optional
 
 from app.services.llm_client_service import (
     LlmClientError,
+    circuit_open,
     get_siliconflow_client,
 )
+from app.services.payload_service import data_url
 
 logger = logging.getLogger("uvicorn.error")
 
@@ -102,11 +104,7 @@ def _heuristic_rebuild(question_text: str, has_diagram: bool) -> dict[str, Any]:
     }
 
 
-def _call_llm_rebuild(question_text: str, diagram_image_bytes: Optional[bytes]) -> Optional[dict[str, Any]]:
-    client = get_siliconflow_client()
-    if not client or not client.default_model:
-        return None
-
+def _rebuild_payload(model: str, question_text: str, diagram_image_bytes: Optional[bytes]) -> dict[str, Any]:
     user_content: list[dict[str, Any]] = [
         {
             "type": "text",
@@ -114,19 +112,18 @@ def _call_llm_rebuild(question_text: str, diagram_image_bytes: Optional[bytes])
         }
     ]
     if diagram_image_bytes:
-        encoded = base64.b64encode(diagram_image_bytes).decode("utf-8")
         user_content.append(
             {
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/png;base64,{encoded}",
+                    "url": data_url(diagram_image_bytes, "image/png"),
                     "detail": "low",
                 },
             }
         )
 
-    payload = {
-        "model": client.default_model,
+    return {
+        "model": model,
         "messages": [
             {"role": "system", "content": _SYSTEM_PROMPT},
             {"role": "user", "content": user_content},
@@ -134,25 +131,62 @@ def _call_llm_rebuild(question_text: str, diagram_image_bytes: Optional[bytes])
         "temperature": 0.1,
     }
 
+
+def _rebuild_from_body(data: dict[str, Any]) -> Optional[dict[str, Any]]:
+    choices = data.get("choices") or []
+    if not choices:
+        return None
+    message = choices[0].get("message") or {}
+    content = message.get("content")
+    if isinstance(content, list):
+        text_chunks: list[str] = []
+        for chunk in content:
+            if isinstance(chunk, dict) and chunk.get("type") == "text":
+                text_chunks.append(str(chunk.get("text", "")))
+        return _parse_llm_json("\n".join(text_chunks))
+    return _parse_llm_json(str(content or ""))
+
+
+def _call_llm_rebuild(question_text: str, diagram_image_bytes: Optional[bytes]) -> Optional[dict[str, Any]]:
+    client = get_siliconflow_client()
+    if not client or not client.default_model:
+        return None
+    if circuit_open("siliconflow", client.default_model):
+        logger.info("Question rebuild LLM skipped: circuit open, using heuristic")
+        return None
+
+    payload = _rebuild_payload(client.default_model, question_text, diagram_image_bytes)
     try:
         data = client.base_client.chat_completions(
             payload,
             trace_id="rebuild_question_json",
         )
-        choices = data.get("choices") or []
-        if not choices:
-            return None
-        message = choices[0].get("message") or {}
-        content = message.get("content")
-        if isinstance(content, list):
-            text_chunks: list[str] = []
-            for chunk in content:
-                if isinstance(chunk, dict) and chunk.get("type") == "text":
-                    text_chunks.append(str(chunk.get("text", "")))
-            parsed = _parse_llm_json("\n".join(text_chunks))
-        else:
-            parsed = _parse_llm_json(str(content or ""))
-        return parsed
+        return _rebuild_from_body(data)
+    except (LlmClientError, ValueError, json.JSONDecodeError) as exc:
+        logger.warning("Question rebuild LLM call failed: %s", str(exc))
+        return None
+
+
+async def _call_llm_rebuild_async(
+    question_text: str,
+    diagram_image_bytes: Optional[bytes],
+) -> Optional[dict[str, Any]]:
+    client = get_siliconflow_client()
+    if not client or not client.default_model:
+        return None
+    if circuit_open("siliconflow", client.default_model):
+        logger.info("Question rebuild LLM skipped: circuit open, using heuristic")
+        return None
+    if client.async_client is None:
+        return await asyncio.to_thread(_call_llm_rebuild, question_text, diagram_image_bytes)
+
+    payload = _rebuild_payload(client.default_model, question_text, diagram_image_bytes)
+    try:
+        data = await client.async_client.chat_completions(
+            payload,
+            trace_id="rebuild_question_json",
+        )
+        return _rebuild_from_body(data)
     except (LlmClientError, ValueError, json.JSONDecodeError) as exc:
         logger.warning("Question rebuild LLM call failed: %s", str(exc))
         return None
@@ -167,3 +201,15 @@ def rebuild_question_json(
     if llm_result:
         return llm_result
     return _heuristic_rebuild(question_text, has_diagram=bool(diagram_image_bytes))
+
+
+async def rebuild_question_json_async(
+    question_text: str,
+    *,
+    diagram_image_bytes: Optional[bytes] = None,
+) -> dict[str, Any]:
+    """Async variant of `rebuild_question_json`."""
+    llm_result = await _call_llm_rebuild_async(question_text, diagram_image_bytes)
+    if llm_result:
+        return llm_result
+    return _heuristic_rebuild(question_text, has_diagram=bool(diagram_image_bytes))
@@ -0,0 +1,163 @@
+"""
+Streaming ingestion for image uploads.
+
+The upload is read in chunks; the first bytes decide the format (JPEG / PNG /
+HEIC by magic bytes) and Pillow's lazy `Image.open` reads only the header to get
+the pixel size. Uploads over the byte or pixel budget, or in another format, are
+rejected before anything is fully decoded.
+
+This bounds work, not memory: Starlette has already spooled the request body
+before the route runs, and an accepted upload is still joined into one `bytes`
+for the OCR pipeline.
+"""
+
+from __future__ import annotations
+
+import warnings
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional, Protocol
+
+from PIL import Image, UnidentifiedImageError
+
+from app.core.config import settings
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# 判断格式所需的最少字节（HEIC 的 ftyp box 在前 12 字节内）。
+UPLOAD_SNIFF_BYTES = 32
+# 边读边探测尺寸只在前几个分块内进行，避免反复拼接大缓冲；超出后读完再探测。
+UPLOAD_PROBE_MAX_BYTES = 2 * UPLOAD_CHUNK_BYTES
+
+# ISO BMFF `ftyp` 主品牌：HEIC/HEIF 静态图与图像序列。
+_HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"}
+
+_FORMAT_CONTENT_TYPES = {
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "heic": "image/heic",
+}
+
+
+class UploadRejectedError(ValueError):
+    """上传在解码前即被拒绝；status_code 为应返回的 HTTP 状态码（413/415）。"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+class _AsyncReadable(Protocol):
+    async def read(self, size: int = -1) -> bytes: ...
+
+
+@dataclass(frozen=True)
+class IngestedUpload:
+    data: bytes
+    image_format: str
+    content_type: str
+    # HEIC 在未安装解码插件时读不到头部尺寸，此时为 None。
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+
+def sniff_image_format(head: bytes) -> Optional[str]:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if len(head) >= 12 and head[4:8] == b"ftyp" and head[8:12] in _HEIF_BRANDS:
+        return "heic"
+    return None
+
+
+def probe_dimensions(data: bytes) -> Optional[tuple[int, int]]:
+    """只解析头部取尺寸；数据不完整（头部尚未读全）或格式不支持时返回 None。"""
+    try:
+        with warnings.catch_warnings():
+            # 像素预算由调用方自行判断，这里不让 Pillow 的炸弹检查抢先报错。
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(BytesIO(data)) as image:
+                return image.size
+    except (UnidentifiedImageError, SyntaxError, OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def _check_pixels(size: tuple[int, int], max_pixels: int) -> None:
+    width, height = size
+    if max_pixels > 0 and width * height > max_pixels:
+        raise UploadRejectedError(
+            413,
+            f"Image too large: {width}x{height} pixels exceeds the {max_pixels} pixel limit.",
+        )
+
+
+async def read_image_upload(
+    upload: _AsyncReadable,
+    *,
+    max_bytes: Optional[int] = None,
+    max_pixels: Optional[int] = None,
+    declared_size: Optional[int] = None,
+) -> IngestedUpload:
+    """
+    Read an upload chunk by chunk and enforce the byte/pixel budgets while reading,
+    so a bad upload is rejected after its first chunks. The accepted upload is
+    returned joined in memory. Raises UploadRejectedError (413 over budget, 415
+    unsupported format) and ValueError for an empty upload.
+    """
+    byte_limit = settings.upload_max_bytes if max_bytes is None else max_bytes
+    pixel_limit = settings.upload_max_pixels if max_pixels is None else max_pixels
+    if byte_limit > 0 and declared_size is not None and declared_size > byte_limit:
+        raise UploadRejectedError(
+            413,
+            f"Upload too large: {declared_size} bytes exceeds the {byte_limit} byte limit.",
+        )
+
+    chunks: list[bytes] = []
+    head = bytearray()
+    total = 0
+    image_format: Optional[str] = None
+    size: Optional[tuple[int, int]] = None
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        total += len(chunk)
+        if byte_limit > 0 and total > byte_limit:
+            raise UploadRejectedError(413, f"Upload too large: exceeds the {byte_limit} byte limit.")
+
+        if image_format is None:
+            head += chunk[:UPLOAD_SNIFF_BYTES - len(head)]
+            if len(head) >= UPLOAD_SNIFF_BYTES:
+                image_format = sniff_image_format(bytes(head))
+                if image_format is None:
+                    raise UploadRejectedError(415, "Unsupported image format; upload JPEG, PNG or HEIC.")
+        # 头部（含 JPEG 的 EXIF 段）通常在第一个分块内；读到尺寸即可检查像素预算。
+        if image_format in {"jpeg", "png"} and size is None and total <= UPLOAD_PROBE_MAX_BYTES:
+            size = probe_dimensions(b"".join(chunks) if len(chunks) > 1 else chunk)
+            if size is not None:
+                _check_pixels(size, pixel_limit)
+
+    if total == 0:
+        raise ValueError("Empty upload.")
+    data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+    chunks.clear()
+    if image_format is None:
+        image_format = sniff_image_format(data)
+        if image_format is None:
+            raise UploadRejectedError(415, "Unsupported image format; upload JPEG, PNG or HEIC.")
+    if size is None:
+        size = probe_dimensions(data)
+        if size is not None:
+            _check_pixels(size, pixel_limit)
+        elif image_format != "heic":
+            raise UploadRejectedError(415, "Unreadable image header.")
+
+    width, height = size if size is not None else (None, None)
+    return IngestedUpload(
+        data=data,
+        image_format=image_format,
+        content_type=_FORMAT_CONTENT_TYPES[image_format],
+        width=width,
+        height=height,
+    )
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import re
 from typing import Optional
@@ -38,17 +39,13 @@ def _parse_variants(text: str, count: int) -> list[str]:
     return lines[:count]
 
 
-def generate_variants(
+def _variant_payload(
+    model: str,
     source_text: str,
-    count: int = 3,
-    grade: Optional[str] = None,
-    subject: Optional[str] = None,
-) -> list[str]:
-    """Generate same-type variants via SiliconFlow."""
-    client = get_siliconflow_client()
-    if not client or not client.default_model:
-        raise RuntimeError("SILICONFLOW config missing. Please set SILICONFLOW_MODEL.")
-
+    count: int,
+    grade: Optional[str],
+    subject: Optional[str],
+) -> dict:
     user_prompt = f"Source question: {source_text}\n"
     if grade:
         user_prompt += f"Grade: {grade}\n"
@@ -56,22 +53,17 @@ def generate_variants(
         user_prompt += f"Subject: {subject}\n"
     user_prompt += f"Return {count} variants."
 
-    payload = {
-        "model": client.default_model,
+    return {
+        "model": model,
         "messages": [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt},
         ],
         "temperature": 0.7,
     }
-    try:
-        body = client.base_client.chat_completions(
-            payload,
-            trace_id="variant_generate",
-        )
-    except LlmClientError as exc:
-        raise RuntimeError(f"LLM request failed: {str(exc)}") from exc
 
+
+def _variants_from_body(body: dict, count: int) -> list[str]:
     content = (
         body.get("choices", [{}])[0]
         .get("message", {})
@@ -82,3 +74,49 @@ def generate_variants(
     if not variants and content.strip():
         return [content.strip()]
     return variants
+
+
+def generate_variants(
+    source_text: str,
+    count: int = 3,
+    grade: Optional[str] = None,
+    subject: Optional[str] = None,
+) -> list[str]:
+    """Generate same-type variants via SiliconFlow."""
+    client = get_siliconflow_client()
+    if not client or not client.default_model:
+        raise RuntimeError("SILICONFLOW config missing. Please set SILICONFLOW_MODEL.")
+
+    payload = _variant_payload(client.default_model, source_text, count, grade, subject)
+    try:
+        body = client.base_client.chat_completions(
+            payload,
+            trace_id="variant_generate",
+        )
+    except LlmClientError as exc:
+        raise RuntimeError(f"LLM request failed: {str(exc)}") from exc
+    return _variants_from_body(body, count)
+
+
+async def generate_variants_async(
+    source_text: str,
+    count: int = 3,
+    grade: Optional[str] = None,
+    subject: Optional[str] = None,
+) -> list[str]:
+    """Async variant of `generate_variants`."""
+    client = get_siliconflow_client()
+    if not client or not client.default_model:
+        raise RuntimeError("SILICONFLOW config missing. Please set SILICONFLOW_MODEL.")
+    if client.async_client is None:
+        return await asyncio.to_thread(generate_variants, source_text, count, grade, subject)
+
+    payload = _variant_payload(client.default_model, source_text, count, grade, subject)
+    try:
+        body = await client.async_client.chat_completions(
+            payload,
+            trace_id="variant_generate",
+        )
+    except LlmClientError as exc:
+        raise RuntimeError(f"LLM request failed: {str(exc)}") from exc
+    return _variants_from_body(body, count)
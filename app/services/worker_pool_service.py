@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Awaitable, Callable, Iterable, Optional, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_executor_lock = threading.Lock()
+_io_executor: Optional[ThreadPoolExecutor] = None
+_cpu_executor: Optional[ProcessPoolExecutor] = None
+_question_gates: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """阻塞 I/O（LLM HTTP、文件读写、数据库提交）专用线程池，大小见 IO_THREAD_POOL_SIZE。"""
+    global _io_executor
+    if _io_executor is None:
+        with _executor_lock:
+            if _io_executor is None:
+                _io_executor = ThreadPoolExecutor(
+                    max_workers=max(1, settings.io_thread_pool_size),
+                    thread_name_prefix="blocking-io",
+                )
+    return _io_executor
+
+
+def get_cpu_executor() -> Optional[ProcessPoolExecutor]:
+    """
+    CPU 密集的图像处理（预处理/去噪、插图清理）进程池，大小见 CPU_PROCESS_POOL_SIZE。
+    配置为 0 时返回 None，调用方退回到 I/O 线程池执行。
+    """
+    global _cpu_executor
+    if settings.cpu_process_pool_size <= 0:
+        return None
+    if _cpu_executor is None:
+        with _executor_lock:
+            if _cpu_executor is None:
+                # spawn 避免在已有线程的服务进程里 fork 出持锁的子进程。
+                _cpu_executor = ProcessPoolExecutor(
+                    max_workers=settings.cpu_process_pool_size,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_cpu_worker,
+                )
+    return _cpu_executor
+
+
+def _init_cpu_worker() -> None:
+    # 子进程启动时预先导入 cv2/numpy 与图像模块，首个任务不再承担导入开销。
+    from app.services import image_service
+
+    if image_service.cv2 is not None:
+        # 并行度由进程数提供，避免每个进程再开满 OpenCV 线程造成超订。
+        image_service.cv2.setNumThreads(1)
+
+
+def _noop() -> None:
+    return None
+
+
+def warm_cpu_executor() -> None:
+    """服务启动时拉起全部图像工作进程，避免首个请求承担 spawn 与导入耗时。"""
+    executor = get_cpu_executor()
+    if executor is None:
+        return
+    futures = [executor.submit(_noop) for _ in range(settings.cpu_process_pool_size)]
+    for future in futures:
+        future.result()
+
+
+def discard_cpu_executor(broken: ProcessPoolExecutor) -> None:
+    global _cpu_executor
+    with _executor_lock:
+        if _cpu_executor is broken:
+            _cpu_executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_io(fn: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """在 I/O 线程池中执行阻塞调用，不占用事件循环。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), partial(fn, *args, **kwargs))
+
+
+async def run_cpu(fn: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """
+    在进程池中执行 CPU 密集调用；fn 与参数须可 pickle。
+    进程池不可用或子进程崩溃时，降级到 I/O 线程池里执行。
+    """
+    executor = get_cpu_executor()
+    if executor is None:
+        return await run_io(fn, *args, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        logger.warning(
+            "CPU process pool broken, rerunning %s in thread pool",
+            getattr(fn, "__name__", fn),
+        )
+        discard_cpu_executor(executor)
+        return await run_io(fn, *args, **kwargs)
+
+
+def _global_question_gate() -> asyncio.Semaphore:
+    """
+    进程级的题目并发上限（OCR_QUESTION_GLOBAL_MAX_WORKERS），按事件循环各建一个。
+    多个请求同时到达时共享这把信号量，不会叠加出无上限的 LLM 往返。
+    """
+    loop = asyncio.get_running_loop()
+    gate = _question_gates.get(loop)
+    if gate is None:
+        gate = asyncio.Semaphore(max(1, settings.ocr_question_global_max_workers))
+        _question_gates[loop] = gate
+    return gate
+
+
+async def gather_bounded(
+    fn: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    *,
+    max_parallel: int,
+) -> list[R]:
+    """
+    并发执行协程 fn(item)：单次调用最多 max_parallel 个，且受进程级上限约束，
+    结果按输入顺序返回。任一任务抛错或调用方被取消时，取消其余任务并向上抛出。
+    """
+    values = list(items)
+    if not values:
+        return []
+
+    local_gate = asyncio.Semaphore(max(1, max_parallel))
+    global_gate = _global_question_gate()
+
+    async def _run(value: T) -> R:
+        async with local_gate:
+            async with global_gate:
+                return await fn(value)
+
+    tasks = [asyncio.ensure_future(_run(value)) for value in values]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # 等被取消的任务真正退出，避免它们在请求结束后仍持有连接或共享内存。
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def shutdown_executors(wait: bool = False) -> None:
+    global _io_executor, _cpu_executor
+    with _executor_lock:
+        executors = [_io_executor, _cpu_executor]
+        _io_executor = _cpu_executor = None
+    for executor in executors:
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
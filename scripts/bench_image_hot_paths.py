@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""image_service 热点路径基准：插图连通块聚类的扩展性，以及前景投影的向量化加速比。
+
+聚类：组件按恒定密度随机撒点（类似大照片上的噪点笔画），报告每个规模的耗时，
+以及相对上一规模的耗时倍数与数量倍数；全对比较的聚类耗时随数量平方增长。
+前景投影：同一张模拟试卷裁剪图上，逐像素实现与 numpy 实现各取多次运行的中位数。
+
+    python scripts/bench_image_hot_paths.py --counts 100,1000,5000,20000 --crops 900x600,2000x1400
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from app.services import image_service  # noqa: E402
+
+
+def random_components(count, seed=7):
+    rng = random.Random(seed)
+    side = int((count * 900) ** 0.5)
+    components = []
+    for _ in range(count):
+        w = rng.randint(2, 14)
+        h = rng.randint(2, 14)
+        x = rng.randint(0, side)
+        y = rng.randint(0, side)
+        components.append({"min_x": x, "max_x": x + w, "min_y": y, "max_y": y + h})
+    return components
+
+
+def worksheet_crop(width, height):
+    image = Image.new("RGB", (width, height), color="white")
+    draw = ImageDraw.Draw(image)
+    for row in range(3):
+        y = 30 + row * 24
+        draw.line((40, y, width // 2, y), fill=(30, 30, 30), width=2)
+    draw.rectangle((220, 200, width - 240, height - 60), fill=(90, 90, 90), outline=(0, 0, 0), width=4)
+    return image
+
+
+def _median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def bench_cluster(counts, repeat):
+    print(f"{'components':>10} {'ms':>9} {'x time':>7} {'x count':>8}")
+    previous = None
+    for count in counts:
+        components = random_components(count)
+        elapsed = _median_ms(lambda: image_service._cluster_diagram_components(components, 10, 8), repeat)
+        if previous is None:
+            print(f"{count:>10} {elapsed:>9.1f} {'-':>7} {'-':>8}")
+        else:
+            print(f"{count:>10} {elapsed:>9.1f} {elapsed / max(previous[1], 1e-3):>7.1f} {count / previous[0]:>8.1f}")
+        previous = (count, elapsed)
+
+
+def bench_foreground_profiles(sizes, repeat):
+    print(f"{'crop':>10} {'basic ms':>9} {'numpy ms':>9} {'speedup':>8}")
+    for width, height in sizes:
+        gray = worksheet_crop(width, height).convert("L")
+        basic = _median_ms(lambda: image_service._foreground_profiles_basic(gray), repeat)
+        fast = _median_ms(lambda: image_service._foreground_profiles(gray), repeat)
+        print(f"{width}x{height:<5} {basic:>9.2f} {fast:>9.2f} {basic / max(fast, 1e-3):>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--counts", default="100,1000,5000,20000", help="逗号分隔的组件数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个规模重复次数，取中位数")
+    parser.add_argument("--crops", default="900x600,2000x1400", help="逗号分隔的前景投影裁剪尺寸 WxH")
+    args = parser.parse_args()
+    repeat = max(1, args.repeat)
+    bench_cluster([int(value) for value in args.counts.split(",")], repeat)
+    print()
+    crops = [tuple(int(part) for part in item.lower().split("x")) for item in args.crops.split(",")]
+    bench_foreground_profiles(crops, repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""对比 LLM 请求体构造的峰值内存：旧的 b64encode→str→f-string→json.dumps→encode 与 encode_json_payload。
+
+每种方式在独立子进程里运行，分别报告 tracemalloc 峰值与进程峰值 RSS（相对构造前的增量）。
+
+    python scripts/bench_payload_memory.py --size-mb 6
+"""
+
+import argparse
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.payload_service import data_url, encode_json_payload
+
+
+def _payload(image_url):
+    return {
+        "model": "bench-model",
+        "messages": [
+            {"role": "system", "content": "Extract questions as JSON."},
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image_url", "image_url": {"url": image_url, "detail": "high"}},
+                    {"type": "text", "text": "Return the question list."},
+                ],
+            },
+        ],
+        "temperature": 0.2,
+    }
+
+
+def build_legacy(image_bytes):
+    encoded = base64.b64encode(image_bytes).decode("utf-8")
+    url = f"data:image/jpeg;base64,{encoded}"
+    return json.dumps(_payload(url)).encode("utf-8")
+
+
+def build_blob(image_bytes):
+    return encode_json_payload(_payload(data_url(image_bytes, "image/jpeg"))).body
+
+
+METHODS = {"legacy": build_legacy, "blob": build_blob}
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_one(method, size_bytes):
+    image_bytes = os.urandom(size_bytes)
+    rss_before = _peak_rss_bytes()
+    tracemalloc.start()
+    started = time.perf_counter()
+    body = METHODS[method](image_bytes)
+    elapsed = time.perf_counter() - started
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_delta = _peak_rss_bytes() - rss_before
+    print(json.dumps({
+        "method": method,
+        "body_bytes": len(body),
+        "traced_peak_bytes": traced_peak,
+        "rss_peak_delta_bytes": rss_delta,
+        "elapsed_ms": round(elapsed * 1000, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=6.0, help="模拟图片大小（MB）")
+    parser.add_argument("--method", choices=sorted(METHODS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    size_bytes = int(args.size_mb * 1024 * 1024)
+
+    if args.method:
+        run_one(args.method, size_bytes)
+        return
+
+    mb = 1024 * 1024
+    print(f"图片 {size_bytes / mb:.1f} MB")
+    print(f"{'method':<8} {'body MB':>9} {'traced peak MB':>15} {'x image':>8} {'RSS delta MB':>13} {'ms':>8}")
+    for method in ("legacy", "blob"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--method", method, "--size-mb", str(args.size_mb)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        row = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{method:<8} {row['body_bytes'] / mb:>9.1f} {row['traced_peak_bytes'] / mb:>15.1f} "
+            f"{row['traced_peak_bytes'] / size_bytes:>8.2f} {row['rss_peak_delta_bytes'] / mb:>13.1f} "
+            f"{row['elapsed_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""OCR 预处理档位基准：每个 profile 的 ms/MP，以及摆正角度的稳定性。
+
+在合成的试卷页（文字行 + 图形框 + 高斯噪声）上按已知角度旋转，分别用
+quality / balanced / fast / auto 预处理，报告：
+  - ms/MP：_opencv_preprocess_for_ocr 每百万像素耗时
+  - deskew err：估计的摆正角度与真实角度之差（最大值）
+  - residual：对输出页再估一次倾角的绝对值（越接近 0 越稳定，体现降噪后版面是否仍可靠）
+
+    python scripts/bench_preprocess_profiles.py --sizes 2000x1500,4032x3024 --angles -3,0,2
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from app.services import image_service  # noqa: E402
+
+PROFILES = image_service.PREPROCESS_PROFILES + (image_service.PREPROCESS_PROFILE_AUTO,)
+
+
+def build_page(width, height, seed=0):
+    rng = random.Random(seed)
+    page = Image.new("L", (width, height), 236)
+    draw = ImageDraw.Draw(page)
+    line_height = max(18, height // 60)
+    margin = width // 12
+    for top in range(margin, height - margin, line_height * 2):
+        # 文字行用短横条模拟，长度随机
+        left = margin
+        while left < width - margin:
+            word = rng.randint(line_height, line_height * 4)
+            draw.rectangle((left, top, min(width - margin, left + word), top + line_height // 2), fill=35)
+            left += word + line_height // 2
+    for _ in range(4):
+        x0, y0 = rng.randint(margin, width // 2), rng.randint(margin, height // 2)
+        draw.rectangle((x0, y0, x0 + width // 5, y0 + height // 6), outline=20, width=3)
+    return np.asarray(page)
+
+
+def skewed_rgb(gray, angle, noise_sigma, seed):
+    rotated = image_service._rotate_with_white_background(gray, angle)
+    noise = np.random.default_rng(seed).normal(0.0, noise_sigma, rotated.shape)
+    noisy = np.clip(rotated.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+    # 模拟不均匀光照：从左上到右下逐渐变暗
+    height, width = noisy.shape
+    shade = np.linspace(1.0, 0.82, width, dtype=np.float32)[None, :] * np.linspace(1.0, 0.9, height, dtype=np.float32)[:, None]
+    shaded = np.clip(noisy * shade, 0, 255).astype(np.uint8)
+    return Image.fromarray(cv2.cvtColor(shaded, cv2.COLOR_GRAY2RGB))
+
+
+def run(sizes, angles, noise_sigma):
+    print(f"noise sigma={noise_sigma} angles={angles}")
+    print(f"{'size':>10} {'profile':>9} {'picked':>9} {'ms/MP':>8} {'deskew err':>11} {'residual':>9}")
+    for width, height in sizes:
+        gray = build_page(width, height)
+        megapixels = width * height / 1_000_000.0
+        pages = [(angle, skewed_rgb(gray, angle, noise_sigma, seed)) for seed, angle in enumerate(angles)]
+        for profile in PROFILES:
+            timings, errors, residuals, picked = [], [], [], set()
+            for angle, page in pages:
+                started = time.perf_counter()
+                output, details = image_service._opencv_preprocess_for_ocr(page, profile)
+                timings.append(time.perf_counter() - started)
+                picked.add(details["profile"])
+                # 页面按 +angle 旋转，摆正时应估出 -angle
+                errors.append(abs(details["deskew_angle"] + angle))
+                residuals.append(abs(image_service._estimate_skew_angle(output)))
+            ms_per_mp = statistics.median(timings) * 1000 / megapixels
+            print(
+                f"{width}x{height:<5} {profile:>9} {'/'.join(sorted(picked)):>9} {ms_per_mp:>8.1f} "
+                f"{max(errors):>11.3f} {statistics.mean(residuals):>9.3f}"
+            )
+
+
+def _parse_sizes(value):
+    sizes = []
+    for item in value.split(","):
+        width, height = item.lower().split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="2000x1500,4032x3024", help="逗号分隔的 WxH")
+    parser.add_argument("--angles", default="-3,0,2", help="逗号分隔的旋转角度（度）")
+    parser.add_argument("--noise", type=float, default=6.0, help="高斯噪声标准差")
+    args = parser.parse_args()
+    run(_parse_sizes(args.sizes), [float(value) for value in args.angles.split(",")], args.noise)
+
+
+if __name__ == "__main__":
+    main()
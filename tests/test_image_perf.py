@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Parity checks for hot image-service paths (diagram clustering / cropping).
+
+Timings live in scripts/bench_image_hot_paths.py.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services import image_service  # noqa: E402
+
+
+def _random_components(count: int, seed: int = 7) -> list[dict]:
+    """Scatter small strokes at a constant density, like noise on a bigger photo."""
+    rng = random.Random(seed)
+    side = int((count * 900) ** 0.5)
+    components = []
+    for _ in range(count):
+        w = rng.randint(2, 14)
+        h = rng.randint(2, 14)
+        x = rng.randint(0, side)
+        y = rng.randint(0, side)
+        components.append({"min_x": x, "max_x": x + w, "min_y": y, "max_y": y + h})
+    return components
+
+
+def _cluster_brute_force(components: list[dict], pad_x: int, pad_y: int) -> list[list[int]]:
+    n = len(components)
+    visited = [False] * n
+    clusters = []
+    for i in range(n):
+        if visited[i]:
+            continue
+        visited[i] = True
+        queue = [i]
+        indices = []
+        while queue:
+            cur = queue.pop()
+            indices.append(cur)
+            a = components[cur]
+            for j in range(n):
+                if visited[j]:
+                    continue
+                b = components[j]
+                if not (
+                    a["max_x"] + pad_x < b["min_x"]
+                    or b["max_x"] + pad_x < a["min_x"]
+                    or a["max_y"] + pad_y < b["min_y"]
+                    or b["max_y"] + pad_y < a["min_y"]
+                ):
+                    visited[j] = True
+                    queue.append(j)
+        clusters.append(sorted(indices))
+    return clusters
+
+
+def _build_worksheet_crop(width: int = 900, height: int = 600) -> Image.Image:
+    image = Image.new("RGB", (width, height), color="white")
+    draw = ImageDraw.Draw(image)
+    for row in range(3):
+        y = 30 + row * 24
+        draw.line((40, y, width // 2, y), fill=(30, 30, 30), width=2)
+    draw.rectangle((220, 200, width - 240, height - 60), fill=(90, 90, 90), outline=(0, 0, 0), width=4)
+    return image
+
+
+def test_cluster_matches_pairwise_rule() -> None:
+    components = _random_components(400, seed=11)
+    expected = _cluster_brute_force(components, 10, 8)
+    actual = [sorted(indices) for indices in image_service._cluster_diagram_components(components, 10, 8)]
+    assert actual == expected
+
+
+def test_foreground_profiles_parity() -> None:
+    gray = _build_worksheet_crop().convert("L")
+    basic_rows, basic_cols = image_service._foreground_profiles_basic(gray)
+    rows, cols = image_service._foreground_profiles(gray)
+
+    assert list(rows) == basic_rows
+    assert list(cols) == basic_cols
+    for gap, prefer_top in ((3, True), (4, False)):
+        assert image_service._find_foreground_segment(rows, gap=gap, prefer_top=prefer_top) == (
+            image_service._find_foreground_segment(basic_rows, gap=gap, prefer_top=prefer_top)
+        )
+
+
+def test_tighten_to_foreground_matches_fallback() -> None:
+    image = _build_worksheet_crop()
+    fast = image_service._tighten_to_foreground(image, prefer_top=False, trim_bottom_on_tall=False)
+    np_module = image_service.np
+    image_service.np = None
+    try:
+        basic = image_service._tighten_to_foreground(image, prefer_top=False, trim_bottom_on_tall=False)
+    finally:
+        image_service.np = np_module
+    assert fast.size == basic.size
+    assert fast.size != image.size
+
+
+def main() -> int:
+    tests = [
+        ("cluster_matches_pairwise_rule", test_cluster_matches_pairwise_rule),
+        ("foreground_profiles_parity", test_foreground_profiles_parity),
+        ("tighten_to_foreground_matches_fallback", test_tighten_to_foreground_matches_fallback),
+    ]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"[PASS] {name}")
+        except Exception as exc:  # pragma: no cover
+            failed += 1
+            print(f"[FAIL] {name}: {exc}")
+    if failed:
+        print(f"Failed: {failed}/{len(tests)}")
+        return 1
+    print(f"Passed: {len(tests)}/{len(tests)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
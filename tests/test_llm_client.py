@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""LLM client transport checks against a local OpenAI-compatible stub server."""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import dataclasses
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services import llm_client_service, llm_health_service, llm_telemetry_service  # noqa: E402
+from app.services.llm_client_service import (  # noqa: E402
+    AsyncBaseLlmClient,
+    BaseLlmClient,
+    LlmCircuitOpenError,
+    LlmHttpError,
+    LlmNetworkError,
+)
+from app.services.llm_health_service import (  # noqa: E402
+    OUTCOME_FAILURE,
+    OUTCOME_NEUTRAL,
+    OUTCOME_OK,
+    AdaptiveConcurrencyLimiter,
+)
+from app.services.payload_service import Base64Blob, data_url, encode_json_payload  # noqa: E402
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server naming
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.peers.append(self.client_address)  # type: ignore[attr-defined]
+        self.server.received.set()  # type: ignore[attr-defined]
+        time.sleep(float(payload.get("sleep") or 0))
+        status = int(payload.get("status") or 200)
+        body = json.dumps({"choices": [{"message": {"content": "ok"}}], "echo": payload}).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已取消并断开（取消测试）。
+            self.close_connection = True
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        return
+
+
+@contextmanager
+def _stub_server() -> Iterator[ThreadingHTTPServer]:
+    # 桩服务的调用不写进 storage/ 下的真实遥测文件；需要遥测的测试自行安装临时 sink。
+    llm_telemetry_service.set_telemetry_sink(None)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.peers = []  # type: ignore[attr-defined]
+    server.received = threading.Event()  # type: ignore[attr-defined]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_connections_are_reused() -> None:
+    with _stub_server() as server:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        client = BaseLlmClient(provider="stub", base_url=base_url, api_key="sk-test", pool_size=2)
+        try:
+            for index in range(5):
+                body = client.chat_completions({"model": "m", "index": index}, trace_id=f"t{index}")
+                assert body["echo"]["index"] == index
+        finally:
+            client.close()
+
+    assert client.transport is not None
+    assert client.transport.connections_created == 1
+    assert len(server.peers) == 5  # type: ignore[attr-defined]
+    assert len(set(server.peers)) == 1  # type: ignore[attr-defined]
+
+
+def test_http_error_keeps_connection() -> None:
+    with _stub_server() as server:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        client = BaseLlmClient(provider="stub", base_url=base_url, api_key="sk-test")
+        try:
+            try:
+                client.chat_completions({"status": 429}, trace_id="err")
+            except LlmHttpError as exc:
+                assert exc.status_code == 429
+            else:  # pragma: no cover
+                raise AssertionError("expected LlmHttpError")
+            client.chat_completions({"model": "m"}, trace_id="ok")
+        finally:
+            client.close()
+    assert client.transport is not None
+    assert client.transport.connections_created == 1
+
+
+def test_async_client_reuses_connections() -> None:
+    async def scenario(client: AsyncBaseLlmClient) -> list[dict]:
+        first = await client.chat_completions({"model": "m", "index": 0}, trace_id="a0")
+        rest = await asyncio.gather(
+            *(client.chat_completions({"model": "m", "index": index}, trace_id=f"a{index}") for index in range(1, 7))
+        )
+        return [first, *rest]
+
+    with _stub_server() as server:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        client = AsyncBaseLlmClient(
+            provider="stub",
+            base_url=base_url,
+            api_key="sk-test",
+            pool_size=4,
+            max_concurrency=2,
+        )
+        try:
+            bodies = asyncio.run(scenario(client))
+        finally:
+            client.close()
+
+    assert [body["echo"]["index"] for body in bodies] == list(range(7))
+    assert client.transport is not None
+    # 并发上限为 2，因此最多只需要建立两条连接。
+    assert client.transport.connections_created <= 2
+    assert len(set(server.peers)) == client.transport.connections_created  # type: ignore[attr-defined]
+
+
+def test_async_cancel_discards_connection() -> None:
+    async def scenario(client: AsyncBaseLlmClient, received: threading.Event) -> None:
+        slow = asyncio.ensure_future(client.chat_completions({"sleep": 0.5}, trace_id="slow"))
+        # 等服务端确实收到请求再取消，确保取消发生在连接占用期间，而不是建连之前。
+        assert await asyncio.to_thread(received.wait, 5)
+        slow.cancel()
+        try:
+            await slow
+        except asyncio.CancelledError:
+            pass
+        else:  # pragma: no cover
+            raise AssertionError("expected cancellation")
+        # 被取消的连接不会回到池里，下一次调用新建连接（见末尾的 connections_created）。
+        body = await client.chat_completions({"model": "m"}, trace_id="after")
+        assert body["echo"]["model"] == "m"
+
+    with _stub_server() as server:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        client = AsyncBaseLlmClient(provider="stub", base_url=base_url, api_key="sk-test")
+        try:
+            asyncio.run(scenario(client, server.received))  # type: ignore[attr-defined]
+        finally:
+            client.close()
+    assert client.transport is not None
+    assert client.transport.connections_created == 2
+
+
+def test_async_transport_close_releases_client() -> None:
+    with _stub_server() as server:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+        # 所属循环已停止（未关闭）：close() 在当前线程同步关闭
+        client = AsyncBaseLlmClient(provider="stub", base_url=base_url, api_key="sk-test")
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(client.chat_completions({"model": "m"}, trace_id="stopped"))
+            inner = client.transport._client
+            client.close()
+            assert inner is not None and inner.is_closed and client.transport._client is None
+        finally:
+            loop.close()
+
+        # 所属循环在另一线程运行：close() 等待其在该循环上关闭完成
+        client = AsyncBaseLlmClient(provider="stub", base_url=base_url, api_key="sk-test")
+        loop = asyncio.new_event_loop()
+        runner = threading.Thread(target=loop.run_forever, daemon=True)
+        runner.start()
+        try:
+            call = client.chat_completions({"model": "m"}, trace_id="threaded")
+            asyncio.run_coroutine_threadsafe(call, loop).result(5)
+            inner = client.transport._client
+            client.close()
+            assert inner is not None and inner.is_closed
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            runner.join(5)
+            loop.close()
+
+        # 循环内：aclose() 直接关闭
+        async def scenario(client: AsyncBaseLlmClient) -> None:
+            await client.chat_completions({"model": "m"}, trace_id="inside")
+            inner = client.transport._client
+            await client.aclose()
+            assert inner is not None and inner.is_closed
+
+        asyncio.run(scenario(AsyncBaseLlmClient(provider="stub", base_url=base_url, api_key="sk-test")))
+
+
+def test_async_timeout_is_one_deadline() -> None:
+    async def scenario(client: AsyncBaseLlmClient) -> float:
+        started = time.monotonic()
+        try:
+            await client.chat_completions({"model": "m-deadline", "sleep": 3.0}, trace_id="deadline", timeout=1.0)
+        except LlmNetworkError:
+            return time.monotonic() - started
+        raise AssertionError("expected LlmNetworkError")  # pragma: no cover
+
+    with _stub_server() as server:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        client = AsyncBaseLlmClient(provider="stub-deadline", base_url=base_url, api_key="sk-test")
+        try:
+            elapsed = asyncio.run(scenario(client))
+        finally:
+            client.close()
+            llm_health_service.reset_provider_health()
+    # 建连、发送与读取共用一个 deadline，而不是各自等满 timeout。
+    assert 0.9 <= elapsed < 1.8, elapsed
+
+
+def test_circuit_opens_and_probes() -> None:
+    threshold = llm_health_service.settings.llm_circuit_failure_threshold
+    with _stub_server() as server:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        client = BaseLlmClient(provider="stub-breaker", base_url=base_url, api_key="sk-test")
+        try:
+            # 4xx（非 429）不代表上游故障，不会打开熔断
+            for _ in range(threshold + 1):
+                try:
+                    client.chat_completions({"model": "m", "status": 400}, trace_id="bad")
+                except LlmHttpError:
+                    pass
+            assert not llm_client_service.circuit_open("stub-breaker", "m")
+
+            for _ in range(threshold):
+                try:
+                    client.chat_completions({"model": "m", "status": 503}, trace_id="down")
+                except LlmHttpError:
+                    pass
+            assert llm_client_service.circuit_open("stub-breaker", "m")
+            calls_before = len(server.peers)  # type: ignore[attr-defined]
+            try:
+                client.chat_completions({"model": "m"}, trace_id="rejected")
+            except LlmCircuitOpenError:
+                pass
+            else:  # pragma: no cover
+                raise AssertionError("expected LlmCircuitOpenError")
+            assert len(server.peers) == calls_before  # type: ignore[attr-defined]
+            # 其它模型不受影响
+            assert client.chat_completions({"model": "other"}, trace_id="other")["echo"]["model"] == "other"
+
+            health = llm_health_service.get_provider_health("stub-breaker", "m")
+            health.opened_at -= llm_health_service.settings.llm_circuit_open_seconds + 1
+            assert client.chat_completions({"model": "m"}, trace_id="probe")["echo"]["model"] == "m"
+            assert not llm_client_service.circuit_open("stub-breaker", "m")
+
+            snapshot = {
+                (entry["provider"], entry["model"]): entry for entry in llm_client_service.llm_health_snapshot()
+            }
+            entry = snapshot[("stub-breaker", "m")]
+            assert entry["state"] == "closed"
+            assert entry["open_count"] == 1 and entry["rejected_count"] == 1
+            assert entry["latency_p50_ms"] is not None
+        finally:
+            client.close()
+            llm_health_service.reset_provider_health()
+
+
+def test_aimd_limiter() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial=8, maximum=8)
+    assert limiter.acquire(0)
+    limiter.release(OUTCOME_FAILURE)
+    assert int(limiter.limit) == 4
+    limiter.release(OUTCOME_FAILURE)
+    limiter.release(OUTCOME_FAILURE)
+    limiter.release(OUTCOME_FAILURE)
+    assert limiter.limit == 1.0
+    limiter.release(OUTCOME_NEUTRAL)
+    assert limiter.limit == 1.0
+
+    assert limiter.acquire(0)
+    assert not limiter.acquire(0.05)  # limit 1, one in flight
+
+    async def waiter() -> bool:
+        return await limiter.acquire_async(2.0)
+
+    async def scenario() -> bool:
+        pending = asyncio.ensure_future(waiter())
+        await asyncio.sleep(0.05)
+        assert not pending.done()
+        # 另一线程归还名额也能唤醒协程
+        threading.Thread(target=limiter.release, args=(OUTCOME_OK,)).start()
+        return await pending
+
+    assert asyncio.run(scenario())
+    assert limiter.limit == 2.0
+    limiter.release(OUTCOME_OK)
+    for _ in range(50):
+        assert limiter.acquire(0)
+        limiter.release(OUTCOME_OK)
+    assert limiter.limit == 8.0
+
+
+def test_payload_blobs_encode_like_json_dumps() -> None:
+    image = bytes(range(256)) * 1500 + b"\x01\x02"  # 非 3 的倍数，跨多个编码分块
+    encoded_image = base64.b64encode(image).decode("ascii")
+
+    def build(blob_for) -> dict:
+        return {
+            "model": "m",
+            "messages": [
+                {"role": "system", "content": "题目 \"quoted\" \u2028"},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image_url", "image_url": {"url": blob_for("image/png"), "detail": "low"}},
+                        {"type": "text", "text": "x"},
+                    ],
+                },
+            ],
+            "raw": blob_for(None),
+            "temperature": 0.2,
+        }
+
+    encoded = encode_json_payload(build(lambda kind: Base64Blob(image, content_type=kind)))
+    expected = build(lambda kind: f"data:{kind};base64,{encoded_image}" if kind else encoded_image)
+    assert bytes(encoded.body) == json.dumps(expected).encode("utf-8")
+    assert (encoded.blob_count, encoded.blob_bytes) == (2, 2 * len(image))
+    assert encoded_image[:64] not in encoded.log_preview
+    assert "image/png base64" in encoded.log_preview
+
+    plain = encode_json_payload({"model": "m", "api_key": "sk-secret"})
+    assert bytes(plain.body) == json.dumps({"model": "m", "api_key": "sk-secret"}).encode("utf-8")
+    assert "sk-secret" not in plain.log_preview
+
+    async def send_async(client: AsyncBaseLlmClient) -> dict:
+        return await client.chat_completions({"model": "m", "image": data_url(image, "image/jpeg")}, trace_id="b64")
+
+    with _stub_server() as server:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        sync_client = BaseLlmClient(provider="stub", base_url=base_url, api_key="sk-test")
+        async_client = AsyncBaseLlmClient(provider="stub", base_url=base_url, api_key="sk-test")
+        try:
+            body = sync_client.chat_completions({"model": "m", "image": data_url(image, "image/jpeg")}, trace_id="b64")
+            async_body = asyncio.run(send_async(async_client))
+        finally:
+            sync_client.close()
+            async_client.close()
+    assert body["echo"]["image"] == f"data:image/jpeg;base64,{encoded_image}"
+    assert async_body["echo"] == body["echo"]
+
+
+def test_telemetry_records_calls() -> None:
+    original_settings = llm_telemetry_service.settings
+
+    async def send_async(client: AsyncBaseLlmClient) -> None:
+        with llm_telemetry_service.call_attempt(3):
+            await client.chat_completions({"model": "m-async"}, trace_id="tel-async")
+
+    with tempfile.TemporaryDirectory() as tmp, _stub_server() as server:
+        path = Path(tmp) / "llm.jsonl"
+        sink = llm_telemetry_service.JsonlTelemetrySink(str(path))
+        llm_telemetry_service.set_telemetry_sink(sink)
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        sync_client = BaseLlmClient(provider="stub", base_url=base_url, api_key="sk-test")
+        async_client = AsyncBaseLlmClient(provider="stub", base_url=base_url, api_key="sk-test")
+        try:
+            llm_telemetry_service.settings = dataclasses.replace(original_settings, llm_telemetry_body_sample_rate=1.0)
+            sync_client.chat_completions({"model": "m", "image": data_url(b"img", "image/png")}, trace_id="tel-ok")
+            llm_telemetry_service.settings = dataclasses.replace(original_settings, llm_telemetry_body_sample_rate=0.0)
+            try:
+                sync_client.chat_completions({"model": "m", "status": 503}, trace_id="tel-err")
+            except LlmHttpError:
+                pass
+            asyncio.run(send_async(async_client))
+            assert sink.flush(5)
+        finally:
+            llm_telemetry_service.settings = original_settings
+            llm_telemetry_service.set_telemetry_sink(None)
+            sync_client.close()
+            async_client.close()
+        records = {record["trace_id"]: record for record in map(json.loads, path.read_text("utf-8").splitlines())}
+
+    ok, failed, async_record = records["tel-ok"], records["tel-err"], records["tel-async"]
+    assert (ok["provider"], ok["model"], ok["status"], ok["attempt"], ok["images"]) == ("stub", "m", 200, 1, 1)
+    assert ok["bytes_out"] > 0 and ok["bytes_in"] > 0 and ok["latency_ms"] >= 0
+    assert ok["sampled"] and "image/png base64" in ok["request"] and '"echo"' in ok["response"]
+    assert failed["status"] == 503 and "request" not in failed and "response" not in failed
+    assert (async_record["model"], async_record["status"], async_record["attempt"]) == ("m-async", 200, 3)
+    assert sink.written == 3 and sink.emit({"late": True}) is False
+
+
+def test_client_cache_tracks_settings() -> None:
+    keys = ("SILICONFLOW_API_KEY", "SILICONFLOW_BASE_URL", "SILICONFLOW_MODEL")
+    saved = {key: os.environ.get(key) for key in keys}
+    try:
+        os.environ["SILICONFLOW_API_KEY"] = "sk-one"
+        os.environ["SILICONFLOW_BASE_URL"] = "http://127.0.0.1:9/v1"
+        os.environ["SILICONFLOW_MODEL"] = "stub-model"
+        first = llm_client_service.get_siliconflow_client()
+        assert first is not None
+        assert llm_client_service.get_siliconflow_client() is first
+
+        os.environ["SILICONFLOW_API_KEY"] = "sk-two"
+        second = llm_client_service.get_siliconflow_client()
+        assert second is not None and second is not first
+        assert second.base_client.api_key == "sk-two"
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        llm_client_service.reset_llm_clients()
+
+
+def main() -> int:
+    tests = [
+        ("connections_are_reused", test_connections_are_reused),
+        ("http_error_keeps_connection", test_http_error_keeps_connection),
+        ("async_client_reuses_connections", test_async_client_reuses_connections),
+        ("async_cancel_discards_connection", test_async_cancel_discards_connection),
+        ("async_transport_close_releases_client", test_async_transport_close_releases_client),
+        ("async_timeout_is_one_deadline", test_async_timeout_is_one_deadline),
+        ("circuit_opens_and_probes", test_circuit_opens_and_probes),
+        ("aimd_limiter", test_aimd_limiter),
+        ("payload_blobs_encode_like_json_dumps", test_payload_blobs_encode_like_json_dumps),
+        ("telemetry_records_calls", test_telemetry_records_calls),
+        ("client_cache_tracks_settings", test_client_cache_tracks_settings),
+    ]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"[PASS] {name}")
+        except Exception as exc:  # pragma: no cover
+            failed += 1
+            print(f"[FAIL] {name}: {exc}")
+    if failed:
+        print(f"Failed: {failed}/{len(tests)}")
+        return 1
+    print(f"Passed: {len(tests)}/{len(tests)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
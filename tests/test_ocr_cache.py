@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""OCR result cache: backend eviction/TTL and the vision-call short circuit."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services import ocr_cache_service, ocr_service  # noqa: E402
+from app.services.ocr_cache_service import MemoryOcrCache, OcrCacheBackend, SqliteOcrCache  # noqa: E402
+
+
+def test_cache_key_covers_prompt_and_model() -> None:
+    base = dict(model="m", system_prompt="s", user_prompt="u", temperature=0.2)
+    key = ocr_cache_service.build_cache_key(b"img", **base)
+    assert key == ocr_cache_service.build_cache_key(b"img", **base)
+    assert key != ocr_cache_service.build_cache_key(b"img2", **base)
+    assert key != ocr_cache_service.build_cache_key(b"img", **{**base, "model": "m2"})
+    assert key != ocr_cache_service.build_cache_key(b"img", **{**base, "user_prompt": "u2"})
+    assert key != ocr_cache_service.build_cache_key(b"img", **{**base, "temperature": 0.0})
+
+
+def test_memory_cache_lru_and_ttl() -> None:
+    cache = MemoryOcrCache(max_entries=2, max_bytes=1024, ttl_seconds=0)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # a becomes most recently used
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+
+    sized = MemoryOcrCache(max_entries=10, max_bytes=10, ttl_seconds=0)
+    sized.set("a", "x" * 6)
+    sized.set("b", "y" * 6)
+    assert sized.get("a") is None and sized.get("b") == "y" * 6
+
+    expiring = MemoryOcrCache(max_entries=10, max_bytes=1024, ttl_seconds=0.05)
+    expiring.set("a", "1")
+    time.sleep(0.1)
+    assert expiring.get("a") is None
+    assert len(expiring) == 0
+
+
+def test_sqlite_cache_survives_reopen() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "cache.db")
+        cache = SqliteOcrCache(path, max_bytes=12, ttl_seconds=0)
+        cache.set("a", "x" * 5)
+        cache.set("b", "y" * 5)
+        assert cache.get("a") == "x" * 5  # refresh a; b is now the eviction candidate
+        cache.set("c", "z" * 5)
+        cache.close()
+
+        reopened = SqliteOcrCache(path, max_bytes=12, ttl_seconds=0)
+        try:
+            assert reopened.get("a") == "x" * 5
+            assert reopened.get("b") is None
+            assert reopened.get("c") == "z" * 5
+            assert len(reopened) == 2
+        finally:
+            reopened.close()
+
+
+def test_backend_must_implement_interface() -> None:
+    class ReadOnlyCache(OcrCacheBackend):
+        def get(self, key: str) -> None:
+            return None
+
+    try:
+        ReadOnlyCache()
+    except TypeError:
+        pass
+    else:  # pragma: no cover
+        raise AssertionError("expected TypeError for a backend without set/clear")
+
+
+def test_vision_call_uses_cache() -> None:
+    calls: list[dict] = []
+
+    class _FakeTransport:
+        timeout_seconds = 30
+
+        def chat_completions(self, payload: dict, *, trace_id: str, timeout: float | None = None) -> dict:
+            calls.append(payload)
+            return {"choices": [{"message": {"content": "[]"}}]}
+
+    fake_client = SimpleNamespace(ocr_model="stub-ocr", base_client=_FakeTransport(), async_client=None)
+    original_client = ocr_service._ocr_client
+    ocr_cache_service.set_ocr_cache(MemoryOcrCache(max_entries=8, max_bytes=1 << 20, ttl_seconds=0))
+    ocr_service._ocr_client = lambda: fake_client
+    try:
+        image_bytes = b"\x89PNG-not-really-an-image"
+
+        async def scenario() -> ocr_cache_service.OcrCacheStats:
+            request_stats = ocr_cache_service.begin_request()
+            for _ in range(3):
+                await ocr_service._call_vision_completion_async(image_bytes, "image/png", "p.png", "sys", "user")
+            # 精修查找单独计数，不混进整页 OCR 的命中率
+            for _ in range(2):
+                await ocr_service._call_vision_completion_async(
+                    image_bytes,
+                    "image/png",
+                    "p.png",
+                    "sys",
+                    "refine",
+                    0.0,
+                    ocr_cache_service.CACHE_KIND_REFINE,
+                )
+            return request_stats
+
+        request_stats = asyncio.run(scenario())
+        assert len(calls) == 2
+        assert (request_stats.hits, request_stats.misses) == (2, 1)
+        assert (request_stats.refine_hits, request_stats.refine_misses) == (1, 1)
+
+        ocr_service._call_vision_completion(image_bytes, "image/png", "p.png", "sys", "other prompt")
+        assert len(calls) == 3
+    finally:
+        ocr_service._ocr_client = original_client
+        ocr_cache_service.set_ocr_cache(None)
+
+
+def main() -> int:
+    tests = [
+        ("cache_key_covers_prompt_and_model", test_cache_key_covers_prompt_and_model),
+        ("memory_cache_lru_and_ttl", test_memory_cache_lru_and_ttl),
+        ("sqlite_cache_survives_reopen", test_sqlite_cache_survives_reopen),
+        ("backend_must_implement_interface", test_backend_must_implement_interface),
+        ("vision_call_uses_cache", test_vision_call_uses_cache),
+    ]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"[PASS] {name}")
+        except Exception as exc:  # pragma: no cover
+            failed += 1
+            print(f"[FAIL] {name}: {exc}")
+    if failed:
+        print(f"Failed: {failed}/{len(tests)}")
+        return 1
+    print(f"Passed: {len(tests)}/{len(tests)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,18 +3,33 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
 import sys
+import time
 from io import BytesIO
 from pathlib import Path
 
+import numpy as np
 from PIL import Image, ImageDraw
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from app.services import confidence_service, question_rebuild_service  # noqa: E402
+from app.schemas.common import ImageBox  # noqa: E402
+
+from app.services import (  # noqa: E402
+    confidence_service,
+    image_service,
+    image_worker_service,
+    ocr_service,
+    question_rebuild_service,
+    upload_service,
+    worker_pool_service,
+)
 from app.services.image_service import (  # noqa: E402
     clean_annotations_with_rules,
     crop_diagram_image_with_metadata,
+    has_meaningful_content,
     should_use_annotation_saas_fallback,
 )
 
@@ -32,6 +47,14 @@ def _build_marked_diagram() -> Image.Image:
     return image
 
 
+def _build_shadowed_diagram() -> Image.Image:
+    image = _build_marked_diagram()
+    shade = Image.linear_gradient("L").rotate(90).resize(image.size)
+    # Darken the left side like a phone shadow falling across the page.
+    shadow = shade.point(lambda value: 150 + int(value * 105 / 255))
+    return Image.composite(image, Image.new("RGB", image.size, (0, 0, 0)), shadow)
+
+
 def _to_png_bytes(image: Image.Image) -> bytes:
     buffer = BytesIO()
     image.save(buffer, format="PNG")
@@ -49,6 +72,60 @@ def test_annotation_rule_cleaning() -> None:
     assert not (should_fallback and reason == "local_removed_too_little")
 
 
+def test_flatten_background_parity() -> None:
+    rgb = _build_shadowed_diagram()
+    bg = image_service._estimate_flatten_background(rgb)
+    expected = image_service._flatten_background_to_white_basic(rgb, bg)
+    actual = image_service._flatten_background_to_white_np(rgb, bg)
+    assert actual.size == expected.size
+    diffs = [
+        abs(a - b)
+        for pa, pb in zip(expected.getdata(), actual.getdata())
+        for a, b in zip(pa, pb)
+    ]
+    assert max(diffs) <= 1
+    assert sum(1 for value in diffs if value) / max(1, len(diffs)) < 0.001
+
+
+def test_component_labeler_parity() -> None:
+    src = _build_shadowed_diagram()
+    gray = src.convert("L")
+    threshold = image_service._compute_otsu_threshold(gray)
+    labels, cc_components = image_service._label_diagram_components_cc(gray, threshold, 18)
+    _, basic_components = image_service._label_diagram_components_basic(gray, threshold, 18)
+    assert len(cc_components) == len(basic_components) > 0
+    for cc_comp, basic_comp in zip(cc_components, basic_components):
+        for key in ("area", "min_x", "max_x", "min_y", "max_y"):
+            assert cc_comp[key] == basic_comp[key]
+        assert abs(cc_comp["density"] - basic_comp["density"]) < 1e-9
+        assert "pixels" not in cc_comp
+
+    cc_alpha = image_service._paint_component_alpha_np(labels, [cc_components[0]["label"]])
+    assert cc_alpha.size == src.size
+    assert cc_alpha.histogram()[255] == cc_components[0]["area"]
+
+
+def test_meaningful_content_checks() -> None:
+    blank = Image.new("RGBA", (120, 80), (255, 255, 255, 0))
+    diagram = _build_marked_diagram()
+    assert not image_service.has_meaningful_image_content(blank)
+    assert image_service.has_meaningful_image_content(diagram)
+    assert image_service.has_meaningful_image_content(diagram.convert("L"))
+    assert not has_meaningful_content(_to_png_bytes(blank))
+    assert has_meaningful_content(_to_png_bytes(diagram))
+
+    half = Image.new("RGBA", (100, 100), (0, 0, 0, 0))
+    half.paste((0, 0, 0, 255), (0, 0, 100, 25))
+    assert image_service._alpha_coverage_ratio(half) == 0.25
+
+    try:
+        import numpy as np
+    except ImportError:  # pragma: no cover
+        return
+    assert image_service.has_meaningful_image_content(np.asarray(diagram))
+    assert not image_service.has_meaningful_image_content(np.full((40, 40), 255, dtype=np.uint8))
+
+
 def test_rebuild_contract() -> None:
     payload = question_rebuild_service.rebuild_question_json("1. 2+2=?\nA.3\nB.4")
     assert "stem" in payload
@@ -71,6 +148,7 @@ def test_shape_cutout_has_alpha() -> None:
     )
     assert out_w > 0 and out_h > 0
     assert "alpha_ratio" in stats
+    assert stats["meaningful_content"] is has_meaningful_content(out_bytes)
 
     with Image.open(BytesIO(out_bytes)) as out_img:
         assert "A" in out_img.getbands()
@@ -82,6 +160,115 @@ def test_shape_cutout_has_alpha() -> None:
         assert 0.01 <= ratio <= 0.95
 
 
+def test_image_context_matches_bytes() -> None:
+    src = _build_marked_diagram()
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 CW on display
+    buffer = BytesIO()
+    src.save(buffer, format="JPEG", quality=95, exif=exif.tobytes())
+    src_bytes = buffer.getvalue()
+
+    page = image_service.ImageContext.from_bytes(src_bytes)
+    assert page.size == (200, 360)
+    assert image_service.get_image_size(src_bytes) == page.size
+    assert image_service.get_image_size(page) == page.size
+
+    box = (20, 30, 300, 180)
+    assert image_service.crop_image(page, *box) == image_service.crop_image(src_bytes, *box)
+    from_page = crop_diagram_image_with_metadata(page, *box, max_size=None)
+    from_bytes = crop_diagram_image_with_metadata(src_bytes, *box, max_size=None)
+    assert from_page == from_bytes
+    assert page.size == (200, 360)
+    assert image_service.has_meaningful_image_content(page)
+
+
+def test_gather_bounded_keeps_order_and_limit() -> None:
+    state = {"running": 0, "peak": 0, "cancelled": 0}
+
+    async def work(value: int) -> int:
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        try:
+            await asyncio.sleep(0.01 * (value % 3))
+        finally:
+            state["running"] -= 1
+        return value * value
+
+    values = list(range(12))
+    results = asyncio.run(worker_pool_service.gather_bounded(work, values, max_parallel=3))
+    assert results == [value * value for value in values]
+    assert 1 <= state["peak"] <= 3
+
+    async def failing(value: int) -> int:
+        if value == 0:
+            raise ValueError("boom")
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+        return value
+
+    try:
+        asyncio.run(worker_pool_service.gather_bounded(failing, range(4), max_parallel=4))
+    except ValueError:
+        pass
+    else:  # pragma: no cover
+        raise AssertionError("expected ValueError")
+    assert state["cancelled"] == 3
+
+
+def test_blocking_work_leaves_event_loop_free() -> None:
+    src_bytes = _to_png_bytes(_build_marked_diagram())
+
+    async def scenario() -> tuple[int, tuple[int, int]]:
+        ticks = 0
+
+        async def ticker() -> None:
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        try:
+            await worker_pool_service.run_io(time.sleep, 0.2)
+            size = await worker_pool_service.run_cpu(image_service.get_image_size, src_bytes)
+        finally:
+            task.cancel()
+        return ticks, size
+
+    try:
+        ticks, size = asyncio.run(scenario())
+    finally:
+        worker_pool_service.shutdown_executors(wait=True)
+    assert size == (360, 200)
+    assert ticks >= 10
+
+
+def test_image_worker_matches_in_process() -> None:
+    page = image_service.ImageContext(_build_shadowed_diagram())
+    box = (20, 20, 180, 340)
+    expected = crop_diagram_image_with_metadata(page, *box, max_size=None)
+    shared = image_worker_service.share_page(page)
+    try:
+        if shared is None:  # pragma: no cover - numpy missing / pool disabled
+            return
+        actual = image_worker_service.crop_diagram(page, shared, *box, max_size=None)
+        assert actual == expected
+
+        try:
+            image_worker_service.crop_diagram(page, shared, *box, deadline=time.monotonic() - 1)
+        except image_worker_service.ImageJobTimeoutError:
+            pass
+        else:  # pragma: no cover
+            raise AssertionError("expired deadline must not submit the job")
+    finally:
+        if shared is not None:
+            shared.close()
+        worker_pool_service.shutdown_executors(wait=True)
+
+
 def test_confidence_assessment() -> None:
     low = confidence_service.compute_rebuild_assessment(
         source_text="2+2?",
@@ -110,12 +297,337 @@ def test_confidence_assessment() -> None:
     assert isinstance(high["breakdown"], dict)
 
 
+def test_diagram_box_precheck() -> None:
+    page = Image.new("RGB", (600, 300), color="white")
+    draw = ImageDraw.Draw(page)
+    draw.text((20, 40), "1. Find the area of the triangle below.", fill="black")
+    draw.polygon([(330, 80), (520, 250), (300, 250)], outline=(0, 0, 0), width=3)
+    context = image_service.ImageContext(page)
+    question = ImageBox(ymin=0, xmin=0, ymax=300, xmax=600)
+
+    snug = image_service.score_diagram_box(context, question, ImageBox(ymin=65, xmin=285, ymax=265, xmax=535))
+    cut = image_service.score_diagram_box(context, question, ImageBox(ymin=65, xmin=285, ymax=180, xmax=420))
+    loose = image_service.score_diagram_box(context, question, ImageBox(ymin=60, xmin=240, ymax=295, xmax=595))
+    empty = image_service.score_diagram_box(context, question, ImageBox(ymin=5, xmin=20, ymax=30, xmax=590))
+    whole = image_service.score_diagram_box(context, question, question)
+
+    assert snug["score"] >= 0.8, snug
+    assert cut["score"] < 0.5 and cut["cut_ratio"] > 0.15, cut
+    assert snug["score"] > loose["score"], (snug, loose)
+    assert empty["score"] == 0.0
+    assert whole["score"] == 0.0 and whole["reason"] == "area"
+
+
+def _snapshot_with_box(size: tuple[int, int], box: tuple[int, int, int, int]) -> bytes:
+    image = Image.new("RGB", size, color="white")
+    ImageDraw.Draw(image).rectangle(box, outline=(0, 0, 0), width=3)
+    return _to_png_bytes(image)
+
+
+def test_batched_refine_maps_boxes_back() -> None:
+    # (width, height), diagram rectangle as (left, top, right, bottom)
+    specs = [
+        ((900, 400), (500, 60, 850, 360)),
+        ((420, 260), (40, 30, 200, 220)),
+        ((1200, 1500), (300, 700, 1100, 1400)),
+    ]
+    snapshots = [_snapshot_with_box(size, box) for size, box in specs]
+    mosaic_bytes, tiles = image_service.build_snapshot_mosaic(snapshots)
+    mosaic_width, mosaic_height = image_service.get_image_size(mosaic_bytes)
+    assert [tile.index for tile in tiles] == [1, 2, 3]
+
+    answer = []
+    for tile, (_, (left, top, right, bottom)) in zip(tiles, specs):
+        if tile.index == 2:
+            continue  # 模型漏答的题应得到 None
+        answer.append(
+            {
+                "index": tile.index,
+                "diagram_box": {
+                    "ymin": tile.top + round(top * tile.scale),
+                    "xmin": tile.left + round(left * tile.scale),
+                    "ymax": tile.top + round(bottom * tile.scale),
+                    "xmax": tile.left + round(right * tile.scale),
+                },
+            }
+        )
+    # 中心落在别的格子里的框不应被认领
+    answer.append({"index": 2, "diagram_box": answer[0]["diagram_box"]})
+    prompts: list[str] = []
+
+    async def fake_vision(**kwargs) -> str:
+        prompts.append(kwargs["user_prompt"])
+        return "```json\n" + json.dumps(answer) + "\n```"
+
+    original = ocr_service._call_vision_completion_async
+    ocr_service._call_vision_completion_async = fake_vision
+    try:
+
+        async def scenario() -> tuple[list, int]:
+            batcher = ocr_service.RefineBatcher("page.png", max_batch=3, linger_seconds=0.05)
+            try:
+                boxes = await asyncio.gather(*(batcher.refine(snapshot) for snapshot in snapshots))
+            finally:
+                await batcher.aclose()
+            return boxes, batcher.request_count
+
+        boxes, request_count = asyncio.run(scenario())
+    finally:
+        ocr_service._call_vision_completion_async = original
+
+    assert request_count == 1 and len(prompts) == 1 and "3 question snapshots" in prompts[0]
+
+    def assert_mapped(boxes: list, tolerance: int) -> None:
+        assert boxes[1] is None
+        for box, (_, (left, top, right, bottom)) in ((boxes[0], specs[0]), (boxes[2], specs[2])):
+            assert box is not None
+            assert abs(box.xmin - left) <= tolerance and abs(box.ymin - top) <= tolerance, box
+            assert abs(box.xmax - right) <= tolerance and abs(box.ymax - bottom) <= tolerance, box
+
+    assert_mapped(boxes, tolerance=4)
+
+    # 0~1000 归一化坐标（Qwen 风格）与 x/y 颠倒的回答也应落回各自的格子
+    def rewrite(convert) -> str:
+        return json.dumps([{"index": entry["index"], "diagram_box": convert(entry["diagram_box"])} for entry in answer])
+
+    unit_answer = rewrite(
+        lambda box: {
+            "ymin": round(box["ymin"] * 1000 / mosaic_height),
+            "xmin": round(box["xmin"] * 1000 / mosaic_width),
+            "ymax": round(box["ymax"] * 1000 / mosaic_height),
+            "xmax": round(box["xmax"] * 1000 / mosaic_width),
+        }
+    )
+    swapped_answer = rewrite(
+        lambda box: {"ymin": box["xmin"], "xmin": box["ymin"], "ymax": box["xmax"], "xmax": box["ymax"]}
+    )
+    mosaic_size = (mosaic_width, mosaic_height)
+    # 0~1000 网格的量化误差按快照缩放放大，容差相应放宽
+    assert_mapped(ocr_service._boxes_from_mosaic(unit_answer, tiles, mosaic_size), tolerance=6)
+    assert_mapped(ocr_service._boxes_from_mosaic(swapped_answer, tiles, mosaic_size), tolerance=4)
+
+
+class _ChunkedUpload:
+    """Async reader over bytes that counts how many chunks were pulled; max_chunk caps each read."""
+
+    def __init__(self, data: bytes, max_chunk: int = 0) -> None:
+        self.stream = BytesIO(data)
+        self.max_chunk = max_chunk
+        self.reads = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        self.reads += 1
+        if self.max_chunk and (size < 0 or size > self.max_chunk):
+            size = self.max_chunk
+        return self.stream.read(size)
+
+
+def _ingest(data: bytes, max_chunk: int = 0, **kwargs) -> tuple[object, _ChunkedUpload]:
+    upload = _ChunkedUpload(data, max_chunk)
+    try:
+        return asyncio.run(upload_service.read_image_upload(upload, **kwargs)), upload
+    except (upload_service.UploadRejectedError, ValueError) as exc:
+        return exc, upload
+
+
+def test_upload_ingestion_rejects_early() -> None:
+    jpeg = BytesIO()
+    Image.new("RGB", (64, 48), "white").save(jpeg, format="JPEG")
+    jpeg_bytes = jpeg.getvalue()
+
+    accepted, _ = _ingest(jpeg_bytes, max_bytes=1 << 20, max_pixels=10_000)
+    assert isinstance(accepted, upload_service.IngestedUpload)
+    assert (accepted.content_type, accepted.width, accepted.height) == ("image/jpeg", 64, 48)
+    assert accepted.data == jpeg_bytes
+
+    # 像素超限：读到第一个分块的头部就拒绝，不再读剩余数据
+    padded = jpeg_bytes + b"\0" * (3 * upload_service.UPLOAD_CHUNK_BYTES)
+    rejected, upload = _ingest(padded, max_bytes=0, max_pixels=1000)
+    assert getattr(rejected, "status_code", None) == 413 and upload.reads == 1
+
+    rejected, upload = _ingest(padded, max_bytes=2 * upload_service.UPLOAD_CHUNK_BYTES, max_pixels=0)
+    assert getattr(rejected, "status_code", None) == 413 and upload.reads == 3
+
+    rejected, upload = _ingest(padded, max_bytes=1024, declared_size=len(padded))
+    assert getattr(rejected, "status_code", None) == 413 and upload.reads == 0
+
+    rejected, _ = _ingest(b"GIF89a" + b"\0" * 64)
+    assert getattr(rejected, "status_code", None) == 415
+    rejected, _ = _ingest(b"\xff\xd8\xff" + b"\0" * 64)
+    assert getattr(rejected, "status_code", None) == 415
+    # 格式头跨多个小分块到达时，凑满嗅探长度后再判断
+    rejected, upload = _ingest(b"GIF89a" + b"\0" * 64, max_chunk=7)
+    assert getattr(rejected, "status_code", None) == 415 and upload.reads == 5
+    trickled, _ = _ingest(jpeg_bytes, max_chunk=7, max_pixels=10_000)
+    assert isinstance(trickled, upload_service.IngestedUpload) and trickled.data == jpeg_bytes
+
+    heic_head = b"\0\0\0\x18ftypheic\0\0\0\0mif1heic" + b"\0" * 64
+    assert upload_service.sniff_image_format(heic_head) == "heic"
+    heic, _ = _ingest(heic_head)
+    assert isinstance(heic, upload_service.IngestedUpload) and heic.content_type == "image/heic"
+
+    empty, _ = _ingest(b"")
+    assert isinstance(empty, ValueError) and not isinstance(empty, upload_service.UploadRejectedError)
+
+
+def test_draft_decode_records_working_scale() -> None:
+    page = Image.new("RGB", (2400, 1800), "white")
+    ImageDraw.Draw(page).rectangle((600, 450, 1200, 900), fill=(0, 0, 0))
+    buffer = BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6  # 显示时顺时针旋转 90°，宽高互换
+    page.save(buffer, format="JPEG", quality=90, exif=exif)
+
+    working_bytes, content_type, _, metadata = image_service.prepare_image_for_ocr_pipeline(
+        buffer.getvalue(),
+        "image/jpeg",
+        "page.jpg",
+        enable_local_preprocess=False,
+        working_max_side=1000,
+    )
+    assert content_type == "image/jpeg"
+    assert metadata["draft_scale"] == 2
+    assert (metadata["source_width"], metadata["source_height"]) == (1800, 2400)
+    working_size = image_service.get_image_size(working_bytes)
+    assert working_size == (750, 1000), working_size
+    assert abs(metadata["working_scale"] - 1000 / 2400) < 1e-3
+
+    # 旋转后黑块位于 x∈[900,1350], y∈[600,1200]（原图坐标）
+    page_context = image_service.ImageContext.from_bytes(working_bytes)
+    dark = page_context.image.convert("L").point(lambda value: 255 if value < 128 else 0).getbbox()
+    assert dark is not None
+    # 工作页坐标除以 working_scale 即回到原图坐标
+    source_box = [round(value / metadata["working_scale"]) for value in dark]
+    for actual, expected in zip(source_box, (900, 600, 1350, 1200)):
+        assert abs(actual - expected) <= 8, source_box
+
+    native_bytes, _, _, native = image_service.prepare_image_for_ocr_pipeline(
+        buffer.getvalue(),
+        "image/jpeg",
+        "page.jpg",
+        enable_local_preprocess=False,
+    )
+    assert native["draft_scale"] == 1 and native["working_scale"] == 1.0
+    assert image_service.get_image_size(native_bytes) == (1800, 2400)
+
+
+def test_prepare_encodes_page_once() -> None:
+    page = _build_marked_diagram().resize((1440, 800))
+    buffer = BytesIO()
+    page.save(buffer, format="JPEG", quality=90)
+
+    encodes: list[str] = []
+    original_pil, original_cv = image_service._encode_page_jpeg, image_service._encode_gray_jpeg
+
+    def counting_pil(*args, **kwargs):
+        encodes.append("pil")
+        return original_pil(*args, **kwargs)
+
+    def counting_cv(*args, **kwargs):
+        encodes.append("cv")
+        return original_cv(*args, **kwargs)
+
+    image_service._encode_page_jpeg, image_service._encode_gray_jpeg = counting_pil, counting_cv
+    try:
+        processed, _, _, metadata = image_service.prepare_image_for_ocr_pipeline(
+            buffer.getvalue(),
+            "image/jpeg",
+            "page.jpg",
+            enable_local_preprocess=True,
+        )
+    finally:
+        image_service._encode_page_jpeg, image_service._encode_gray_jpeg = original_pil, original_cv
+    assert metadata["preprocessing_applied"] and encodes == ["cv"], encodes
+    for key in ("preprocess_decode_ms", "preprocess_enhance_ms", "preprocess_encode_ms"):
+        assert isinstance(metadata[key], int) and metadata[key] >= 0
+    assert image_service.get_image_size(processed) == (1440, 800)
+
+    # 重试候选按 DCT 缩放解码，长边落在 [0.75, 1] * max_side 内
+    scaled, _ = ocr_service._downscale_for_ocr(processed, max_side=600)
+    assert 450 <= max(image_service.get_image_size(scaled)) <= 600
+
+
+def test_preprocess_profiles() -> None:
+    clean = _build_marked_diagram().resize((1440, 800)).convert("RGB")
+    clean_gray = np.asarray(clean.convert("L"))
+    noise = np.random.default_rng(7).normal(0.0, 8.0, clean_gray.shape)
+    noisy_gray = np.clip(clean_gray.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+    noisy = Image.fromarray(noisy_gray).convert("RGB")
+    assert image_service.estimate_noise_sigma(noisy_gray) > image_service.estimate_noise_sigma(clean_gray) + 4
+
+    for profile in image_service.PREPROCESS_PROFILES:
+        output, details = image_service._opencv_preprocess_for_ocr(noisy, profile)
+        assert output.shape == noisy_gray.shape and details["profile"] == profile
+
+    # auto：干净页走 fast，小尺寸噪声页走 quality；未知取值按 auto 处理
+    assert image_service.select_preprocess_profile(clean_gray, "auto")[0] == image_service.PREPROCESS_PROFILE_FAST
+    assert image_service.select_preprocess_profile(noisy_gray, "auto")[0] == image_service.PREPROCESS_PROFILE_QUALITY
+    assert image_service.select_preprocess_profile(clean_gray, "turbo")[0] == image_service.PREPROCESS_PROFILE_FAST
+
+    buffer = BytesIO()
+    clean.save(buffer, format="JPEG", quality=90)
+    _, _, _, metadata = image_service.prepare_image_for_ocr_pipeline(
+        buffer.getvalue(),
+        "image/jpeg",
+        "page.jpg",
+        enable_local_preprocess=True,
+        preprocess_profile="balanced",
+    )
+    assert metadata["preprocess_profile"] == "balanced" and metadata["noise_sigma"] >= 0
+
+
+def _build_text_page(size: tuple[int, int]) -> np.ndarray:
+    width, height = size
+    image = Image.new("L", size, color=240)
+    draw = ImageDraw.Draw(image)
+    line_height = max(12, height // 50)
+    margin = width // 10
+    for row, top in enumerate(range(margin, height - margin, line_height * 2)):
+        # 每行由长短不一的"词"组成，行尾参差
+        left = margin
+        right = width - margin - (row % 3) * line_height * 2
+        while left < right:
+            word = line_height * (1 + (left + row) % 4)
+            draw.rectangle((left, top, min(right, left + word), top + line_height // 2), fill=30)
+            left += word + line_height // 2
+    return np.asarray(image)
+
+
+def test_skew_estimation_on_rotated_pages() -> None:
+    for size in ((1200, 900), (6000, 4500)):
+        page = _build_text_page(size)
+        assert image_service._estimate_skew_angle(page) == 0.0
+        for angle in (-4.0, -1.5, 2.5):
+            rotated = image_service._rotate_with_white_background(page, angle)
+            estimate = image_service._estimate_skew_angle(rotated)
+            # 估计值是摆正所需的旋转角，应与施加的旋转相反
+            assert abs(estimate + angle) < 0.25, (size, angle, estimate)
+
+    # 超出上限的大角度不做摆正
+    rotated = image_service._rotate_with_white_background(_build_text_page((1200, 900)), 30.0)
+    assert image_service._estimate_skew_angle(rotated) == 0.0
+
+
 def main() -> int:
     tests = [
         ("annotation_rule_cleaning", test_annotation_rule_cleaning),
+        ("flatten_background_parity", test_flatten_background_parity),
+        ("component_labeler_parity", test_component_labeler_parity),
+        ("meaningful_content_checks", test_meaningful_content_checks),
         ("rebuild_contract", test_rebuild_contract),
         ("shape_cutout_has_alpha", test_shape_cutout_has_alpha),
+        ("image_context_matches_bytes", test_image_context_matches_bytes),
+        ("gather_bounded_keeps_order_and_limit", test_gather_bounded_keeps_order_and_limit),
+        ("blocking_work_leaves_event_loop_free", test_blocking_work_leaves_event_loop_free),
+        ("image_worker_matches_in_process", test_image_worker_matches_in_process),
         ("confidence_assessment", test_confidence_assessment),
+        ("diagram_box_precheck", test_diagram_box_precheck),
+        ("batched_refine_maps_boxes_back", test_batched_refine_maps_boxes_back),
+        ("upload_ingestion_rejects_early", test_upload_ingestion_rejects_early),
+        ("draft_decode_records_working_scale", test_draft_decode_records_working_scale),
+        ("prepare_encodes_page_once", test_prepare_encodes_page_once),
+        ("preprocess_profiles", test_preprocess_profiles),
+        ("skew_estimation_on_rotated_pages", test_skew_estimation_on_rotated_pages),
     ]
     failed = 0
     for name, fn in tests:
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""OCR retry ladder: lazy downscale, adaptive start, backoff and deadline."""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import random
+import sys
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services import ocr_cache_service, ocr_service  # noqa: E402
+from app.services.llm_client_service import LlmHttpError, LlmNetworkError  # noqa: E402
+
+
+def _jpeg_bytes() -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (64, 48), "white").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _plan(history: ocr_service._LadderHistory, **kwargs) -> ocr_service._VisionRetryPlan:
+    image_bytes = kwargs.pop("image_bytes", _jpeg_bytes())
+    return ocr_service._VisionRetryPlan(
+        "stub-ocr",
+        60,
+        image_bytes,
+        "image/jpeg",
+        "page.jpg",
+        "sys",
+        "user",
+        0.2,
+        history=history,
+        rng=random.Random(0),
+        **kwargs,
+    )
+
+
+class _ScriptedTransport:
+    timeout_seconds = 60
+
+    def __init__(self, outcomes: list) -> None:
+        self.outcomes = list(outcomes)
+        self.calls: list[tuple[str, float]] = []
+
+    def chat_completions(self, payload: dict, *, trace_id: str, timeout: float | None = None) -> dict:
+        self.calls.append((trace_id, timeout))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {"choices": [{"message": {"content": outcome}}]}
+
+
+def _run_vision(transport: _ScriptedTransport) -> str:
+    fake_client = SimpleNamespace(ocr_model="stub-ocr", base_client=transport, async_client=None)
+    original_client = ocr_service._ocr_client
+    ocr_service._ocr_client = lambda: fake_client
+    ocr_cache_service.set_ocr_cache(None)
+    try:
+        return ocr_service._call_vision_completion(_jpeg_bytes(), "image/jpeg", "page.jpg", "sys", "user")
+    finally:
+        ocr_service._ocr_client = original_client
+        ocr_service._ladder_history.clear()
+
+
+def test_downscale_is_lazy() -> None:
+    calls = {"downscale": 0}
+    original = ocr_service._downscale_for_ocr
+
+    def counting(image_bytes: bytes, *args, **kwargs):
+        calls["downscale"] += 1
+        return original(image_bytes, *args, **kwargs)
+
+    ocr_service._downscale_for_ocr = counting
+    try:
+        assert _run_vision(_ScriptedTransport(["[]"])) == "[]"
+        assert calls["downscale"] == 0
+
+        transport = _ScriptedTransport([LlmHttpError(503, "busy"), LlmNetworkError("timeout"), "[]"])
+        assert _run_vision(transport) == "[]"
+        assert calls["downscale"] == 1
+        assert [trace.split(":")[2] for trace, _ in transport.calls] == ["orig-high", "scaled-high", "scaled-low"]
+    finally:
+        ocr_service._downscale_for_ocr = original
+
+
+def test_start_adapts_to_size_and_history() -> None:
+    history = ocr_service._LadderHistory()
+    assert _plan(history).start_index == 0
+
+    for _ in range(3):
+        history.record("stub-ocr", "orig-high", False)
+    assert _plan(history).start_index == 1
+    history.record("stub-ocr", "orig-high", True)
+    history.record("stub-ocr", "orig-high", True)
+    # 失败率恰好 0.6 仍跳过；再成功一次后恢复原图起步
+    assert _plan(history).start_index == 1
+    history.record("stub-ocr", "orig-high", True)
+    assert _plan(history).start_index == 0
+
+    for _ in range(5):
+        history.record("stub-ocr", "scaled-high", False)
+    for _ in range(5):
+        history.record("stub-ocr", "orig-high", False)
+    # 最后一档永远保留
+    assert _plan(history).start_index == 2
+
+    big = _plan(ocr_service._LadderHistory(), image_bytes=b"x" * (ocr_service.settings.ocr_orig_max_bytes + 1))
+    assert big.start_index == 1
+
+
+def test_non_retryable_error_stops_ladder() -> None:
+    transport = _ScriptedTransport([LlmHttpError(400, "bad request"), "[]"])
+    try:
+        _run_vision(transport)
+    except RuntimeError as exc:
+        assert "400" in str(exc)
+    else:  # pragma: no cover
+        raise AssertionError("expected RuntimeError")
+    assert len(transport.calls) == 1
+
+
+def test_backoff_and_deadline() -> None:
+    history = ocr_service._LadderHistory()
+    plan = _plan(history, deadline=time.monotonic() + 20)
+    assert plan.backoff_seconds() == 0.0
+    attempts = plan.attempts()
+    first = next(attempts)
+    assert first.timeout <= 20
+    plan.on_error(first, LlmNetworkError("timeout"))
+    for _ in range(20):
+        assert 0.0 <= plan.backoff_seconds() <= ocr_service.settings.ocr_retry_backoff_base_seconds
+
+    expired = _plan(history, deadline=time.monotonic() + 1)
+    assert list(expired.attempts()) == []
+    assert "deadline" in str(expired.exhausted())
+
+
+class _SlowFirstAsyncTransport:
+    """First call hangs until cancelled; later calls answer at once."""
+
+    timeout_seconds = 60
+
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+        self.cancelled: list[str] = []
+
+    async def chat_completions(self, payload: dict, *, trace_id: str, timeout: float | None = None) -> dict:
+        self.calls.append(trace_id)
+        if len(self.calls) == 1:
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                self.cancelled.append(trace_id)
+                raise
+        return {"choices": [{"message": {"content": trace_id}}]}
+
+
+class _SlowFirstSyncTransport:
+    timeout_seconds = 60
+
+    def __init__(self, first_delay: float) -> None:
+        self.first_delay = first_delay
+        self.calls: list[str] = []
+        self._lock = threading.Lock()
+
+    def chat_completions(self, payload: dict, *, trace_id: str, timeout: float | None = None) -> dict:
+        with self._lock:
+            self.calls.append(trace_id)
+            first = len(self.calls) == 1
+        if first:
+            time.sleep(self.first_delay)
+        return {"choices": [{"message": {"content": trace_id}}]}
+
+
+def _with_hedging(run):
+    original_settings = ocr_service.settings
+    ocr_service.settings = dataclasses.replace(
+        original_settings,
+        ocr_hedge_enabled=True,
+        ocr_hedge_min_samples=5,
+        ocr_hedge_min_delay_seconds=0.1,
+    )
+    ocr_cache_service.set_ocr_cache(None)
+    for _ in range(5):
+        ocr_service._latency_history.record("stub-ocr", "orig-high", 0.05)
+    try:
+        return run()
+    finally:
+        ocr_service.settings = original_settings
+        ocr_service._latency_history.clear()
+        ocr_service._ladder_history.clear()
+
+
+def test_hedge_async_takes_first_answer() -> None:
+    transport = _SlowFirstAsyncTransport()
+    fake_client = SimpleNamespace(ocr_model="stub-ocr", base_client=transport, async_client=transport)
+    original_client = ocr_service._ocr_client
+    ocr_service._ocr_client = lambda: fake_client
+
+    async def scenario() -> tuple[str, ocr_service.OcrHedgeStats]:
+        request_stats = ocr_service.begin_hedge_request()
+        content = await ocr_service._call_vision_completion_async(_jpeg_bytes(), "image/jpeg", "p.jpg", "s", "u")
+        return content, request_stats
+
+    try:
+        started = time.monotonic()
+        content, request_stats = _with_hedging(lambda: asyncio.run(scenario()))
+    finally:
+        ocr_service._ocr_client = original_client
+    assert time.monotonic() - started < 5
+    assert content.endswith(":hedge")
+    assert (request_stats.fired, request_stats.won) == (1, 1)
+    assert transport.cancelled == [transport.calls[0]]
+
+
+def test_hedge_sync_only_after_delay() -> None:
+    fast = _SlowFirstSyncTransport(first_delay=0.0)
+    fake_client = SimpleNamespace(ocr_model="stub-ocr", base_client=fast, async_client=None)
+    original_client = ocr_service._ocr_client
+    ocr_service._ocr_client = lambda: fake_client
+    try:
+        request_stats = ocr_service.begin_hedge_request()
+        content = _with_hedging(
+            lambda: ocr_service._call_vision_completion(_jpeg_bytes(), "image/jpeg", "p.jpg", "s", "u")
+        )
+        assert not content.endswith(":hedge") and len(fast.calls) == 1
+        assert request_stats.fired == 0
+
+        slow = _SlowFirstSyncTransport(first_delay=1.0)
+        fake_client.base_client = slow
+        content = _with_hedging(
+            lambda: ocr_service._call_vision_completion(_jpeg_bytes(), "image/jpeg", "p.jpg", "s", "u")
+        )
+        assert content.endswith(":hedge") and len(slow.calls) == 2
+        assert (request_stats.fired, request_stats.won) == (1, 1)
+    finally:
+        ocr_service._ocr_client = original_client
+
+
+def main() -> int:
+    tests = [
+        ("downscale_is_lazy", test_downscale_is_lazy),
+        ("start_adapts_to_size_and_history", test_start_adapts_to_size_and_history),
+        ("non_retryable_error_stops_ladder", test_non_retryable_error_stops_ladder),
+        ("backoff_and_deadline", test_backoff_and_deadline),
+        ("hedge_async_takes_first_answer", test_hedge_async_takes_first_answer),
+        ("hedge_sync_only_after_delay", test_hedge_sync_only_after_delay),
+    ]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"[PASS] {name}")
+        except Exception as exc:  # pragma: no cover
+            failed += 1
+            print(f"[FAIL] {name}: {exc}")
+    if failed:
+        print(f"Failed: {failed}/{len(tests)}")
+        return 1
+    print(f"Passed: {len(tests)}/{len(tests)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
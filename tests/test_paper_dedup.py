@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Page fingerprint (dHash) and BK-tree near-duplicate lookup."""
+
+from __future__ import annotations
+
+import random
+import sys
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services import image_service  # noqa: E402
+from app.services.paper_dedup_service import BkTree, hamming_distance, parse_phash  # noqa: E402
+
+
+def _build_page(seed: int) -> Image.Image:
+    rng = random.Random(seed)
+    page = Image.new("RGB", (600, 800), "white")
+    draw = ImageDraw.Draw(page)
+    for _ in range(12):
+        x0, y0 = rng.randint(20, 420), rng.randint(20, 620)
+        draw.rectangle((x0, y0, x0 + rng.randint(60, 160), y0 + rng.randint(30, 150)), fill=(30, 30, 30))
+    return page
+
+
+def test_dhash_tolerates_rephotograph() -> None:
+    page = _build_page(1)
+    original = parse_phash(image_service.compute_image_dhash(page))
+
+    reshoot = page.rotate(1.0, fillcolor="white").resize((660, 880))
+    buffer = BytesIO()
+    reshoot.save(buffer, format="JPEG", quality=80)
+    reshoot_hash = parse_phash(image_service.compute_image_dhash_from_bytes(buffer.getvalue()))
+
+    other = parse_phash(image_service.compute_image_dhash(_build_page(2)))
+    assert original is not None and reshoot_hash is not None and other is not None
+    assert hamming_distance(original, reshoot_hash) <= 6
+    assert hamming_distance(original, other) > 12
+
+    _, _, _, metadata = image_service.prepare_image_for_ocr_pipeline(
+        buffer.getvalue(),
+        "image/jpeg",
+        "page.jpg",
+        enable_local_preprocess=False,
+    )
+    assert metadata["image_phash"] == f"{reshoot_hash:016x}"
+
+
+def test_bk_tree_matches_linear_scan() -> None:
+    rng = random.Random(7)
+    keys = [rng.getrandbits(64) for _ in range(400)]
+    # 近邻簇：在第一个键附近翻转少量比特
+    for flips in range(1, 6):
+        value = keys[0]
+        for bit in rng.sample(range(64), flips):
+            value ^= 1 << bit
+        keys.append(value)
+
+    tree: BkTree[int] = BkTree()
+    for index, key in enumerate(keys):
+        tree.add(key, index)
+    assert len(tree) == len(keys)
+
+    for probe in (keys[0], keys[-1], rng.getrandbits(64)):
+        for radius in (0, 4, 10):
+            expected = sorted(
+                (hamming_distance(probe, key), index)
+                for index, key in enumerate(keys)
+                if hamming_distance(probe, key) <= radius
+            )
+            assert sorted(tree.search(probe, radius)) == expected
+
+
+def main() -> int:
+    tests = [
+        ("dhash_tolerates_rephotograph", test_dhash_tolerates_rephotograph),
+        ("bk_tree_matches_linear_scan", test_bk_tree_matches_linear_scan),
+    ]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"[PASS] {name}")
+        except Exception as exc:  # pragma: no cover
+            failed += 1
+            print(f"[FAIL] {name}: {exc}")
+    if failed:
+        print(f"Failed: {failed}/{len(tests)}")
+        return 1
+    print(f"Passed: {len(tests)}/{len(tests)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())